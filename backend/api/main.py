@@ -1,12 +1,19 @@
 from fastapi import FastAPI, Request, Response, HTTPException
 from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 from starlette.middleware.base import BaseHTTPMiddleware
+from contextlib import asynccontextmanager
 import secrets
 from typing import Optional
 from backend.config import settings, get_csp_header
-from backend.api.routers import images, users, tags, authors, preview_resize, auth
+from backend.database.database import SessionLocal
+from backend.search.author_index import get_author_index
+from backend.search.near_duplicates import get_near_duplicate_index
+from backend.search.tag_autocomplete import get_tag_autocomplete
+from backend.search.tag_index import get_tag_index
+from backend.api.routers import images, users, tags, authors, preview_resize, auth, jobs
 from backend.utils.logging_config import setup_logging
 from backend.utils.error_handling import (
     handle_error, 
@@ -17,10 +24,36 @@ from backend.utils.error_codes import ErrorCode
 
 logger = setup_logging("main")
 
+def build_search_indexes():
+    """Load the in-memory search indexes from the database."""
+    indexes = {
+        "near-duplicate": get_near_duplicate_index(),
+        "tag": get_tag_index(),
+        "tag autocomplete": get_tag_autocomplete(),
+        "author": get_author_index(),
+    }
+    db = SessionLocal()
+    try:
+        for name, index in indexes.items():
+            try:
+                index.rebuild_from_db(db)
+            except Exception as e:
+                # Serve without this one warm; it is rebuilt lazily on first use
+                db.rollback()
+                logger.error(f"Failed to build {name} index at startup: {str(e)}")
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    build_search_indexes()
+    yield
+
 app = FastAPI(
     title="Image Tagger API",
     description="API for image tagging application",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add to your existing code
@@ -74,7 +107,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*", "X-CSRF-Token"],
-    expose_headers=["content-type", "content-length", "set-cookie"]
+    expose_headers=["content-type", "content-length", "content-range", "accept-ranges", "set-cookie", "x-next-cursor"]
 )
 
 # Include routers
@@ -84,6 +117,7 @@ app.include_router(tags.router)
 app.include_router(authors.router)
 app.include_router(preview_resize.router)
 app.include_router(auth.router)
+app.include_router(jobs.router)
 
 # CSRF token endpoint
 @app.get("/auth/csrf-token")
@@ -102,7 +136,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     )
     return JSONResponse(
         status_code=exc.status_code,
-        content=error_response.dict()
+        content=jsonable_encoder(error_response)
     )
 
 @app.exception_handler(AppError)
@@ -115,7 +149,7 @@ async def app_error_handler(request: Request, exc: AppError):
     )
     return JSONResponse(
         status_code=exc.status_code,
-        content=error_response.dict()
+        content=jsonable_encoder(error_response)
     )
 
 @app.exception_handler(Exception)
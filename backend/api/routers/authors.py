@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from typing import List
 import logging
@@ -7,6 +7,7 @@ from backend.database.models.user import User
 from backend.database.schemas.author import AuthorResponse, AuthorCreate, AuthorUpdate
 from backend.database.services.author_service import search_authors as search_authors_service, get_author_list, get_author_by_id, get_author_by_email, create_author, delete_email_by_id
 from backend.api.routers.auth import get_current_user
+from backend.search.author_index import get_author_index
 from backend.utils.logging_config import setup_logging
 from backend.utils.error_codes import ErrorCode
 from backend.utils.error_handling import handle_error, AppError
@@ -22,10 +23,15 @@ router = APIRouter(
 @router.get("/search")
 def search_authors(
     query: str,
-    limit: int = 10,
+    limit: int = Query(10, ge=1, le=100),
     db: Session = Depends(get_db)
 ):
-    """Search authors by partial name match"""
+    """
+    Search authors by name, tolerating typos: "jhon" finds "john smith".
+    
+    Ranked by trigram similarity, then edit distance, from the in-memory
+    author index.
+    """
     authors = search_authors_service(db, query, limit)
     return [AuthorResponse.model_validate(author) for author in authors]
 
@@ -81,6 +87,7 @@ def update_author(author_id: int, author_data: AuthorUpdate, db: Session = Depen
     
     db.commit()
     db.refresh(db_author)
+    get_author_index().add(db_author.id, db_author.name)
     return db_author
 
 @router.delete("/{author_id}", status_code=status.HTTP_204_NO_CONTENT)
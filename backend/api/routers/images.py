@@ -1,27 +1,50 @@
 from fastapi import APIRouter, HTTPException, Depends, Query, File, UploadFile, status, Request
-from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from urllib.parse import urlencode
+import json
 import os
-import shutil
+import tempfile
 
 from backend.database.database import get_db
 from backend.database.models.image import Image
-from backend.database.schemas.image import ImageResponse, ImageUpdate, ImageCreate
+from backend.database.schemas.image import ImageResponse, ImageUpdate, ImageCreate, ImageExportRequest
 from backend.database.schemas.tag import TagResponse
-from backend.database.models.tag import Tag
-from backend.database.models.author import Author
 from backend.database.models.user import User
 from backend.database.services.image_service import (
     get_image, get_all_untagged_images, get_next_untagged_image,
-    update_image_tags, update_image_metadata, _generate_hash_filename,
-    create_image, delete_image
+    update_image_tags, update_image_metadata, _content_hash_filename,
+    create_image, delete_image, get_image_by_content_hash, search_images_query,
+    with_listing_relations
+)
+from backend.database.services.job_service import enqueue_job, GENERATE_PREVIEWS
+from backend.database.services.pagination import paginate
+from backend.config import settings, TAG_PREVIEW_DIR, SEARCH_PREVIEW_DIR, UNTAGGED_DIR
+from backend.processor.ingest import store_upload
+from backend.processor.perceptual_hash import hex_to_hash
+from backend.processor.color_palette import hex_to_bin, neighbor_bins
+from backend.processor.derivative_cache import get_derivative_cache
+from backend.processor.shared_preview_cache import get_shared_preview_cache
+from backend.processor.sprite_sheet import build_sprite_sheet, sprite_key
+from backend.search.near_duplicates import get_near_duplicate_index
+from backend.search.fulltext import highlights, match_expression
+from backend.search.query_language import parse_search_query
+from backend.search.tag_index import parse_tag_query
+from backend.processor.preview_profiles import (
+    PREVIEW_PROFILES, FORMAT_EXTENSIONS, FORMAT_MEDIA_TYPES, get_profile,
+    output_formats, preview_path, negotiate_format, can_encode
 )
-from backend.config import TAG_PREVIEW_DIR, SEARCH_PREVIEW_DIR, UNTAGGED_DIR
-from backend.processor.thumbnail_generator import generate_previews
 from backend.api.routers.auth import get_current_user
+from backend.api.utils.image_response import image_summary, preview_token
+from backend.api.utils.zip_stream import stream_zip
+from backend.api.utils.http_cache import (
+    IMMUTABLE, REVALIDATE, cached_bytes_response, cached_file_response, strong_etag
+)
 from backend.utils.logging_config import setup_logging
 from backend.utils.error_codes import ErrorCode
 from backend.utils.error_handling import handle_error, AppError
@@ -46,17 +69,24 @@ limiter = Limiter(key_func=get_remote_address)
 @router.get("/content/{image_id}")
 async def get_image_content(
     image_id: int,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """
     Serve the actual image file content.
     
+    Responses carry an ETag (the content hash where known) and
+    Last-Modified, and revalidation requests get a 304. Single byte ranges
+    get a 206. With FILE_OFFLOAD_MODE set, the file itself is sent by the
+    reverse proxy once this has authorised the request.
+    
     Args:
         image_id (int): ID of the image to retrieve
+        request (Request): Incoming request, for conditional headers
         db (Session): Database session
         
     Returns:
-        FileResponse: The image file
+        FileResponse: The image file, or an empty 304 response
         
     Raises:
         HTTPException: 404 if image not found, 500 for server errors
@@ -70,9 +100,12 @@ async def get_image_content(
         if not file_path or not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="Image file not found")
             
-        return FileResponse(
+        return cached_file_response(
+            request,
             file_path,
-            media_type=f"image/{os.path.splitext(image.filename)[1][1:]}"
+            media_type=image.file_type or f"image/{os.path.splitext(image.filename)[1][1:]}",
+            etag=strong_etag(image.content_hash) if image.content_hash else None,
+            offload=True
         )
         
     except HTTPException:
@@ -88,14 +121,14 @@ async def get_image_content(
 #############################################
 
 '''Update tag method'''
-@router.put("/tags/{image_id}")
+@router.put("/tags/{image_id}", status_code=status.HTTP_202_ACCEPTED)
 def update_tags(
     image_id: int,
     update_data: ImageUpdate,
     db: Session = Depends(get_db)
 ):
     """
-    Update image tags, generate thumbnail, and move to tagged storage.
+    Update image tags and queue thumbnail generation and the move to tagged storage.
     
     Args:
         image_id (int): ID of the image to update
@@ -103,10 +136,11 @@ def update_tags(
         db (Session): Database session
         
     Returns:
-        dict: Updated image information
+        dict: Updated image information, the ID of the queued finalize job,
+            and when the author is new, existing authors with similar names
     """
     try:
-        updated_image = update_image_tags(
+        updated = update_image_tags(
             db=db,
             image_id=image_id,
             tags=update_data.tags,
@@ -114,17 +148,27 @@ def update_tags(
             filename=update_data.filename
         )
         
-        if not updated_image:
+        if not updated:
             raise AppError(
                 message="Image not found",
                 error_code=ErrorCode.IMAGE_NOT_FOUND,
                 status_code=status.HTTP_404_NOT_FOUND
             )
-            
-        return updated_image
         
+        updated_image, job, similar_authors = updated
+        return {
+            "id": updated_image.id,
+            "filename": updated_image.filename,
+            "tags": [tag.name for tag in updated_image.tags],
+            "author": updated_image.author.name if updated_image.author else None,
+            "similar_authors": [{"id": match.id, "name": match.name} for match in similar_authors],
+            "job_id": job.id if job else None
+        }
+        
+    except AppError:
+        raise
     except Exception as e:
-        print(f"Error in update_tags endpoint: {str(e)}")
+        logger.error(f"Error in update_tags endpoint: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to process image: {str(e)}"
@@ -181,20 +225,7 @@ def get_untagged_list(db: Session = Depends(get_db)):
         if not image:
             return []
 
-        # Format response
-        response = [{
-            "id": str(image.id),
-            "filename": image.filename,
-            "tagged_full_path": image.tagged_full_path,
-            "search_preview_path": image.search_preview_path,
-            "tag_preview_path": image.tag_preview_path,
-            "untagged_full_path": image.untagged_full_path,
-            "tags": [tag.name for tag in image.tags],  # Convert tag objects to names
-            "date_added": image.date_added.isoformat() if image.date_added else None,
-            "author": image.author.name if image.author else None  # Get author name if exists
-        }]
-            
-        return response
+        return [image_summary(image)]
 
     except Exception as e:
         raise HTTPException(
@@ -206,56 +237,155 @@ def get_untagged_list(db: Session = Depends(get_db)):
 # Search Endpoints
 #############################################
         
+class PageParams:
+    """Query parameters of paginated image listings."""
+    def __init__(
+        self,
+        sort: Optional[str] = Query(
+            None,
+            description="relevance, date_added, file_size or dimensions; "
+                        "defaults to relevance when searching for words, else date_added"
+        ),
+        order: str = Query("asc", description="asc or desc"),
+        limit: int = Query(settings.SEARCH_PAGE_SIZE, ge=1, le=settings.SEARCH_MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page")
+    ):
+        self.sort = sort
+        self.order = order
+        self.limit = limit
+        self.cursor = cursor
+
+def _paginate(query, page: PageParams, response: Response, full_text: bool = False) -> List[Image]:
+    """
+    One page of query, setting X-Next-Cursor when there is another.
+    
+    full_text says query searches for words, so it can be sorted by relevance.
+    """
+    sort = page.sort or ("relevance" if full_text else "date_added")
+    if sort == "relevance" and not full_text:
+        raise AppError(
+            message="Sorting by relevance needs words to search for in q",
+            error_code=ErrorCode.VALIDATION_ERROR,
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    images, next_cursor = paginate(query, sort, page.order, page.cursor, page.limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return images
+
 '''Search for images by tags'''
-@router.get("/search/tags/{tag_name}", response_model=List[ImageResponse])
+@router.get("/search/tags/{tag_name}")
 def get_images_by_tag(
     tag_name: str,
+    response: Response,
+    page: PageParams = Depends(),
     db: Session = Depends(get_db)
 ):
     """
     Get images by tag name from the database.
     
+    Paginated like /images/search: sort, order, limit and cursor, with
+    X-Next-Cursor set while more pages remain.
+    
     Args:
         tag_name (str): Name of the tag to search for
+        response (Response): Outgoing response, for the cursor header
+        page (PageParams): Sort order and page position
         db (Session): Database session
         
     Returns:
-        List[ImageResponse]: List of matching images
+        List[dict]: List of matching images
     """
     try:
-        images = db.query(Image).join(Image.tags).filter(Tag.name == tag_name).all()
+        images = _paginate(search_images_query(db, tags=[tag_name]), page, response)
         
-        if not images:
+        if not images and not page.cursor:
             raise AppError(
                 message="No images found with this tag",
                 error_code=ErrorCode.IMAGE_NOT_FOUND,
                 status_code=status.HTTP_404_NOT_FOUND
             )
         
-        # Format response
-        response = []
-        for image in images:
-            image_data = {
-                "id": str(image.id),
-                "filename": image.filename,
-                "tagged_full_path": image.tagged_full_path,
-                "tagged_thumb_path": image.tagged_thumb_path,
-                "untagged_full_path": image.untagged_full_path,
-                "untagged_thumb_path": image.untagged_thumb_path,
-                "tags": [tag.name for tag in image.tags],
-                "date_added": image.date_added.isoformat() if image.date_added else None,
-                "author": image.author.name if image.author else None
-            }
-            response.append(image_data)
-            
-        return response
+        return [image_summary(image) for image in images]
 
+    except AppError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to get images by tag: {str(e)}"
         )
 
+'''Get all images from the database'''
+@router.get("/search/all")
+def get_all_images(
+    response: Response,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db)
+):
+    """
+    Get all images from the database, a page at a time.
+    
+    Args:
+        response (Response): Outgoing response, for the cursor header
+        page (PageParams): Sort order and page position
+        db (Session): Database session
+        
+    Returns:
+        List[dict]: One page of images
+    """
+    try:
+        images = _paginate(with_listing_relations(db.query(Image)), page, response)
+        
+        return [image_summary(image) for image in images]
+
+    except AppError:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get all images: {str(e)}"
+        )
+
+def _parse_color(color: Optional[str]) -> Optional[List[int]]:
+    """Palette bins matching a ?color= filter, or None without one."""
+    if not color:
+        return None
+    try:
+        return neighbor_bins(hex_to_bin(color))
+    except ValueError:
+        raise AppError(
+            message="Invalid colour, expected a hex value such as ff8800",
+            error_code=ErrorCode.VALIDATION_ERROR,
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+def _parse_tag_query(tag_query: Optional[str]):
+    """Parsed ?tag_query= expression, or None without one."""
+    if not tag_query:
+        return None
+    try:
+        return parse_tag_query(tag_query)
+    except ValueError as e:
+        raise AppError(
+            message=f"Invalid tag query: {str(e)}",
+            error_code=ErrorCode.VALIDATION_ERROR,
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+def _parse_search_query(q: Optional[str]):
+    """Parsed ?q= query language, or None without one."""
+    if not q:
+        return None
+    try:
+        return parse_search_query(q)
+    except ValueError as e:
+        raise AppError(
+            message=f"Invalid query: {str(e)}",
+            error_code=ErrorCode.VALIDATION_ERROR,
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+
 '''Search for images by id'''
 @router.get("/search/{image_id}", response_model=ImageResponse)
 def get_image_by_id(
@@ -296,6 +426,10 @@ def get_image_by_id(
             file_type = image.file_type,
             width = image.width,
             height = image.height,
+            orientation = image.orientation,
+            content_hash = image.content_hash,
+            placeholder = image.placeholder,
+            preview_token = preview_token(image),
         )
         
         return response
@@ -306,127 +440,344 @@ def get_image_by_id(
             status_code=500,
             detail=f"Failed to get image by ID: {str(e)}"
         )
-
-'''Get all images from the database'''
-@router.get("/search/all")
-def get_all_images(db: Session = Depends(get_db)):
-    """Get all images from the database."""
+        
+@router.get("/search")
+def search_images(
+    response: Response,
+    tags: Optional[str] = Query(None, description="Comma-separated list of tags"),
+    author: Optional[str] = Query(None, description="Author name to filter by"),
+    color: Optional[str] = Query(None, description="Hex colour to filter by, e.g. ff8800"),
+    q: Optional[str] = Query(None, description='Query, e.g. tag:pokemon -tag:abstract author:"x" width>2000 added:2025-01..2025-06 type:png "dark souls" boss*'),
+    tag_query: Optional[str] = Query(None, description="Boolean tag expression, e.g. cat AND (dog OR bird) AND NOT sketch"),
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db)
+):
+    """
+    Search images with optional tag, author and colour filters.
+    
+    Results are ordered by sort (relevance, date_added, file_size or
+    dimensions) and then id, limit at a time. While more remain, the
+    X-Next-Cursor response header holds an opaque cursor for the next page;
+    pages seek from it instead of using OFFSET, so deep pages cost the same
+    as the first.
+    
+    Words and "quoted phrases" in q are found in filenames, tags and
+    authors through the full-text index (word* for a prefix). Such
+    searches default to relevance order, and each result carries
+    highlights: its matching fields, HTML-escaped, with the matched words
+    in <mark>.
+    
+    Args:
+        response (Response): Outgoing response, for the cursor header
+        tags (str, optional): Comma-separated list of tags
+        author (str, optional): Author name to filter by
+        color (str, optional): Hex colour; matches images where a nearby
+            shade is a dominant colour
+        q (str, optional): Query language: space-separated field:value
+            terms (tag, author, type, width, height, size, added), "-" to
+            negate, >, >=, <, <= and a..b ranges on the numeric and date
+            fields, and words or phrases to search for
+        tag_query (str, optional): Boolean tag expression with AND (or ","),
+            OR (or "|"), NOT (or "-") and parentheses; quote tags with spaces
+        page (PageParams): Sort order and page position
+        db (Session): Database session
+        
+    Returns:
+        List[dict]: List of matching images
+    """
+    color_bins = _parse_color(color)
+    predicates = _parse_search_query(q)
+    parsed_tag_query = _parse_tag_query(tag_query)
+    
     try:
-        images = db.query(Image).all()
+        query = search_images_query(
+            db,
+            tags=tags.split(',') if tags else None,
+            author=author,
+            color_bins=color_bins,
+            tag_query=parsed_tag_query,
+            predicates=predicates
+        )
+        expression = match_expression(
+            p for p in predicates or [] if p.field == 'text' and not p.negated
+        )
+        images = _paginate(query, page, response, full_text=expression is not None)
         
-        # Format response
-        response = []
-        for image in images:
-            image_data = {
-                "id": str(image.id),
-                "filename": image.filename,
-                "tagged_full_path": image.tagged_full_path,
-                "tagged_thumb_path": image.tagged_thumb_path,
-                "untagged_full_path": image.untagged_full_path,
-                "untagged_thumb_path": image.untagged_thumb_path,
-                "tags": [tag.name for tag in image.tags],
-                "date_added": image.date_added.isoformat() if image.date_added else None,
-                "author": image.author.name if image.author else None,
-                "file_size": image.file_size,
-                "file_type": image.file_type,
-                "width": image.width,
-                "height": image.height,
-            }
-            response.append(image_data)
-            
-        return response
+        if expression is None:
+            return [image_summary(image) for image in images]
+        matched = highlights(db, expression, [image.id for image in images])
+        return [
+            {**image_summary(image), "highlights": matched.get(image.id, {})}
+            for image in images
+        ]
 
+    except AppError:
+        raise
     except Exception as e:
+        logger.error(f"Error in search_images: {str(e)}")
         raise HTTPException(
             status_code=500,
-            detail=f"Failed to get all images: {str(e)}"
+            detail=f"Failed to search images: {str(e)}"
         )
-        
-@router.get("/search")
-def search_images(
+
+#############################################
+# Export Endpoints
+#############################################
+
+def _export_response(images: List[Image], missing_ids: List[int]) -> StreamingResponse:
+    """
+    Stream the originals of images as a ZIP with a manifest.json of their metadata.
+    
+    The metadata is read here, while the database session is open; only
+    the file contents are read as the archive streams.
+    """
+    if len(images) > settings.EXPORT_MAX_IMAGES:
+        raise AppError(
+            message=f"Export is limited to {settings.EXPORT_MAX_IMAGES} images, narrow the search",
+            error_code=ErrorCode.VALIDATION_ERROR,
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    
+    files = []
+    records = []
+    used_names = set()
+    for image in images:
+        file_path = image.tagged_full_path or image.untagged_full_path
+        arcname = None
+        if file_path and os.path.exists(file_path):
+            arcname = f"images/{image.filename}"
+            if arcname in used_names:
+                arcname = f"images/{image.id}_{image.filename}"
+            used_names.add(arcname)
+            files.append((arcname, file_path))
+        records.append({
+            "id": image.id,
+            "file": arcname,
+            "filename": image.filename,
+            "tags": [tag.name for tag in image.tags],
+            "author": image.author.name if image.author else None,
+            "date_added": image.date_added.isoformat() if image.date_added else None,
+            "file_size": image.file_size,
+            "file_type": image.file_type,
+            "width": image.width,
+            "height": image.height,
+            "content_hash": image.content_hash,
+        })
+    manifest = json.dumps({"images": records, "missing_ids": missing_ids}, indent=2).encode()
+    
+    return StreamingResponse(
+        stream_zip([*files, ("manifest.json", manifest)]),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="images-export.zip"'}
+    )
+
+@router.get("/export.zip")
+def export_search_results(
     tags: Optional[str] = Query(None, description="Comma-separated list of tags"),
     author: Optional[str] = Query(None, description="Author name to filter by"),
+    color: Optional[str] = Query(None, description="Hex colour to filter by, e.g. ff8800"),
+    q: Optional[str] = Query(None, description='Query, e.g. tag:pokemon -tag:abstract author:"x" width>2000 added:2025-01..2025-06 type:png "dark souls" boss*'),
+    tag_query: Optional[str] = Query(None, description="Boolean tag expression, e.g. cat AND (dog OR bird) AND NOT sketch"),
     db: Session = Depends(get_db)
 ):
     """
-    Search images with optional tag and author filters.
+    Download the originals matching a search as one ZIP.
+    
+    Takes the same filters as /images/search. The archive is streamed as it
+    is built, with stored (uncompressed) entries, and ends with a
+    manifest.json of each image's metadata and path in the archive.
     
     Args:
         tags (str, optional): Comma-separated list of tags
         author (str, optional): Author name to filter by
+        color (str, optional): Hex colour to filter by
+        q (str, optional): Query language, as for /images/search
+        tag_query (str, optional): Boolean tag expression
         db (Session): Database session
         
     Returns:
-        List[dict]: List of matching images
+        StreamingResponse: application/zip
     """
+    color_bins = _parse_color(color)
+    predicates = _parse_search_query(q)
+    parsed_tag_query = _parse_tag_query(tag_query)
+    
     try:
-        # Start with base query
-        query = db.query(Image)
+        images = search_images_query(
+            db,
+            tags=tags.split(',') if tags else None,
+            author=author,
+            color_bins=color_bins,
+            tag_query=parsed_tag_query,
+            predicates=predicates
+        ).order_by(Image.id).limit(settings.EXPORT_MAX_IMAGES + 1).all()
+        return _export_response(images, [])
+    
+    except AppError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in export_search_results: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to export images: {str(e)}"
+        )
 
-        # Apply filters if provided
-        if tags:
-            tag_list = [tag.strip().lower() for tag in tags.split(',') if tag.strip()]
-            if tag_list:
-                # Join with tags table and filter for images that have ALL specified tags
-                for tag in tag_list:
-                    query = query.join(Image.tags).filter(Tag.name == tag)
+@router.post("/export.zip")
+def export_selected_images(
+    selection: ImageExportRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Download a selection of originals as one ZIP.
+    
+    Like GET /images/export.zip, but for an explicit list of ids. Ids with
+    no image are listed under missing_ids in the manifest.
+    
+    Args:
+        selection (ImageExportRequest): Ids of the images to export
+        db (Session): Database session
+        
+    Returns:
+        StreamingResponse: application/zip
+    """
+    try:
+        ids = list(dict.fromkeys(selection.ids))
+        if len(ids) > settings.EXPORT_MAX_IMAGES:
+            raise AppError(
+                message=f"Export is limited to {settings.EXPORT_MAX_IMAGES} images",
+                error_code=ErrorCode.VALIDATION_ERROR,
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        found = {
+            image.id: image
+            for image in with_listing_relations(db.query(Image).filter(Image.id.in_(ids)))
+        }
+        return _export_response(
+            [found[image_id] for image_id in ids if image_id in found],
+            [image_id for image_id in ids if image_id not in found]
+        )
+    
+    except AppError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in export_selected_images: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to export images: {str(e)}"
+        )
 
-        if author:
-            # Join with author table and filter by author name
-            query = query.join(Image.author).filter(Author.name == author.strip())
+#############################################
+# Near-Duplicate Endpoints
+#############################################
 
-        # Execute query and get results
-        images = query.distinct().all()
+@router.get("/{image_id}/near-duplicates")
+def get_near_duplicates(
+    image_id: int,
+    max_distance: int = Query(6, ge=0, le=settings.NEAR_DUPLICATE_MAX_DISTANCE, description="Maximum Hamming distance between perceptual hashes"),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """
+    Find images that look like this one (re-saves, resizes, recompressions).
+    
+    Args:
+        image_id (int): ID of the image to compare against
+        max_distance (int): Maximum Hamming distance between 64-bit dHashes
+        limit (int): Maximum number of matches to return
+        db (Session): Database session
+        
+    Returns:
+        List[dict]: Matching images, closest first, with their distance
+    """
+    image = get_image(db, image_id)
+    if not image:
+        raise AppError(
+            message="Image not found",
+            error_code=ErrorCode.IMAGE_NOT_FOUND,
+            status_code=status.HTTP_404_NOT_FOUND
+        )
+    if not image.perceptual_hash:
+        raise AppError(
+            message="Perceptual hash not computed yet for this image",
+            error_code=ErrorCode.IMAGE_NOT_FOUND,
+            status_code=status.HTTP_404_NOT_FOUND
+        )
+    
+    try:
+        index = get_near_duplicate_index()
+        index.ensure_fresh(db)
+        matches = index.query(hex_to_hash(image.perceptual_hash), max_distance, exclude_id=image.id, limit=limit)
+        
+        images_by_id = {
+            match.id: match
+            for match in with_listing_relations(
+                db.query(Image).filter(Image.id.in_([match_id for match_id, _ in matches]))
+            )
+        }
         
         # Format response
         response = []
-        for image in images:
-            response.append({
-                "id": str(image.id),
-                "filename": image.filename,
-                "tagged_full_path": image.tagged_full_path,
-                "untagged_full_path": image.untagged_full_path,
-                "tags": [tag.name for tag in image.tags],
-                "date_added": image.date_added.isoformat() if image.date_added else None,
-                "author": image.author.name if image.author else None,
-                "file_size": image.file_size,
-                "file_type": image.file_type,
-                "width": image.width,
-                "height": image.height,
-            })
+        for match_id, distance in matches:
+            match = images_by_id.get(match_id)
+            if not match:
+                continue  # Deleted since the index was built
+            response.append({**image_summary(match), "distance": distance})
             
         return response
-
+        
     except Exception as e:
-        logger.error(f"Error in search_images: {str(e)}")
+        logger.error(f"Error in get_near_duplicates: {str(e)}")
         raise HTTPException(
             status_code=500,
-            detail=f"Failed to search images: {str(e)}"
+            detail=f"Failed to find near-duplicates: {str(e)}"
         )
 
 #############################################
 # Preview Image Endpoints
 #############################################
         
+def _preview_base_filename(image: Image) -> Optional[str]:
+    """Base filename shared by every preview rendition of an image."""
+    stored_path = image.search_preview_path or image.tag_preview_path
+    if not stored_path:
+        return None
+    return os.path.splitext(os.path.basename(stored_path))[0]
+
 @router.get("/preview/{size}/{image_id}")
 async def get_preview(
     size: str,
     image_id: int, 
+    request: Request,
+    v: Optional[str] = Query(None, description="preview_token from a search response"),
     db: Session = Depends(get_db)
 ):
     """
     Get pre-generated preview image.
     
+    The format is negotiated from the Accept header: AVIF or WebP when the
+    client lists it and the variant exists, the profile's fallback otherwise.
+    
+    Requests whose v matches the image's current preview_token are cached
+    for a year as immutable; others must revalidate, which costs a 304.
+    
+    Versioned previews of the profiles in SHARED_PREVIEW_CACHE_PROFILES are
+    kept in the cross-worker shared-memory cache, so a hit is answered
+    without touching the disk. The token is part of the key, so
+    re-rendered previews are never served stale.
+    
     Args:
-        size (str): Size of preview ('preview' or 'search')
+        size (str): Name of a preview profile (e.g. 'preview' or 'search')
         image_id (int): ID of the image
+        request (Request): Incoming request, for Accept and conditional headers
+        v (str, optional): Preview token the URL was built with
         db (Session): Database session
         
     Returns:
-        FileResponse: Preview image file
+        Response: Preview image, or an empty 304 response
     """
     try:
-        if size not in ['preview', 'search']:
+        profile = get_profile(size)
+        if not profile:
             raise AppError(
                 message="Invalid preview size",
                 error_code=ErrorCode.INVALID_IMAGE_FORMAT,
@@ -441,18 +792,77 @@ async def get_preview(
                 status_code=status.HTTP_404_NOT_FOUND
             )
         
-        # Use the stored preview path directly from the database
-        preview_path = image.search_preview_path if size == 'search' else image.tag_preview_path
+        token = preview_token(image)
+        cache_control = IMMUTABLE if v and v == token else REVALIDATE
+        
+        # Versioned previews of hot profiles are served from shared memory
+        shared_cache = None
+        if token and profile.name in settings.SHARED_PREVIEW_CACHE_PROFILES:
+            shared_cache = get_shared_preview_cache()
+        if shared_cache:
+            fmt = negotiate_format(profile, request.headers.get("accept"), output_formats(profile))
+            hit = shared_cache.get(f"{token}:{profile.name}:{fmt}")
+            if hit:
+                content, mtime = hit
+                return cached_bytes_response(
+                    request,
+                    content,
+                    etag=strong_etag(f"{token}-{fmt}"),
+                    mtime=mtime,
+                    media_type=FORMAT_MEDIA_TYPES[fmt],
+                    cache_control=cache_control,
+                    headers={"Vary": "Accept"}
+                )
         
-        if not preview_path or not os.path.exists(preview_path):
+        base_filename = _preview_base_filename(image)
+        if not base_filename:
             raise AppError(
                 message="Preview of image not found",
                 error_code=ErrorCode.IMAGE_NOT_FOUND,
                 status_code=status.HTTP_404_NOT_FOUND
             )
-            
-        return FileResponse(preview_path)
         
+        available = [
+            fmt for fmt in output_formats(profile)
+            if os.path.exists(preview_path(profile, base_filename, fmt))
+        ]
+        if not available:
+            raise AppError(
+                message="Preview of image not found",
+                error_code=ErrorCode.IMAGE_NOT_FOUND,
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        
+        fmt = negotiate_format(profile, request.headers.get("accept"), available)
+        if fmt not in available:
+            fmt = available[-1]
+        
+        file_path = preview_path(profile, base_filename, fmt)
+        if shared_cache:
+            with open(file_path, 'rb') as f:
+                content = f.read()
+            mtime = os.path.getmtime(file_path)
+            shared_cache.put(f"{token}:{profile.name}:{fmt}", content, mtime)
+            return cached_bytes_response(
+                request,
+                content,
+                etag=strong_etag(f"{token}-{fmt}"),
+                mtime=mtime,
+                media_type=FORMAT_MEDIA_TYPES[fmt],
+                cache_control=cache_control,
+                headers={"Vary": "Accept"}
+            )
+        
+        return cached_file_response(
+            request,
+            file_path,
+            media_type=FORMAT_MEDIA_TYPES[fmt],
+            cache_control=cache_control,
+            headers={"Vary": "Accept"}
+        )
+        
+    except AppError:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving preview: {str(e)}")
         raise HTTPException(
@@ -460,11 +870,188 @@ async def get_preview(
             detail=f"Error retrieving preview: {str(e)}"
         )
         
+#############################################
+# Sprite Sheet Endpoints
+#############################################
+
+SPRITE_FORMATS = {"jpeg": "JPEG", "webp": "WEBP"}
+
+def _parse_sprite_request(ids: str, size: int, format: str):
+    """Validate sprite query parameters. Returns (image ids, cell size, Pillow format)."""
+    try:
+        image_ids = list(dict.fromkeys(int(part) for part in ids.split(',') if part.strip()))
+    except ValueError:
+        raise AppError(
+            message="ids must be a comma-separated list of image IDs",
+            error_code=ErrorCode.VALIDATION_ERROR,
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    if not image_ids or len(image_ids) > settings.SPRITE_MAX_IMAGES:
+        raise AppError(
+            message=f"Request between 1 and {settings.SPRITE_MAX_IMAGES} images per sprite sheet",
+            error_code=ErrorCode.VALIDATION_ERROR,
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    fmt = SPRITE_FORMATS.get(format.lower())
+    if not fmt or not can_encode(fmt):
+        raise AppError(
+            message=f"Unsupported sprite format, expected one of {sorted(SPRITE_FORMATS)}",
+            error_code=ErrorCode.INVALID_IMAGE_FORMAT,
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    # Snap to a cache bucket no larger than the stored search previews
+    profile = get_profile("search")
+    cell_size = min(get_derivative_cache().bucket_for(size), max(profile.size))
+    return image_ids, cell_size, fmt
+
+def _sprite_entries(db: Session, image_ids: List[int]):
+    """(image id, search preview path) in request order, plus the ids without a preview."""
+    profile = get_profile("search")
+    images = {image.id: image for image in db.query(Image).filter(Image.id.in_(image_ids))}
+    entries, missing = [], []
+    for image_id in image_ids:
+        image = images.get(image_id)
+        base_filename = _preview_base_filename(image) if image else None
+        path = preview_path(profile, base_filename) if base_filename else None
+        if path and os.path.exists(path):
+            entries.append((image_id, path))
+        else:
+            missing.append(image_id)
+    return entries, missing
+
+def _sprite_map(entries, cell_size: int, fmt: str) -> Tuple[str, bytes]:
+    """Cache key and coordinate map JSON of the sheet for entries, caching both."""
+    cache = get_derivative_cache()
+    key = sprite_key(entries, cell_size, fmt)
+    sheet_path = cache.sprite_path(key, FORMAT_EXTENSIONS[fmt])
+
+    def render_map() -> bytes:
+        sheet = build_sprite_sheet(entries, cell_size, fmt)
+        cache.get_or_render(sheet_path, lambda: sheet.data)
+        return json.dumps({
+            "width": sheet.width,
+            "height": sheet.height,
+            "images": {
+                str(image_id): {"x": x, "y": y, "width": width, "height": height}
+                for image_id, (x, y, width, height) in sheet.cells.items()
+            }
+        }).encode()
+
+    content, _ = cache.read_or_render(cache.sprite_path(key, ".json"), render_map)
+    return key, content
+
+def _sprite_sheet(entries, cell_size: int, fmt: str) -> Tuple[str, bytes, float]:
+    """Cache key, content and mtime of the sheet for entries."""
+    cache = get_derivative_cache()
+    key = sprite_key(entries, cell_size, fmt)
+    # The layout is deterministic, so a sheet evicted after its map is simply redrawn
+    content, mtime = cache.read_or_render(
+        cache.sprite_path(key, FORMAT_EXTENSIONS[fmt]),
+        lambda: build_sprite_sheet(entries, cell_size, fmt).data
+    )
+    return key, content, mtime
+
+@router.get("/sprites")
+async def get_sprite_map(
+    ids: str = Query(..., description="Comma-separated image IDs, in grid order"),
+    size: int = Query(200, description="Cell size in pixels, snapped to a cache bucket"),
+    format: str = Query("jpeg", description="Sheet format: jpeg or webp"),
+    db: Session = Depends(get_db)
+):
+    """
+    Coordinate map of a sprite sheet built from the images' search previews.
+    
+    The returned sheet URL is versioned by the cache key, so a search grid
+    needs this request plus one image request instead of one per result.
+    
+    Args:
+        ids (str): Comma-separated image IDs
+        size (int): Largest side of each cell
+        format (str): Sheet image format
+        db (Session): Database session
+        
+    Returns:
+        dict: Sheet URL and size, {id: {x, y, width, height}} and the IDs
+            that have no search preview yet
+    """
+    image_ids, cell_size, fmt = _parse_sprite_request(ids, size, format)
+    try:
+        entries, missing = _sprite_entries(db, image_ids)
+        if not entries:
+            raise AppError(
+                message="None of the requested images have search previews",
+                error_code=ErrorCode.IMAGE_NOT_FOUND,
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        
+        key, content = await run_in_threadpool(_sprite_map, entries, cell_size, fmt)
+        sprite_map = json.loads(content)
+        
+        query = urlencode({"ids": ",".join(str(image_id) for image_id, _ in entries),
+                           "size": cell_size, "format": format.lower(), "v": key})
+        sprite_map["sheet"] = f"{router.prefix}/sprites/sheet?{query}"
+        sprite_map["missing"] = missing
+        return sprite_map
+        
+    except AppError:
+        raise
+    except Exception as e:
+        logger.error(f"Error building sprite map: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error building sprite sheet: {str(e)}"
+        )
+
+@router.get("/sprites/sheet")
+async def get_sprite_sheet(
+    request: Request,
+    ids: str = Query(..., description="Comma-separated image IDs, as listed in the sprite map"),
+    size: int = Query(200, description="Cell size in pixels, snapped to a cache bucket"),
+    format: str = Query("jpeg", description="Sheet format: jpeg or webp"),
+    v: Optional[str] = Query(None, description="Cache key from the sprite map"),
+    db: Session = Depends(get_db)
+):
+    """
+    Sprite sheet image for a coordinate map from /images/sprites.
+    
+    Sheets are cached on disk by a hash of the image IDs and their preview
+    versions, and rebuilt from the search previews on a miss.
+    """
+    image_ids, cell_size, fmt = _parse_sprite_request(ids, size, format)
+    try:
+        entries, _ = _sprite_entries(db, image_ids)
+        if not entries:
+            raise AppError(
+                message="None of the requested images have search previews",
+                error_code=ErrorCode.IMAGE_NOT_FOUND,
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        
+        key, content, mtime = await run_in_threadpool(_sprite_sheet, entries, cell_size, fmt)
+        # The URL from the sprite map carries the cache key, so its content never changes
+        return cached_bytes_response(
+            request,
+            content,
+            etag=strong_etag(key),
+            mtime=mtime,
+            media_type=FORMAT_MEDIA_TYPES[fmt],
+            cache_control=IMMUTABLE if v == key else REVALIDATE
+        )
+        
+    except AppError:
+        raise
+    except Exception as e:
+        logger.error(f"Error serving sprite sheet: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error serving sprite sheet: {str(e)}"
+        )
+        
 #############################################
 # Upload and Delete Endpoints
 #############################################
         
-@router.post("/upload/batch")
+@router.post("/upload/batch", status_code=status.HTTP_202_ACCEPTED)
 async def upload_batch_images(
     files: List[UploadFile] = File(...),
     db: Session = Depends(get_db)
@@ -477,61 +1064,105 @@ async def upload_batch_images(
         db (Session): Database session
         
     Returns:
-        dict: Upload results including success/failure counts
+        dict: Upload results including success/failure counts and the
+            preview job queued for each stored file
     """
     try:
         results = {
             "success": True,
             "message": "",
-            "failed": []
+            "failed": [],
+            "duplicates": [],
+            "jobs": []
         }
         
+        # Ensure directory exists
+        os.makedirs(UNTAGGED_DIR, exist_ok=True)
+        
         for file in files:
+            temp_path = None
             try:
-                # Generate unique filename (without extension)
-                original_filename = os.path.splitext(file.filename)[0]
-                hashed_filename = _generate_hash_filename(original_filename)
+                # Stream to a temp file, hashing, measuring and sniffing on the way
+                with tempfile.NamedTemporaryFile(dir=UNTAGGED_DIR, suffix=".part", delete=False) as buffer:
+                    temp_path = buffer.name
+                    ingested = store_upload(file.file, buffer)
+                content_hash = ingested.content_hash
+                
+                if ingested.mime_type is None:
+                    logger.warning(f"Rejected {file.filename}: not a recognised image format")
+                    results["failed"].append(file.filename)
+                    continue
+                if ingested.file_size > settings.MAX_IMAGE_BYTES:
+                    logger.warning(f"Rejected {file.filename}: {ingested.file_size} bytes is over the limit")
+                    results["failed"].append(file.filename)
+                    continue
+                
+                # Same bytes already stored: reuse that record, skip the write and previews
+                existing_image = get_image_by_content_hash(db, content_hash)
+                if existing_image:
+                    os.remove(temp_path)
+                    results["duplicates"].append({"filename": file.filename, "image_id": existing_image.id})
+                    continue
+                
+                # Content-addressed filename (without extension)
+                hashed_filename = _content_hash_filename(content_hash)
                 
                 # Get original extension
                 file_extension = os.path.splitext(file.filename)[1].lower()
                 
-                # Set up paths
+                # Move into place under its content address
                 untagged_path = os.path.join(UNTAGGED_DIR, f"{hashed_filename}{file_extension}")
-                
-                # Ensure directory exists
-                os.makedirs(os.path.dirname(untagged_path), exist_ok=True)
-                
-                # Save file to untagged directory
-                with open(untagged_path, "wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
+                os.replace(temp_path, untagged_path)
+                temp_path = None
                 
                 # Create database record
                 image_data = ImageCreate(
                     filename=hashed_filename,
                     untagged_full_path=untagged_path,
                     tag_preview_path=os.path.join(TAG_PREVIEW_DIR, f"{hashed_filename}.jpg"),
-                    search_preview_path=os.path.join(SEARCH_PREVIEW_DIR, f"{hashed_filename}.jpg")
+                    search_preview_path=os.path.join(SEARCH_PREVIEW_DIR, f"{hashed_filename}.jpg"),
+                    file_size=ingested.file_size,
+                    file_type=ingested.mime_type,
+                    content_hash=content_hash
                 )
                 
-                # Create image record first
-                new_image = create_image(db, image_data)
+                try:
+                    # Create image record first
+                    new_image = create_image(db, image_data)
+                except IntegrityError:
+                    # A concurrent upload of the same content won the unique index
+                    existing_image = get_image_by_content_hash(db, content_hash)
+                    if not existing_image:
+                        raise
+                    results["duplicates"].append({"filename": file.filename, "image_id": existing_image.id})
+                    continue
                 
-                # Generate preview images after DB record exists
-                if generate_previews(untagged_path, hashed_filename):
-                    logger.info(f"Generated previews for {hashed_filename}")
-                else:
-                    logger.error(f"Failed to generate previews for {hashed_filename}")
-                    results["failed"].append(file.filename)
+                # Queue preview generation for the background worker
+                job = enqueue_job(db, GENERATE_PREVIEWS, {
+                    "image_id": new_image.id,
+                    "source_path": untagged_path,
+                    "base_filename": hashed_filename
+                })
+                results["jobs"].append({
+                    "filename": file.filename,
+                    "image_id": new_image.id,
+                    "job_id": job.id
+                })
                     
             except Exception as e:
                 logger.error(f"Error processing file {file.filename}: {str(e)}")
                 results["failed"].append(file.filename)
-                
+            finally:
+                if temp_path and os.path.exists(temp_path):
+                    os.remove(temp_path)
+        
         # Set appropriate message
         if len(results["failed"]) > 0:
             results["message"] = f"Uploaded {len(files) - len(results['failed'])} files, {len(results['failed'])} failed"
         else:
-            results["message"] = f"Successfully uploaded {len(files)} files"
+            results["message"] = f"Successfully uploaded {len(files)} files, previews are being generated"
+        if len(results["duplicates"]) > 0:
+            results["message"] += f" ({len(results['duplicates'])} already in the library)"
             
         return results
         
@@ -572,6 +1203,12 @@ async def delete_image_endpoint(
         image.tag_preview_path,
         image.search_preview_path
     ]
+    base_filename = _preview_base_filename(image)
+    if base_filename:
+        for profile in PREVIEW_PROFILES.values():
+            paths_to_delete.extend(
+                preview_path(profile, base_filename, fmt) for fmt in output_formats(profile)
+            )
 
     # Delete all image files
     for path in paths_to_delete:
@@ -587,6 +1224,7 @@ async def delete_image_endpoint(
     # Delete database record
     try:
         delete_image(db, image_id)
+        get_near_duplicate_index().remove(image_id)
         return {"message": "Image deleted successfully"}
     except Exception as e:
         if isinstance(e, HTTPException) and e.status_code == 429:
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.orm import Session
+
+from backend.database.database import get_db
+from backend.database.schemas.job import JobResponse
+from backend.database.services.job_service import get_job
+from backend.utils.logging_config import setup_logging
+from backend.utils.error_codes import ErrorCode
+from backend.utils.error_handling import AppError
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"]
+)
+
+# Set up logger for this module
+logger = setup_logging("jobs")
+
+@router.get("/{job_id}", response_model=JobResponse)
+def get_job_status(job_id: int, db: Session = Depends(get_db)):
+    """
+    Get the status of a background job.
+    
+    Args:
+        job_id (int): ID returned by the endpoint that queued the job
+        db (Session): Database session
+        
+    Returns:
+        JobResponse: Current status, attempts and result of the job
+    """
+    job = get_job(db, job_id)
+    if not job:
+        raise AppError(
+            message="Job not found",
+            error_code=ErrorCode.JOB_NOT_FOUND,
+            status_code=status.HTTP_404_NOT_FOUND
+        )
+    return job
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from PIL import Image
 import io
 import os
-from fastapi.responses import StreamingResponse
 
+from backend.api.utils.http_cache import cached_bytes_response, strong_etag
 from backend.database.database import get_db
 from backend.database.services.image_service import get_image
+from backend.processor.derivative_cache import get_derivative_cache
+from backend.processor.preview_profiles import (
+    FORMAT_EXTENSIONS, FORMAT_MEDIA_TYPES, accepts_media_type, can_encode
+)
+from backend.processor.thumbnail_generator import load_fitted_image
+from backend.utils.error_handling import AppError
 
 import logging
 
@@ -17,9 +23,31 @@ router = APIRouter(
     tags=["preview"]
 )
 
+def _content_version(file_path: str) -> str:
+    """Version string that changes whenever the source file is replaced."""
+    stat = os.stat(file_path)
+    return f"{stat.st_mtime_ns:x}{stat.st_size:x}"
+
+def _render_derivative(file_path: str, size: int, output_format: str) -> bytes:
+    """Resize the original to fit size x size and encode it."""
+    img = load_fitted_image(file_path, (size, size))
+    img_byte_arr = io.BytesIO()
+    img.save(img_byte_arr, format=output_format, quality=85, optimize=True)
+    return img_byte_arr.getvalue()
+
 @router.get("/untagged/preview/{image_id}")
-async def get_untagged_preview(image_id: int, max_size: int = 800, db: Session = Depends(get_db)):
-    """Get a resized preview of an untagged image."""
+async def get_untagged_preview(
+    image_id: int,
+    request: Request,
+    max_size: int = 800,
+    db: Session = Depends(get_db)
+):
+    """
+    Get a resized preview of an untagged image.
+
+    max_size snaps to the nearest configured size bucket, and the rendered
+    derivative is cached on disk until the source file changes.
+    """
     image = get_image(db, image_id)
     if not image:
         raise HTTPException(status_code=404, detail="Image not found")
@@ -29,58 +57,42 @@ async def get_untagged_preview(image_id: int, max_size: int = 800, db: Session =
         raise HTTPException(status_code=404, detail="Image file not found")
 
     try:
-        with Image.open(file_path) as img:
-            # Convert RGBA/P images to RGB
-            if img.mode in ('RGBA', 'P'):
-                # Use white background for transparency
-                background = Image.new('RGB', img.size, 'white')
-                if img.mode == 'RGBA':
-                    background.paste(img, mask=img.split()[3])  # Use alpha channel as mask
-                else:
-                    background.paste(img)
-                img = background
+        cache = get_derivative_cache()
+        bucket = cache.bucket_for(max_size)
+
+        # Determine output format
+        output_format = 'JPEG'
+        if accepts_media_type(request.headers.get("accept"), FORMAT_MEDIA_TYPES['WEBP']) and can_encode('WEBP'):
+            output_format = 'WEBP'
+
+        version = _content_version(file_path)
+        cached_path = cache.path_for(image.id, version, bucket, FORMAT_EXTENSIONS[output_format])
 
-            # Calculate new size maintaining aspect ratio
-            width, height = img.size
-            ratio = min(max_size/width, max_size/height)
-            new_size = (int(width * ratio), int(height * ratio))
-            
-            # Only resize if image is larger than max_size
-            if ratio < 1:
-                img = img.resize(new_size, Image.Resampling.LANCZOS)
-            
-            # Save to bytes
-            img_byte_arr = io.BytesIO()
-            
-            # Determine output format
-            output_format = img.format or 'JPEG'
-            if output_format.upper() not in ('JPEG', 'PNG', 'WEBP'):
-                output_format = 'JPEG'
+        # Render off the event loop; concurrent misses for one key render once.
+        # Served from the bytes read, as eviction may delete the file any time
+        content, mtime = await run_in_threadpool(
+            cache.read_or_render,
+            cached_path,
+            lambda: _render_derivative(file_path, bucket, output_format)
+        )
 
-            save_params = {
-                'format': output_format,
-                'quality': 85,
-            }
-            
-            # Remove alpha channel parameters for JPEG
-            if output_format == 'JPEG':
-                save_params['optimize'] = True
-            elif output_format in ('PNG', 'WEBP'):
-                save_params['optimize'] = True
-                if img.mode == 'RGBA':
-                    save_params['alpha'] = True
+        return cached_bytes_response(
+            request,
+            content,
+            mtime=mtime,
+            media_type=FORMAT_MEDIA_TYPES[output_format],
+            # Like the cache key: source version, bucket and format, as Accept
+            # picks between a JPEG and a WebP at the same URL
+            etag=strong_etag(f"{image.id}_{version}_{bucket}-{output_format.lower()}"),
+            headers={"Vary": "Accept"}
+        )
 
-            img.save(img_byte_arr, **save_params)
-            img_byte_arr.seek(0)
-            
-            return StreamingResponse(
-                img_byte_arr,
-                media_type=f"image/{output_format.lower()}"
-            )
-            
+    except AppError:
+        # Rejected by the decode guard; keep its status and error code
+        raise
     except Exception as e:
         logger.error(f"Error processing image {image_id}: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Error processing image: {str(e)}"
-        )
\ No newline at end of file
+        )
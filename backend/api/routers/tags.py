@@ -1,16 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
 from typing import List
 
+from backend.api.utils.http_cache import cached_bytes_response, strong_etag
 from backend.database.database import get_db
-from backend.database.schemas.tag import TagCreate, TagResponse
+from backend.database.schemas.tag import TagCreate, TagResponse, TagSuggestion
 from backend.database.services.tag_service import (
-    get_tag_by_partial_name,
+    get_tag_by_name,
     get_tag_list,
     create_tag,
     delete_tag_id,
     get_tag_id
 )
+from backend.search.tag_autocomplete import get_tag_autocomplete
 
 router = APIRouter(
     prefix="/tags",
@@ -27,15 +29,39 @@ async def get_all_tags(
     tags = get_tag_list(db, skip=skip, limit=limit)
     return [TagResponse.model_validate(tag) for tag in tags]
 
-@router.get("/search", response_model=List[TagResponse])
+@router.get("/search", response_model=List[TagSuggestion])
 async def search_tags(
     query: str,
-    limit: int = 10,
+    limit: int = Query(10, ge=1, le=100),
     db: Session = Depends(get_db)
 ):
-    """Search tags by partial name match"""
-    tags = get_tag_by_partial_name(db, query, limit)
-    return [TagResponse.model_validate(tag) for tag in tags]
+    """
+    Suggest tags for what has been typed: names starting with query, then
+    names containing it, each most used first.
+    
+    Answered from the in-memory autocomplete index, without a query per
+    keystroke.
+    """
+    index = get_tag_autocomplete()
+    index.ensure_fresh(db)
+    return [TagSuggestion.model_validate(entry) for entry in index.search(query, limit)]
+
+@router.get("/autocomplete")
+async def get_autocomplete_dump(
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Every tag with its usage count, most used first, for offline autocomplete.
+    
+    Carries an ETag of its content: clients keep their copy and revalidate
+    with If-None-Match, getting an empty 304 until a tag is added, removed
+    or used differently.
+    """
+    index = get_tag_autocomplete()
+    index.ensure_fresh(db)
+    content, digest, mtime = index.dump()
+    return cached_bytes_response(request, content, strong_etag(digest), mtime, media_type="application/json")
 
 @router.post("", response_model=TagResponse, status_code=status.HTTP_201_CREATED)
 async def add_tag(
@@ -59,14 +85,14 @@ async def delete_tag(
 ):
     """Delete a tag by name and remove it from all associated images"""
     # First get the tag by name to find its ID
-    tag = get_tag_by_partial_name(db, tag_name, limit=1)
-    if not tag or len(tag) == 0:
+    tag = get_tag_by_name(db, tag_name.strip().lower())
+    if not tag:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Tag '{tag_name}' not found"
         )
     
-    tag_id = tag[0].id
+    tag_id = tag.id
     deleted_tag = delete_tag_id(db, tag_id)
     
     if not deleted_tag:
@@ -0,0 +1,142 @@
+'''File responses with conditional GET, byte ranges and optional proxy offload.'''
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import quote
+import os
+
+from backend.config import settings, FILE_SHARE_DIR
+
+# For URLs whose content can never change, e.g. ones carrying a version token
+IMMUTABLE = "public, max-age=31536000, immutable"
+# For URLs whose content may change: cache, but revalidate with the ETag first
+REVALIDATE = "no-cache"
+
+def strong_etag(value: str) -> str:
+    return f'"{value}"'
+
+def stat_etag(stat_result: os.stat_result) -> str:
+    """Strong ETag from a file's mtime and size."""
+    return strong_etag(f"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}")
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+def is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """
+    True when the client's cached copy is current.
+
+    If-None-Match wins when present; If-Modified-Since is only consulted
+    without it, at the one-second resolution of HTTP dates.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def offload_headers(path: str) -> Optional[Dict[str, str]]:
+    """
+    Headers handing the file to the reverse proxy, when FILE_OFFLOAD_MODE is set.
+
+    "accel" (nginx) redirects to FILE_OFFLOAD_PREFIX plus the path relative
+    to FILE_SHARE_DIR, which must be an internal location aliased to it;
+    "sendfile" (Apache mod_xsendfile, lighttpd) sends the absolute path.
+    Files outside FILE_SHARE_DIR are never offloaded.
+    """
+    mode = settings.FILE_OFFLOAD_MODE
+    if not mode:
+        return None
+    real_path = os.path.realpath(path)
+    share_root = os.path.realpath(FILE_SHARE_DIR)
+    if os.path.commonpath([real_path, share_root]) != share_root:
+        return None
+    if mode == "accel":
+        relative = os.path.relpath(real_path, share_root).replace(os.sep, "/")
+        return {"X-Accel-Redirect": settings.FILE_OFFLOAD_PREFIX.rstrip("/") + "/" + quote(relative)}
+    if mode == "sendfile":
+        return {"X-Sendfile": real_path}
+    return None
+
+def _validators(
+    etag: str,
+    mtime: float,
+    cache_control: str,
+    headers: Optional[Dict[str, str]]
+) -> Dict[str, str]:
+    return {
+        "ETag": etag,
+        "Last-Modified": formatdate(mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        **(headers or {}),
+    }
+
+def cached_file_response(
+    request: Request,
+    path: str,
+    media_type: Optional[str] = None,
+    etag: Optional[str] = None,
+    cache_control: str = REVALIDATE,
+    headers: Optional[Dict[str, str]] = None,
+    offload: bool = False
+) -> Response:
+    """
+    Serve a file with ETag, Last-Modified and Cache-Control.
+
+    - A bodiless 304 when the request's validators show the client has it.
+    - With offload and FILE_OFFLOAD_MODE set, an empty response whose
+      X-Accel-Redirect/X-Sendfile header lets the proxy stream the file
+      (and handle ranges) with sendfile, freeing the worker.
+    - Otherwise a FileResponse, which answers Range requests with 206
+      (multipart for several ranges) or 416, honouring If-Range against
+      the validators set here.
+
+    The ETag defaults to the file's mtime and size; pass one derived from
+    the content hash where there is one.
+    """
+    stat_result = os.stat(path)
+    validators = _validators(etag or stat_etag(stat_result), stat_result.st_mtime, cache_control, headers)
+    if is_not_modified(request, validators["ETag"], stat_result.st_mtime):
+        return Response(status_code=304, headers=validators)
+
+    if offload:
+        proxy_headers = offload_headers(path)
+        if proxy_headers:
+            return Response(media_type=media_type, headers={**validators, **proxy_headers})
+
+    return FileResponse(path, media_type=media_type, headers=validators, stat_result=stat_result)
+
+def cached_bytes_response(
+    request: Request,
+    content: bytes,
+    etag: str,
+    mtime: float,
+    media_type: Optional[str] = None,
+    cache_control: str = REVALIDATE,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    Serve content already in memory with the same validators as cached_file_response.
+
+    Nothing touches the disk, so the caller supplies the ETag and the
+    mtime of the file the content came from. Range requests get the whole
+    body; this is meant for small files such as thumbnails.
+    """
+    validators = _validators(etag, mtime, cache_control, headers)
+    if is_not_modified(request, etag, mtime):
+        return Response(status_code=304, headers=validators)
+    return Response(content=content, media_type=media_type, headers=validators)
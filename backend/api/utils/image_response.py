@@ -0,0 +1,42 @@
+'''The JSON shape images are listed in.'''
+from typing import Any, Dict, Optional
+import hashlib
+
+from backend.database.models.image import Image
+
+def preview_token(image: Image) -> Optional[str]:
+    """
+    Opaque version of an image's current previews, for ?v= on preview URLs.
+
+    It changes whenever the previews are re-rendered with different settings,
+    so a preview URL carrying the current token can be cached as immutable.
+    """
+    if not image.preview_version:
+        return None
+    identity = f"{image.id}:{image.content_hash or image.filename}:{image.preview_version}"
+    return hashlib.sha256(identity.encode()).hexdigest()[:16]
+
+def image_summary(image: Image) -> Dict[str, Any]:
+    """
+    Listing entry for an image, as every image listing endpoint returns it.
+
+    Reads image.tags and image.author, so load images for listings through
+    image_service.with_listing_relations, or each row costs two more queries.
+    """
+    return {
+        "id": str(image.id),
+        "filename": image.filename,
+        "tagged_full_path": image.tagged_full_path,
+        "untagged_full_path": image.untagged_full_path,
+        "search_preview_path": image.search_preview_path,
+        "tag_preview_path": image.tag_preview_path,
+        "placeholder": image.placeholder,
+        "preview_token": preview_token(image),
+        "tags": [tag.name for tag in image.tags],
+        "date_added": image.date_added.isoformat() if image.date_added else None,
+        "author": image.author.name if image.author else None,
+        "file_size": image.file_size,
+        "file_type": image.file_type,
+        "width": image.width,
+        "height": image.height,
+    }
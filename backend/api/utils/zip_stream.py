@@ -0,0 +1,60 @@
+'''ZIP archives generated chunk by chunk, for streaming responses.'''
+from typing import Iterable, Iterator, List, Tuple, Union
+import io
+import zipfile
+
+CHUNK_SIZE = 1024 * 1024
+
+class _ChunkBuffer(io.RawIOBase):
+    """
+    Write-only sink that collects what zipfile writes until it is drained.
+
+    It cannot seek, so zipfile writes data descriptors after each entry
+    instead of going back to patch sizes and CRCs into the local headers.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self._chunks = self._chunks, []
+        yield from chunks
+
+def stream_zip(entries: Iterable[Tuple[str, Union[str, bytes]]]) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive of entries as it is built.
+
+    Entries are stored uncompressed, since images are already compressed,
+    and files are copied a chunk at a time, so memory use does not depend
+    on how many or how large they are. ZIP64 records are added where sizes
+    need them.
+
+    Args:
+        entries: (name in archive, path of a file or the bytes to store).
+            Consumed lazily, so it can be a generator.
+
+    Yields:
+        bytes: Consecutive pieces of the archive
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, source in entries:
+            if isinstance(source, bytes):
+                archive.writestr(arcname, source)
+            else:
+                # from_file takes the size (to pick ZIP64 up front) and mtime
+                info = zipfile.ZipInfo.from_file(source, arcname)
+                with open(source, 'rb') as src, archive.open(info, 'w') as dest:
+                    while chunk := src.read(CHUNK_SIZE):
+                        dest.write(chunk)
+                        yield from buffer.drain()
+            yield from buffer.drain()
+    # Central directory, written on close
+    yield from buffer.drain()
@@ -0,0 +1,161 @@
+'''Benchmark preview generation: legacy per-size full decode vs the pyramid pipeline.
+
+Builds a fixed, deterministic corpus (Mandelbrot renders, so every run sees the
+same pixels) and renders previews for each file in a fresh process, so peak
+RSS is measured per file without interference from earlier decodes.
+
+Run with: python -m backend.benchmarks.preview_pyramid [--corpus-dir DIR]
+'''
+from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+import argparse
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+from backend.processor.thumbnail_generator import render_preview_pyramid
+from backend.processor.preview_profiles import PreviewProfile
+
+# (name, size, format) of each corpus file
+CORPUS = [
+    ("photo_24mp.jpg", (6000, 4000), "JPEG"),
+    ("photo_40mp.jpg", (7744, 5184), "JPEG"),
+    ("panorama_30mp.jpg", (12000, 2500), "JPEG"),
+    ("portrait_20mp.jpg", (3648, 5472), "JPEG"),
+    ("art_12mp.png", (4000, 3000), "PNG"),
+    ("sticker_rgba_8mp.png", (3264, 2448), "PNG"),
+]
+
+SIZES = {
+    'preview': (800, 800),
+    'search': (400, 400),
+}
+
+def build_corpus(corpus_dir: str) -> List[str]:
+    """Write the corpus files if they are not already present."""
+    os.makedirs(corpus_dir, exist_ok=True)
+    paths = []
+    for name, size, fmt in CORPUS:
+        path = os.path.join(corpus_dir, name)
+        paths.append(path)
+        if os.path.exists(path):
+            continue
+        extent = (-2.0, -1.2, 1.0, 1.2)
+        red = Image.effect_mandelbrot(size, extent, 100)
+        green = Image.linear_gradient('L').resize(size)
+        blue = Image.radial_gradient('L').resize(size)
+        img = Image.merge('RGB', (red, green, blue))
+        if name.startswith('sticker'):
+            img.putalpha(Image.radial_gradient('L').resize(size))
+        img.save(path, fmt, **({'quality': 92} if fmt == 'JPEG' else {}))
+    return paths
+
+def legacy_generate_previews(source_path: str, base_filename: str, preview_configs: Dict[str, dict]) -> None:
+    """The original implementation: full decode, then copy + LANCZOS per size."""
+    with Image.open(source_path) as img:
+        if img.mode in ('RGBA', 'P'):
+            background = Image.new('RGB', img.size, 'white')
+            if img.mode == 'RGBA':
+                background.paste(img, mask=img.split()[3])
+            else:
+                background.paste(img)
+            img = background
+
+        for preview_type, config in preview_configs.items():
+            preview_path = os.path.join(config['dir'], f"{base_filename}.jpg")
+            img_copy = img.copy()
+            width, height = img_copy.size
+            dimensions = config['size']
+            ratio = min(dimensions[0]/width, dimensions[1]/height)
+            if ratio < 1:
+                new_size = (int(width * ratio), int(height * ratio))
+                img_copy = img_copy.resize(new_size, Image.Resampling.LANCZOS)
+            img_copy.save(preview_path, "JPEG", quality=85, optimize=True)
+
+def _run_one(args: Tuple[str, str, str]) -> Tuple[float, int]:
+    """Render one file in this (fresh) process and report seconds and peak RSS in KiB."""
+    implementation, source_path, out_dir = args
+    configs = {}
+    for preview_type, size in SIZES.items():
+        directory = os.path.join(out_dir, implementation, preview_type)
+        os.makedirs(directory, exist_ok=True)
+        configs[preview_type] = {'dir': directory, 'size': size}
+
+    base_filename = os.path.splitext(os.path.basename(source_path))[0]
+    start = time.perf_counter()
+    if implementation == 'legacy':
+        legacy_generate_previews(source_path, base_filename, configs)
+    else:
+        # JPEG only, to compare like with like
+        profiles = [
+            PreviewProfile(name=name, dir=config['dir'], size=config['size'], variants=())
+            for name, config in configs.items()
+        ]
+        render_preview_pyramid(source_path, base_filename, profiles)
+    elapsed = time.perf_counter() - start
+
+    return elapsed, _peak_rss_kib()
+
+def _peak_rss_kib() -> int:
+    """Peak RSS of this process in KiB."""
+    # Linux keeps ru_maxrss across fork/exec, so a spawned child would report
+    # the parent's peak; VmHWM belongs to the new address space only.
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss //= 1024   # macOS reports bytes
+    return peak_rss
+
+def measure(implementation: str, path: str, out_dir: str, repeats: int) -> Tuple[float, int]:
+    """Median time and max peak RSS over `repeats` fresh processes."""
+    timings, peaks = [], []
+    for _ in range(repeats):
+        # max_tasks_per_child=1 gives every run a clean process for RSS
+        with ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=1
+        ) as pool:
+            elapsed, peak = pool.submit(_run_one, (implementation, path, out_dir)).result()
+        timings.append(elapsed)
+        peaks.append(peak)
+    return statistics.median(timings), max(peaks)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark legacy vs pyramid preview generation.")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "preview_bench_corpus"))
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = build_corpus(args.corpus_dir)
+    out_dir = tempfile.mkdtemp(prefix="preview_bench_out_")
+
+    print(f"{'file':<24}{'legacy s':>10}{'pyramid s':>11}{'speedup':>9}{'legacy MiB':>12}{'pyramid MiB':>13}")
+    totals = {'legacy': 0.0, 'pyramid': 0.0}
+    for path in paths:
+        legacy_time, legacy_rss = measure('legacy', path, out_dir, args.repeats)
+        pyramid_time, pyramid_rss = measure('pyramid', path, out_dir, args.repeats)
+        totals['legacy'] += legacy_time
+        totals['pyramid'] += pyramid_time
+        print(
+            f"{os.path.basename(path):<24}{legacy_time:>10.3f}{pyramid_time:>11.3f}"
+            f"{legacy_time / pyramid_time:>8.1f}x{legacy_rss / 1024:>12.0f}{pyramid_rss / 1024:>13.0f}"
+        )
+    print(
+        f"{'total':<24}{totals['legacy']:>10.3f}{totals['pyramid']:>11.3f}"
+        f"{totals['legacy'] / totals['pyramid']:>8.1f}x"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+'''Benchmark tag-intersection search: one self-join per tag vs GROUP BY/HAVING.
+
+Builds a synthetic SQLite catalogue (a fixed seed, so every run sees the same
+data) with tag popularity following a Zipf-like curve, then times searches
+for the 1..10 most popular tags, which are the slowest to intersect.
+
+Run with: python -m backend.benchmarks.tag_search [--images 100000 1000000]
+
+Medians on one core, searching 1 to 10 tags (first page of 100 vs all rows):
+
+    images     grouped ms   self-join ms   catalogue build
+    100,000    32-125       133-1620       about 20 s, 55 MB
+    1,000,000  132-1415     1028-10955     about 3 min, 570 MB
+
+The grouped plan still reads every image_tags row of the requested tags,
+so at 1M images a search over the most popular tags takes about a second;
+the page limit bounds what is returned, not what is intersected.
+'''
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import aliased, sessionmaker
+from typing import List
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from backend.database.models import Image, Tag, image_tags
+from backend.database.models.base import Base
+from backend.database.services.image_service import search_images_query
+
+TAG_COUNT = 500
+TAGS_PER_IMAGE = 8
+BATCH = 50_000
+
+def build_catalogue(path: str, image_count: int) -> None:
+    """Write a catalogue of image_count images to a new SQLite file at path."""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    weights = [1 / rank for rank in range(1, TAG_COUNT + 1)]
+    tag_ids = list(range(1, TAG_COUNT + 1))
+
+    with engine.begin() as conn:
+        conn.execute(insert(Tag.__table__), [
+            {"id": tag_id, "name": f"tag{tag_id}"} for tag_id in tag_ids
+        ])
+        for start in range(1, image_count + 1, BATCH):
+            ids = range(start, min(start + BATCH, image_count + 1))
+            conn.execute(insert(Image.__table__), [
+                {"id": image_id, "filename": f"{image_id}.jpg"} for image_id in ids
+            ])
+            links = []
+            for image_id in ids:
+                for tag_id in set(rng.choices(tag_ids, weights, k=TAGS_PER_IMAGE)):
+                    links.append({"image_id": image_id, "tag_id": tag_id})
+            conn.execute(insert(image_tags), links)
+    engine.dispose()
+
+def self_join_search(db, tags: List[str]):
+    """The previous plan: one join through image_tags per tag, then DISTINCT, unbounded."""
+    query = db.query(Image)
+    for tag in tags:
+        tag_alias = aliased(Tag)
+        query = query.join(tag_alias, Image.tags).filter(tag_alias.name == tag)
+    return query.distinct().all()
+
+def grouped_search(db, tags: List[str], limit: int):
+    """The current plan: one grouped subquery, first page only."""
+    return search_images_query(db, tags=tags).limit(limit).all()
+
+def median_ms(run, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tag-intersection search plans.")
+    parser.add_argument("--images", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--max-tags", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--db-dir", default=tempfile.gettempdir())
+    args = parser.parse_args()
+
+    for image_count in args.images:
+        path = os.path.join(args.db_dir, f"tag_search_bench_{image_count}.db")
+        if not os.path.exists(path):
+            print(f"Building {image_count} image catalogue at {path}...")
+            build_catalogue(path, image_count)
+
+        engine = create_engine(f"sqlite:///{path}")
+        db = sessionmaker(bind=engine)()
+        print(f"\n{image_count} images")
+        print(f"{'tags':>4}{'matches':>10}{'self-join ms':>14}{'grouped ms':>12}{'speedup':>9}")
+        for tag_count in range(1, args.max_tags + 1):
+            tags = [f"tag{tag_id}" for tag_id in range(1, tag_count + 1)]
+            matches = search_images_query(db, tags=tags).count()
+            old_ms = median_ms(lambda: self_join_search(db, tags), args.repeats)
+            new_ms = median_ms(lambda: grouped_search(db, tags, args.limit), args.repeats)
+            db.expunge_all()
+            print(f"{tag_count:>4}{matches:>10}{old_ms:>14.1f}{new_ms:>12.1f}{old_ms / new_ms:>8.1f}x")
+        db.close()
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ UNTAGGED_DIR = os.path.join(FILE_SHARE_DIR, "un-tagged")
 TAGGED_DIR = os.path.join(FILE_SHARE_DIR, "tagged")
 TAG_PREVIEW_DIR = os.path.join(FILE_SHARE_DIR, "tag_preview")
 SEARCH_PREVIEW_DIR = os.path.join(FILE_SHARE_DIR, "search_preview")
+DERIVATIVE_CACHE_DIR = os.path.join(FILE_SHARE_DIR, "derivative_cache")
 
 class Settings(BaseSettings):
     # Security settings
@@ -34,6 +35,62 @@ class Settings(BaseSettings):
     TAGGED_DIR: str = TAGGED_DIR
     TAG_PREVIEW_DIR: str = TAG_PREVIEW_DIR
     SEARCH_PREVIEW_DIR: str = SEARCH_PREVIEW_DIR
+    DERIVATIVE_CACHE_DIR: str = DERIVATIVE_CACHE_DIR
+
+    # Image processing settings
+    PREVIEW_WORKERS: Optional[int] = None  # Defaults to the CPU count
+    PREVIEW_PROFILES: List[dict] = [
+        # Full preview for tagging page
+        {"name": "preview", "dir": TAG_PREVIEW_DIR, "size": [800, 800], "format": "JPEG",
+         "quality": 85, "progressive": False, "variants": ["AVIF", "WEBP"]},
+        # Smaller preview for search grid
+        {"name": "search", "dir": SEARCH_PREVIEW_DIR, "size": [400, 400], "format": "JPEG",
+         "quality": 85, "progressive": False, "variants": ["AVIF", "WEBP"]},
+    ]
+    
+    # Serving originals through the reverse proxy: None, "accel" (nginx X-Accel-Redirect)
+    # or "sendfile" (X-Sendfile); for accel, FILE_OFFLOAD_PREFIX must be an internal
+    # location aliased to FILE_SHARE_DIR
+    FILE_OFFLOAD_MODE: Optional[str] = None
+    FILE_OFFLOAD_PREFIX: str = "/protected_files/"
+    
+    # Decode limits
+    MAX_IMAGE_PIXELS: int = 400_000_000                    # Reject larger images from their header
+    MAX_IMAGE_BYTES: int = 200 * 1024 * 1024               # Reject larger files without opening them
+    DECODE_MEMORY_BUDGET_BYTES: int = 1024 * 1024 * 1024   # Per process, shared by concurrent decodes
+    STRIP_DECODE_MIN_PIXELS: int = 50_000_000              # PNGs this large are downscaled strip by strip
+    
+    # On-demand untagged preview cache
+    DERIVATIVE_SIZE_BUCKETS: List[int] = [200, 400, 800, 1200, 1600]
+    DERIVATIVE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    SPRITE_MAX_IMAGES: int = 100          # Images per sprite sheet request
+    EXPORT_MAX_IMAGES: int = 5000         # Images per ZIP export
+    
+    # Hot preview cache in shared memory, attached by every API worker; 0 disables
+    SHARED_PREVIEW_CACHE_BYTES: int = 128 * 1024 * 1024
+    SHARED_PREVIEW_CACHE_SLOT_BYTES: int = 64 * 1024         # Largest cached preview, plus a 64-byte header
+    SHARED_PREVIEW_CACHE_PROFILES: List[str] = ["search"]
+    SHARED_PREVIEW_CACHE_PATH: Optional[str] = None          # Plus a geometry suffix; defaults to /dev/shm, else the derivative cache dir
+    
+    # Search index settings
+    SEARCH_INDEX_REFRESH_SECONDS: int = 300  # Rebuild in-memory indexes to pick up other workers' writes
+    NEAR_DUPLICATE_MAX_DISTANCE: int = 10
+    NEAR_DUPLICATE_WARN_ON_UPLOAD: bool = True
+    NEAR_DUPLICATE_UPLOAD_DISTANCE: int = 4
+    COLOR_SEARCH_MIN_WEIGHT: int = 10  # Percent of an image a colour must cover to match
+    SEARCH_PAGE_SIZE: int = 500        # Default limit of /images/search; X-Next-Cursor fetches more
+    SEARCH_MAX_PAGE_SIZE: int = 1000
+    TAG_INDEX_MAX_ID_LIST: int = 10000  # Tag matches narrowed to an id list up to this many
+    TAG_AUTOCOMPLETE_RESORT_SECONDS: int = 5  # Re-rank tag suggestions by usage at most this often
+    AUTHOR_SEARCH_MIN_SIMILARITY: float = 0.3  # Share of typed trigrams an author name must contain
+    AUTHOR_MERGE_MAX_DISTANCE: int = 0  # Typos within which a new author name reuses an existing author
+    
+    # Background job settings
+    JOB_LEASE_SECONDS: int = 300
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BASE_SECONDS: int = 10
+    JOB_RETRY_MAX_SECONDS: int = 3600
+    JOB_POLL_INTERVAL_SECONDS: float = 2.0
 
     # Additional settings that Uvicorn might pass
     pythonpath: Optional[str] = None
@@ -96,7 +153,7 @@ def get_csp_header() -> str:
         )
 
 # Ensure directories exist
-for directory in [FILE_SHARE_DIR, UNTAGGED_DIR, TAGGED_DIR, TAG_PREVIEW_DIR, SEARCH_PREVIEW_DIR]:
+for directory in [FILE_SHARE_DIR, UNTAGGED_DIR, TAGGED_DIR, TAG_PREVIEW_DIR, SEARCH_PREVIEW_DIR, DERIVATIVE_CACHE_DIR]:
     os.makedirs(directory, exist_ok=True)
 
 # Export directory constants for backward compatibility
@@ -14,6 +14,9 @@ from backend.database.models.user import User
 from backend.database.models.tag import Tag
 from backend.database.models.author import Author
 from backend.database.models.relationships import image_tags
+from backend.database.models.job import Job
+from backend.database.models.image_color import ImageColor
+from backend.database.models.index_generation import IndexGeneration
 from backend.database.database import SQLALCHEMY_DATABASE_URL
 
 config = context.config
@@ -24,6 +27,13 @@ if config.config_file_name is not None:
 config.set_main_option("sqlalchemy.url", SQLALCHEMY_DATABASE_URL)
 target_metadata = Base.metadata
 
+def include_object(object, name, type_, reflected, compare_to):
+    """
+    Leave out of autogenerate what migrations create in raw SQL: the FTS5
+    table images_fts and its shadow tables (images_fts_data, _idx, ...).
+    """
+    return not (type_ == "table" and name.startswith("images_fts"))
+
 def run_migrations_offline() -> None:
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
@@ -31,6 +41,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -46,7 +57,8 @@ def run_migrations_online() -> None:
     with connectable.connect() as connection:
         context.configure(
             connection=connection,
-            target_metadata=target_metadata
+            target_metadata=target_metadata,
+            include_object=include_object
         )
 
         with context.begin_transaction():
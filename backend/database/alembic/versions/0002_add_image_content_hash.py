@@ -0,0 +1,31 @@
+"""Add content_hash to images for content-addressed storage
+
+Revision ID: 0002_add_image_content_hash
+Revises: 0001_create_jobs_table
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_add_image_content_hash'
+down_revision: Union[str, None] = '0001_create_jobs_table'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('images', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_images_content_hash', 'images', ['content_hash'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_images_content_hash', table_name='images')
+    with op.batch_alter_table('images') as batch_op:
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,29 @@
+"""Add perceptual_hash to images for near-duplicate detection
+
+Revision ID: 0003_add_image_perceptual_hash
+Revises: 0002_add_image_content_hash
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_add_image_perceptual_hash'
+down_revision: Union[str, None] = '0002_add_image_content_hash'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('images', sa.Column('perceptual_hash', sa.String(length=16), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('images') as batch_op:
+        batch_op.drop_column('perceptual_hash')
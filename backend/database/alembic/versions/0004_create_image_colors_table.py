@@ -0,0 +1,37 @@
+"""Create image_colors table for search by dominant colour
+
+Revision ID: 0004_create_image_colors_table
+Revises: 0003_add_image_perceptual_hash
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004_create_image_colors_table'
+down_revision: Union[str, None] = '0003_add_image_perceptual_hash'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'image_colors',
+        sa.Column('image_id', sa.Integer(), nullable=False),
+        sa.Column('color_bin', sa.Integer(), nullable=False),
+        sa.Column('weight', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['image_id'], ['images.id']),
+        sa.PrimaryKeyConstraint('image_id', 'color_bin')
+    )
+    op.create_index('ix_image_colors_bin_weight', 'image_colors', ['color_bin', 'weight', 'image_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_image_colors_bin_weight', table_name='image_colors')
+    op.drop_table('image_colors')
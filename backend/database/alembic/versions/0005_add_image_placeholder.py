@@ -0,0 +1,29 @@
+"""Add placeholder to images for inline search previews
+
+Revision ID: 0005_add_image_placeholder
+Revises: 0004_create_image_colors_table
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005_add_image_placeholder'
+down_revision: Union[str, None] = '0004_create_image_colors_table'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('images', sa.Column('placeholder', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('images') as batch_op:
+        batch_op.drop_column('placeholder')
@@ -0,0 +1,29 @@
+"""Add EXIF orientation to images
+
+Revision ID: 0006_add_image_orientation
+Revises: 0005_add_image_placeholder
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006_add_image_orientation'
+down_revision: Union[str, None] = '0005_add_image_placeholder'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('images', sa.Column('orientation', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('images') as batch_op:
+        batch_op.drop_column('orientation')
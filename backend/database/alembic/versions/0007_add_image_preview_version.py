@@ -0,0 +1,31 @@
+"""Add preview_version to images for incremental regeneration
+
+Revision ID: 0007_add_image_preview_version
+Revises: 0006_add_image_orientation
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007_add_image_preview_version'
+down_revision: Union[str, None] = '0006_add_image_orientation'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('images', sa.Column('preview_version', sa.String(length=16), nullable=True))
+    op.create_index('ix_images_preview_version', 'images', ['preview_version'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_images_preview_version', table_name='images')
+    with op.batch_alter_table('images') as batch_op:
+        batch_op.drop_column('preview_version')
@@ -0,0 +1,28 @@
+"""Index image_tags by tag for tag-intersection search
+
+Revision ID: 0008_add_image_tags_tag_index
+Revises: 0007_add_image_preview_version
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008_add_image_tags_tag_index'
+down_revision: Union[str, None] = '0007_add_image_preview_version'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_image_tags_tag_image', 'image_tags', ['tag_id', 'image_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_image_tags_tag_image', table_name='image_tags')
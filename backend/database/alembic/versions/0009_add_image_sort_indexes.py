@@ -0,0 +1,37 @@
+"""Add (sort key, id) indexes on images for keyset pagination
+
+Revision ID: 0009_add_image_sort_indexes
+Revises: 0008_add_image_tags_tag_index
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009_add_image_sort_indexes'
+down_revision: Union[str, None] = '0008_add_image_tags_tag_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_images_date_added_id', 'images', ['date_added', 'id'], unique=False)
+    op.create_index('ix_images_file_size_id', 'images', [sa.text('coalesce(file_size, 0)'), 'id'], unique=False)
+    op.create_index(
+        'ix_images_dimensions_id',
+        'images',
+        [sa.text('(coalesce(width, 0) * coalesce(height, 0))'), 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_images_dimensions_id', table_name='images')
+    op.drop_index('ix_images_file_size_id', table_name='images')
+    op.drop_index('ix_images_date_added_id', table_name='images')
@@ -0,0 +1,33 @@
+"""Index the image columns the search query language filters on
+
+Revision ID: 0010_add_image_filter_indexes
+Revises: 0009_add_image_sort_indexes
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010_add_image_filter_indexes'
+down_revision: Union[str, None] = '0009_add_image_sort_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# date_added is already the leading column of ix_images_date_added_id
+COLUMNS = ['width', 'height', 'file_size', 'file_type', 'author_id']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for column in COLUMNS:
+        op.create_index(f'ix_images_{column}', 'images', [column], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for column in reversed(COLUMNS):
+        op.drop_index(f'ix_images_{column}', table_name='images')
@@ -0,0 +1,71 @@
+"""Full-text index of image filenames, tag names and authors
+
+Revision ID: 0011_create_images_fulltext_index
+Revises: 0010_add_image_filter_indexes
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011_create_images_fulltext_index'
+down_revision: Union[str, None] = '0010_add_image_filter_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Index rows of the images selected by {ids}, derived from the tables
+INSERT_ROWS = """
+    INSERT INTO images_fts (rowid, filename, tags, author)
+    SELECT images.id, images.filename,
+           (SELECT group_concat(tags.name, ', ') FROM image_tags
+            JOIN tags ON tags.id = image_tags.tag_id
+            WHERE image_tags.image_id = images.id),
+           authors.name
+    FROM images LEFT JOIN authors ON authors.id = images.author_id
+    WHERE images.id IN ({ids})
+"""
+REFRESH = "DELETE FROM images_fts WHERE rowid IN ({ids}); " + INSERT_ROWS + ";"
+
+# Trigger name, event, and the ids of the images whose rows it refreshes
+TRIGGERS = [
+    ('images_fts_insert', 'AFTER INSERT ON images', 'new.id'),
+    ('images_fts_update', 'AFTER UPDATE OF filename, author_id ON images', 'new.id'),
+    ('images_fts_tag_added', 'AFTER INSERT ON image_tags', 'new.image_id'),
+    ('images_fts_tag_removed', 'AFTER DELETE ON image_tags', 'old.image_id'),
+    ('images_fts_tag_renamed', 'AFTER UPDATE OF name ON tags',
+     'SELECT image_id FROM image_tags WHERE tag_id = new.id'),
+    ('images_fts_author_renamed', 'AFTER UPDATE OF name ON authors',
+     'SELECT id FROM images WHERE author_id = new.id'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tags and author weigh more than filenames, which are mostly content hashes
+    op.execute(
+        "CREATE VIRTUAL TABLE images_fts USING fts5("
+        "filename, tags, author, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    op.execute("INSERT INTO images_fts (images_fts, rank) VALUES ('rank', 'bm25(1.0, 4.0, 2.0)')")
+
+    for name, event, ids in TRIGGERS:
+        op.execute(f"CREATE TRIGGER {name} {event} BEGIN {REFRESH.format(ids=ids)} END")
+    op.execute(
+        "CREATE TRIGGER images_fts_delete AFTER DELETE ON images BEGIN "
+        "DELETE FROM images_fts WHERE rowid = old.id; END"
+    )
+
+    op.execute(INSERT_ROWS.format(ids='SELECT id FROM images'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER images_fts_delete")
+    for name, _, _ in reversed(TRIGGERS):
+        op.execute(f"DROP TRIGGER {name}")
+    op.execute("DROP TABLE images_fts")
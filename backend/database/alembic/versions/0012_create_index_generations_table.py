@@ -0,0 +1,51 @@
+"""Generation counters telling in-memory indexes whether they are current
+
+Revision ID: 0012_create_index_generations_table
+Revises: 0011_create_images_fulltext_index
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0012_create_index_generations_table'
+down_revision: Union[str, None] = '0011_create_images_fulltext_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BUMP_TAGS = "UPDATE index_generations SET generation = generation + 1 WHERE name = 'tags';"
+
+# Every write the tag bitmap index reads: which images exist and their tags by name
+TAG_TRIGGERS = [
+    ('tag_index_image_added', 'AFTER INSERT ON images'),
+    ('tag_index_image_deleted', 'AFTER DELETE ON images'),
+    ('tag_index_tag_added', 'AFTER INSERT ON image_tags'),
+    ('tag_index_tag_changed', 'AFTER UPDATE ON image_tags'),
+    ('tag_index_tag_removed', 'AFTER DELETE ON image_tags'),
+    ('tag_index_tag_renamed', 'AFTER UPDATE OF name ON tags'),
+    ('tag_index_tag_deleted', 'AFTER DELETE ON tags'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'index_generations',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('generation', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.execute("INSERT INTO index_generations (name, generation) VALUES ('tags', 0)")
+    for name, event in TAG_TRIGGERS:
+        op.execute(f"CREATE TRIGGER {name} {event} BEGIN {BUMP_TAGS} END")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, _ in reversed(TAG_TRIGGERS):
+        op.execute(f"DROP TRIGGER {name}")
+    op.drop_table('index_generations')
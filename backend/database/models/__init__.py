@@ -3,6 +3,9 @@ from .image import Image
 from .author import Author
 from .tag import Tag
 from .relationships import image_tags
+from .job import Job
+from .image_color import ImageColor
+from .index_generation import IndexGeneration
 
 # Set up relationships after all models are defined
 Image.author = relationship("Author", back_populates="images")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, func
 from .base import Base
 from datetime import datetime
 
@@ -16,11 +16,26 @@ class Image(Base):
     
     # Metadata
     date_added = Column(DateTime, nullable=False, default=datetime.utcnow)
-    author_id = Column(Integer, ForeignKey('authors.id'), nullable=True)
-    file_size = Column(Integer, nullable=True)  # Size in bytes
-    file_type = Column(String, nullable=True)   # MIME type
-    width = Column(Integer, nullable=True)      # Image width in pixels
-    height = Column(Integer, nullable=True)     # Image height in pixels
+    author_id = Column(Integer, ForeignKey('authors.id'), nullable=True, index=True)
+    file_size = Column(Integer, nullable=True, index=True)  # Size in bytes
+    file_type = Column(String, nullable=True, index=True)   # MIME type
+    width = Column(Integer, nullable=True, index=True)      # Image width in pixels
+    height = Column(Integer, nullable=True, index=True)     # Image height in pixels
+    orientation = Column(Integer, nullable=True)  # EXIF orientation (1-8); previews are already upright
+    content_hash = Column(String(64), nullable=True, unique=True, index=True)  # SHA-256 of the original
+    perceptual_hash = Column(String(16), nullable=True)  # 64-bit dHash as hex, for near-duplicates
+    preview_version = Column(String(16), nullable=True, index=True)  # profiles_version() of the current previews
+    placeholder = Column(String, nullable=True)          # Tiny preview as a data URI, inlined in search results
 
     def __repr__(self):
-        return f"<Image(id={self.id}, filename={self.filename})>"
\ No newline at end of file
+        return f"<Image(id={self.id}, filename={self.filename})>"
+
+# (sort key, id) indexes behind keyset pagination, one per sort in
+# services.pagination.SORT_KEYS; the expressions must match exactly
+Index('ix_images_date_added_id', Image.date_added, Image.id)
+Index('ix_images_file_size_id', func.coalesce(Image.file_size, 0), Image.id)
+Index(
+    'ix_images_dimensions_id',
+    func.coalesce(Image.width, 0) * func.coalesce(Image.height, 0),
+    Image.id
+)
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, ForeignKey, Index
+from .base import Base
+
+class ImageColor(Base):
+    __tablename__ = 'image_colors'
+
+    image_id = Column(Integer, ForeignKey('images.id'), primary_key=True)
+    color_bin = Column(Integer, primary_key=True)   # 4 bits per channel RGB, see processor.color_palette
+    weight = Column(Integer, nullable=False)        # Percent of sampled pixels in this bin
+
+    __table_args__ = (
+        # Seek by colour first, so colour filters never scan the table
+        Index('ix_image_colors_bin_weight', 'color_bin', 'weight', 'image_id'),
+    )
+
+    def __repr__(self):
+        return f"<ImageColor(image_id={self.image_id}, color_bin={self.color_bin}, weight={self.weight})>"
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String
+from .base import Base
+
+class IndexGeneration(Base):
+    __tablename__ = 'index_generations'
+
+    name = Column(String, primary_key=True)                  # In-memory index the counter is for, e.g. "tags"
+    generation = Column(Integer, nullable=False, default=0)  # Bumped by triggers on every write the index reads
+
+    def __repr__(self):
+        return f"<IndexGeneration(name={self.name}, generation={self.generation})>"
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Index
+from .base import Base
+from datetime import datetime
+
+class Job(Base):
+    __tablename__ = 'jobs'
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False, index=True)       # Handler name, e.g. "generate_previews"
+    payload = Column(JSON, nullable=False, default=dict)
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded, failed
+
+    # Retry and lease bookkeeping
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+
+    # Outcome
+    last_error = Column(Text, nullable=True)
+    result = Column(JSON, nullable=True)
+
+    date_added = Column(DateTime, nullable=False, default=datetime.utcnow)
+    date_updated = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    date_finished = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+    def __repr__(self):
+        return f"<Job(id={self.id}, kind={self.kind}, status={self.status})>"
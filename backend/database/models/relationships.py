@@ -1,4 +1,4 @@
-from sqlalchemy import Table, Column, Integer, ForeignKey
+from sqlalchemy import Table, Column, Integer, ForeignKey, Index
 from .base import Base
 
 image_tags = Table(
@@ -6,5 +6,7 @@ image_tags = Table(
     Base.metadata,
     Column('image_id', Integer, ForeignKey('images.id'), primary_key=True),
     Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True),
+    # Tag search reads by tag; the primary key only serves lookups by image
+    Index('ix_image_tags_tag_image', 'tag_id', 'image_id'),
     extend_existing=True
 )
\ No newline at end of file
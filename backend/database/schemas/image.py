@@ -16,6 +16,7 @@ class ImageCreate(BaseModel):
     file_type: Optional[str] = None
     width: Optional[int] = None
     height: Optional[int] = None
+    content_hash: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -34,10 +35,17 @@ class ImageResponse(BaseModel):
     file_type: Optional[str] = None
     width: Optional[int] = None
     height: Optional[int] = None
+    orientation: Optional[int] = None
+    content_hash: Optional[str] = None
+    placeholder: Optional[str] = None
+    preview_token: Optional[str] = None
 
     class Config:
         from_attributes = True
         
+class ImageExportRequest(BaseModel):
+    ids: List[int]
+
 class ImageUpdate(BaseModel):
     tags: List[str]  # Change from tag_ids to tags
     author: Optional[str] = None  # Change from author_id to author
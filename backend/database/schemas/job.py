@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import Optional, Any
+from datetime import datetime
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str
+    attempts: int
+    max_attempts: int
+    run_after: datetime
+    last_error: Optional[str] = None
+    result: Optional[Any] = None
+    date_added: datetime
+    date_updated: datetime
+    date_finished: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
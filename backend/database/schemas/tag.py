@@ -17,4 +17,8 @@ class TagResponse(TagBase):
     date_added: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class TagSuggestion(TagResponse):
+    date_added: Optional[datetime] = None  # NULL in some tag rows; suggestions pass that through
+    count: int  # Images carrying the tag
@@ -0,0 +1,77 @@
+from sqlalchemy.orm import Session
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+# Get the project root directory (Image_Tagger)
+project_root = Path(__file__).parent.parent.parent.parent
+sys.path.append(str(project_root))
+
+from backend.database.database import get_db
+from backend.database.models.image import Image
+from backend.processor.content_hash import hash_file
+
+logger = logging.getLogger(__name__)
+
+def _hash_path(path: str):
+    """Hash one file in a pool worker. Returns (hex digest or None, error)."""
+    try:
+        return hash_file(path), None
+    except Exception as e:
+        return None, str(e)
+
+def backfill_content_hashes(db: Session, workers: int = None, batch_size: int = 200):
+    """Hash every image without a content_hash, in parallel, committing per batch."""
+    try:
+        # Hashes already claimed, so later copies of the same file are reported instead
+        seen = {row.content_hash: row.id for row in db.query(Image.id, Image.content_hash).filter(Image.content_hash.isnot(None))}
+        pending = [
+            (row.id, row.tagged_full_path or row.untagged_full_path)
+            for row in db.query(Image.id, Image.tagged_full_path, Image.untagged_full_path)
+                         .filter(Image.content_hash.is_(None))
+                         .order_by(Image.id)
+        ]
+        pending = [(image_id, path) for image_id, path in pending if path and os.path.exists(path)]
+        print(f"Hashing {len(pending)} images")
+
+        hashed = duplicates = failed = 0
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for offset in range(0, len(pending), batch_size):
+                batch = pending[offset:offset + batch_size]
+                digests = pool.map(_hash_path, [path for _, path in batch], chunksize=8)
+                for (image_id, path), (digest, error) in zip(batch, digests):
+                    if error:
+                        failed += 1
+                        logger.error(f"Could not hash image {image_id} at {path}: {error}")
+                    elif digest in seen:
+                        duplicates += 1
+                        print(f"Image {image_id} duplicates image {seen[digest]} ({path})")
+                    else:
+                        seen[digest] = image_id
+                        db.query(Image).filter(Image.id == image_id).update({Image.content_hash: digest})
+                        hashed += 1
+                db.commit()
+                done = offset + len(batch)
+                elapsed = time.perf_counter() - start
+                print(f"{done}/{len(pending)} images, {done / elapsed:.1f} images/s")
+
+        print(f"Hashed {hashed} images, {duplicates} duplicates left unhashed, {failed} failed")
+    except Exception as e:
+        print(f"Error backfilling content hashes: {str(e)}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute content hashes for existing images.")
+    parser.add_argument("--workers", type=int, default=None, help="Hashing processes (defaults to the CPU count)")
+    parser.add_argument("--batch-size", type=int, default=200, help="Images per commit")
+    args = parser.parse_args()
+
+    db = next(get_db())
+    backfill_content_hashes(db, workers=args.workers, batch_size=args.batch_size)
@@ -0,0 +1,79 @@
+from sqlalchemy.orm import Session
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image as PILImage
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+# Get the project root directory (Image_Tagger)
+project_root = Path(__file__).parent.parent.parent.parent
+sys.path.append(str(project_root))
+
+from backend.database.database import get_db
+from backend.database.models.image import Image
+from backend.database.models.image_color import ImageColor
+from backend.database.services.image_service import save_preview_analysis
+from backend.processor.color_palette import extract_palette
+from backend.processor.placeholder import render_placeholder
+
+logger = logging.getLogger(__name__)
+
+def _analyse_preview(path: str):
+    """Extract the palette and placeholder of one search preview in a pool worker. Returns (palette, placeholder, error)."""
+    try:
+        with PILImage.open(path) as img:
+            img.load()
+            return extract_palette(img), render_placeholder(img), None
+    except Exception as e:
+        return None, None, str(e)
+
+def backfill_preview_analysis(db: Session, workers: int = None, batch_size: int = 500, recompute: bool = False):
+    """Compute dominant colours and placeholders from existing search previews, in parallel, committing per batch."""
+    try:
+        query = db.query(Image.id, Image.search_preview_path).filter(Image.search_preview_path.isnot(None))
+        if not recompute:
+            query = query.filter(
+                ~Image.id.in_(db.query(ImageColor.image_id)) | Image.placeholder.is_(None)
+            )
+        pending = [
+            (row.id, row.search_preview_path) for row in query.order_by(Image.id)
+            if os.path.exists(row.search_preview_path)
+        ]
+        print(f"Analysing previews of {len(pending)} images")
+
+        done = failed = 0
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for offset in range(0, len(pending), batch_size):
+                batch = pending[offset:offset + batch_size]
+                analyses = pool.map(_analyse_preview, [path for _, path in batch], chunksize=16)
+                for (image_id, path), (palette, placeholder, error) in zip(batch, analyses):
+                    if error:
+                        failed += 1
+                        logger.error(f"Could not read preview for image {image_id} at {path}: {error}")
+                        continue
+                    save_preview_analysis(db, image_id, palette=palette, placeholder=placeholder, commit=False)
+                db.commit()
+                done = offset + len(batch)
+                elapsed = time.perf_counter() - start
+                print(f"{done}/{len(pending)} images, {done / elapsed:.1f} images/s")
+
+        print(f"Processed {done - failed} images, {failed} failed")
+    except Exception as e:
+        print(f"Error backfilling preview analysis: {str(e)}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute dominant colours and placeholders for existing images.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (defaults to the CPU count)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Images per commit")
+    parser.add_argument("--recompute", action="store_true", help="Also recompute images that are already analysed")
+    args = parser.parse_args()
+
+    db = next(get_db())
+    backfill_preview_analysis(db, workers=args.workers, batch_size=args.batch_size, recompute=args.recompute)
@@ -1,6 +1,15 @@
 from sqlalchemy.orm import Session
+from typing import List, Tuple
+import logging
 from ..models.author import Author
 from ..schemas.author import AuthorCreate
+from backend.config import settings
+from backend.search.author_index import AuthorMatch, get_author_index, name_distance, normalize_author
+
+logger = logging.getLogger(__name__)
+
+# Whole-name typos within which a new author is logged as a likely duplicate
+NEAR_DUPLICATE_DISTANCE = 2
 
 '''Create new author in the database'''
 def create_author(db: Session, author_data: AuthorCreate) -> Author:
@@ -11,6 +20,7 @@ def create_author(db: Session, author_data: AuthorCreate) -> Author:
     db.add(author)
     db.commit()
     db.refresh(author)
+    get_author_index().add(author.id, author.name)
     return author
 
 '''Get tag information from the database'''
@@ -30,8 +40,10 @@ def get_author_list(db: Session, skip: int = 0, limit: int = 1000):
 def delete_email_by_id(db: Session, author_id: int):
     author = db.query(Author).filter(Author.id == author_id).first()
     if author:
+        author_id = author.id
         db.delete(author)
         db.commit()
+        get_author_index().remove(author_id)
     return author
 
 '''Seed constant data into the database'''    
@@ -46,9 +58,73 @@ def cast_constant_to_db(db: Session, author_data: AuthorCreate) -> Author:
     return db_author
 
 '''Type ahead text methods'''
-def search_authors(db: Session, query: str, limit: int = 10):
-    """Search authors by partial name match"""
-    return db.query(Author)\
-        .filter(Author.name.ilike(f"%{query}%"))\
-        .limit(limit)\
-        .all()
\ No newline at end of file
+def search_authors(db: Session, query: str, limit: int = 10) -> List[Author]:
+    """
+    Authors whose names best match query, typos included, best first.
+    
+    Ranked by the author trigram index: by how much of query the name
+    contains, then by edit distance, so "jhon" still finds "john smith".
+    """
+    index = get_author_index()
+    index.ensure_fresh(db)
+    matches = index.search(query, limit)
+    authors = {
+        author.id: author
+        for author in db.query(Author).filter(Author.id.in_([match.id for match in matches]))
+    }
+    return [authors[match.id] for match in matches if match.id in authors]
+
+def get_or_create_author(db: Session, name: str) -> Tuple[Author, List[AuthorMatch]]:
+    """
+    The author called name, created if there is none, with any existing
+    authors it may duplicate.
+    
+    Whether the author exists is decided by the database, by the name as
+    stored (trimmed, lower-case) and then by the placeholder email it would
+    be created with, as the author index is per process and may not have
+    seen other workers' writes yet. Only then is the index asked for names
+    differing in accents, punctuation or spacing, reused as the same
+    author, and for names a few typos away, reused up to
+    AUTHOR_MERGE_MAX_DISTANCE and otherwise returned for the caller to offer.
+    
+    Args:
+        db (Session): Database session
+        name (str): Author name as entered
+        
+    Returns:
+        Tuple[Author, List[AuthorMatch]]: The existing or new author, and
+            when new, the existing authors within NEAR_DUPLICATE_DISTANCE
+            typos of it, closest first
+    """
+    name = name.strip()
+    email = f"{name.replace(' ', '_')}@placeholder.com"
+    author = get_author_by_name(db, name.lower()) or get_author_by_email(db, email)
+    if author:
+        return author, []
+
+    index = get_author_index()
+    index.ensure_fresh(db)
+    normalized = normalize_author(name)
+    matches = index.search(name, limit=5)
+    distances = {match.id: name_distance(normalized, match.name) for match in matches}
+    similar = sorted(
+        (match for match in matches if distances[match.id] <= NEAR_DUPLICATE_DISTANCE),
+        key=lambda match: distances[match.id]
+    )
+    exact_id = index.find(name)
+    reusable = ([exact_id] if exact_id else []) + [
+        match.id for match in similar if distances[match.id] <= settings.AUTHOR_MERGE_MAX_DISTANCE
+    ]
+    for author_id in reusable:
+        # The index may still hold authors another worker has deleted
+        author = get_author_by_id(db, author_id)
+        if author:
+            return author, []
+
+    author = create_author(db, AuthorCreate(name=name, email=email))
+    if similar:
+        logger.warning(
+            f"New author '{author.name}' may duplicate "
+            + ", ".join(f"'{match.name}' (id {match.id})" for match in similar)
+        )
+    return author, similar
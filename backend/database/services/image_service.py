@@ -1,19 +1,29 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, false, func, not_, or_, select
+from sqlalchemy.orm import Query, Session, joinedload, selectinload
 from fastapi import UploadFile, File
 from ..models.image import Image
 from ..schemas.image import ImageCreate
 from ..models.tag import Tag
 from ..schemas.tag import TagCreate
-from ...processor.thumbnail_generator import generate_previews
-from .tag_service import create_tag, get_tag_by_partial_name
-from ..services.author_service import get_author_by_name, create_author
-from ..schemas.author import AuthorCreate
-from backend.config import TAGGED_DIR
-from typing import List, Optional
+from ...processor.preview_engine import get_preview_engine, PreviewJob
+from .tag_service import create_tag, get_tag_by_name
+from .job_service import enqueue_job, FINALIZE_TAGGING
+from ..models.job import Job
+from ..models.image_color import ImageColor
+from ..models.relationships import image_tags
+from ..models.author import Author
+from ..services.author_service import get_or_create_author
+from backend.config import settings, TAGGED_DIR
+from backend.search.author_index import AuthorMatch
+from backend.search.fulltext import images_fts, match_expression, matches, matching
+from backend.search.query_language import Predicate
+from backend.search.tag_autocomplete import get_tag_autocomplete
+from backend.search.tag_index import TagExpr, all_tags, get_tag_index, lock_generation
+from typing import List, Optional, Tuple
 import os
 import shutil
 import time
-import random
+import secrets
 import string
 from datetime import datetime
 from pathlib import Path
@@ -35,6 +45,14 @@ def _convert_tags_to_string(tags: List[str]) -> str:
     unique_tags = list(dict.fromkeys(cleaned_tags))
     return ','.join(unique_tags)
 
+def _get_or_create_tags(db: Session, names: List[str]) -> List[Tag]:
+    """Tag rows for names, normalised, creating (and committing) the missing ones."""
+    rows = []
+    for tag_name in names:
+        tag_name = tag_name.strip().lower()
+        rows.append(get_tag_by_name(db, tag_name) or create_tag(db, TagCreate(name=tag_name)))
+    return rows
+
 def _convert_string_to_tags(tags_string: str) -> List[str]:
     """Convert a comma-separated string to a list of tags."""
     if not tags_string:
@@ -43,21 +61,21 @@ def _convert_string_to_tags(tags_string: str) -> List[str]:
     return [tag.strip().lower() for tag in tags_string.split(',') if tag.strip()]
 
 '''Filename operations'''
+def _content_hash_filename(content_hash: str) -> str:
+    """Content-addressed filename (without extension): the file's SHA-256."""
+    return content_hash
+
 def _generate_hash_filename(original_filename: str) -> str:
-    """Generate a unique 24-character hash filename while preserving extension."""
-    # Get current timestamp with microseconds
-    current_time = datetime.now()
-    timestamp = current_time.strftime("%Y%m%d%H%M%S")
+    """
+    Generate a unique 24-character filename for images without a content hash.
     
-    # Create seed from microseconds
-    seed = int(current_time.microsecond)
-    random.seed(seed)
+    Only used for legacy records; new uploads are named by content hash.
+    """
+    # Get current timestamp
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
     
-    # Generate 10 random characters using the time-based seed
-    random_chars = ''.join(random.choices(string.ascii_lowercase + string.digits, k=10))
-    
-    # Reset the random seed to avoid affecting other random operations
-    random.seed()
+    # 10 random characters from the OS CSPRNG rather than a clock-seeded PRNG
+    random_chars = ''.join(secrets.choice(string.ascii_lowercase + string.digits) for _ in range(10))
     
     # Get original file extension
     extension = Path(original_filename).suffix
@@ -78,35 +96,27 @@ def update_image_metadata(
         if not image:
             return None
 
-        # Process tags
-        image.tags = []  # Clear existing tags
-        for tag_name in tags:
-            tag_name = tag_name.strip().lower()
-            existing_tag = get_tag_by_partial_name(db, tag_name, limit=1)
-            if existing_tag and existing_tag[0].name == tag_name:
-                tag = existing_tag[0]
-            else:
-                tag = create_tag(db, TagCreate(name=tag_name))
-            image.tags.append(tag)
+        # Process tags; creating a tag or author commits, so resolve them first
+        old_tags = [tag.name for tag in image.tags]
+        new_tag_rows = _get_or_create_tags(db, tags)
         
         # Update author - now handles removal properly
         if author is None or author.strip() == '':
             # Remove author reference
-            image.author_id = None
+            author_id = None
         else:
             # Add or update author
-            existing_author = get_author_by_name(db, author.strip())
-            if existing_author:
-                image.author_id = existing_author.id
-            else:
-                new_author = create_author(db, AuthorCreate(
-                    name=author.strip(),
-                    email=f"{author.strip().replace(' ', '_')}@placeholder.com"
-                ))
-                image.author_id = new_author.id
+            author_id = get_or_create_author(db, author)[0].id
 
+        before = lock_generation(db)
+        image.tags = new_tag_rows
+        image.author_id = author_id
+        generations = (before, lock_generation(db))
         db.commit()
         db.refresh(image)
+        new_tags = [tag.name for tag in image.tags]
+        get_tag_index().retag(image.id, old_tags, new_tags, generations)
+        get_tag_autocomplete().retag(old_tags, new_tags)
         return image
 
     except Exception as e:
@@ -114,87 +124,133 @@ def update_image_metadata(
         print(f"Database operation error: {str(e)}")
         raise e
 
-    except Exception as e:
-        db.rollback()
-        print(f"Database operation error: {str(e)}")
-        raise e
-
 def update_image_tags(
     db: Session, 
     image_id: int, 
     tags: List[str], 
     author: Optional[str] = None,
     filename: Optional[str] = None
-) -> Optional[Image]:
-    """Update image tags and move the image to tagged storage."""
+) -> Optional[Tuple[Image, Optional[Job], List[AuthorMatch]]]:
+    """
+    Update image tags and queue the move to tagged storage.
+    
+    Returns the image, the finalize job, or None for the job when the
+    image has no untagged file left to move, and when the author was new,
+    the existing authors it may duplicate.
+    """
     try:
         # Get image record
         image = get_image(db, image_id)
         if not image:
             return None
 
-        # 1. Process tags
-        image.tags = []  # Clear existing tags
-        for tag_name in tags:
-            tag_name = tag_name.strip().lower()
-            existing_tag = get_tag_by_partial_name(db, tag_name, limit=1)
-            if existing_tag and existing_tag[0].name == tag_name:
-                tag = existing_tag[0]
-            else:
-                tag = create_tag(db, TagCreate(name=tag_name))
-            image.tags.append(tag)
-        
-        # 2. Update author if provided
+        # 1. Resolve tags and author; creating either commits
+        old_tags = [tag.name for tag in image.tags]
+        new_tag_rows = _get_or_create_tags(db, tags)
+        similar_authors = []
+        db_author = None
         if author is not None:
-            existing_author = get_author_by_name(db, author.strip())
-            if existing_author:
-                image.author_id = existing_author.id
-            else:
-                new_author = create_author(db, AuthorCreate(
-                    name=author.strip(),
-                    email=f"{author.strip().replace(' ', '_')}@placeholder.com"
-                ))
-                image.author_id = new_author.id
-
-        # Early commit to save tag and author changes
-        db.commit()
+            db_author, similar_authors = get_or_create_author(db, author)
 
-        # 3. Handle file operations only if untagged path exists
-        if image.untagged_full_path and os.path.exists(image.untagged_full_path):
-            try:
-                # Generate new hashed filename
-                original_filename = os.path.basename(image.untagged_full_path)
-                hashed_filename = _generate_hash_filename(original_filename)
-                image.filename = hashed_filename
+        # 2. Set them, from here on in one transaction
+        before = lock_generation(db)
+        image.tags = new_tag_rows
+        if db_author is not None:
+            image.author_id = db_author.id
 
-                # Set up new file paths
-                tagged_path = os.path.join(TAGGED_DIR, hashed_filename)
+        # 3. Queue file operations only if untagged path exists
+        job = None
+        if image.untagged_full_path:
+            job = enqueue_job(db, FINALIZE_TAGGING, {"image_id": image.id}, commit=False)
 
-                # Generate preview images
-                if generate_previews(image.untagged_full_path):
-                    print(f"Generated previews for {hashed_filename}")
-                else:
-                    print(f"Failed to generate previews for {hashed_filename}")
-
-                # Move original image to tagged folder
-                shutil.move(image.untagged_full_path, tagged_path)
-                image.tagged_full_path = tagged_path
-                image.untagged_full_path = None
+        # Commit tag, author and job together
+        generations = (before, lock_generation(db))
+        db.commit()
+        db.refresh(image)
+        new_tags = [tag.name for tag in image.tags]
+        get_tag_index().retag(image.id, old_tags, new_tags, generations)
+        get_tag_autocomplete().retag(old_tags, new_tags)
+        return image, job, similar_authors
 
-                # Commit file changes
-                db.commit()
-                db.refresh(image)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Database operation error: {str(e)}")
+        raise e
 
-            except Exception as file_error:
-                print(f"File operation error: {str(file_error)}")
-                # Don't raise the error - we've already saved the tags and author
+def previews_ready(image: Image) -> bool:
+    """True when the previews and analysis of an image's current file are already stored."""
+    preview_paths = [image.search_preview_path, image.tag_preview_path]
+    return (
+        image.perceptual_hash is not None
+        and all(preview_paths)
+        and all(os.path.exists(path) for path in preview_paths)
+    )
 
+def finalize_tagged_image(db: Session, image_id: int) -> Optional[Image]:
+    """
+    Move a tagged image out of untagged storage, rendering previews first
+    if the upload's preview job has not.
+    
+    Runs in the background worker. Raises on failure so the job is retried;
+    calling it again after a successful move is a no-op.
+    """
+    image = get_image(db, image_id)
+    if not image:
+        return None
+    if not image.untagged_full_path:
         return image
+    if not os.path.exists(image.untagged_full_path):
+        raise FileNotFoundError(f"Untagged file missing: {image.untagged_full_path}")
+
+    # Content-addressed images keep their name; legacy ones get a fresh unique name
+    original_filename = os.path.basename(image.untagged_full_path)
+    if image.content_hash:
+        hashed_filename = _content_hash_filename(image.content_hash) + Path(original_filename).suffix
+    else:
+        hashed_filename = _generate_hash_filename(original_filename)
+
+    # Set up new file paths
+    tagged_path = os.path.join(TAGGED_DIR, hashed_filename)
+
+    if previews_ready(image):
+        # The upload's preview job already rendered and analysed this file
+        logger.info(f"Reusing previews rendered at upload for {hashed_filename}")
+    else:
+        # Generate preview images in the preview process pool
+        preview_result = get_preview_engine().render_batch(
+            [PreviewJob(source_path=image.untagged_full_path)]
+        )[0]
+        if not preview_result.success:
+            raise RuntimeError(f"Failed to generate previews for {hashed_filename}: {preview_result.error}")
+        logger.info(f"Generated previews for {hashed_filename} in {preview_result.elapsed:.2f}s")
+        save_preview_analysis(
+            db, image.id,
+            perceptual_hash=preview_result.perceptual_hash,
+            palette=preview_result.palette,
+            placeholder=preview_result.placeholder,
+            width=preview_result.width,
+            height=preview_result.height,
+            orientation=preview_result.orientation,
+            preview_version=preview_result.preview_version,
+            commit=False
+        )
 
-    except Exception as e:
+    # Move original image to tagged folder
+    os.makedirs(TAGGED_DIR, exist_ok=True)
+    shutil.move(image.untagged_full_path, tagged_path)
+    try:
+        image.filename = hashed_filename
+        image.tagged_full_path = tagged_path
+        image.untagged_full_path = None
+        db.commit()
+        db.refresh(image)
+    except Exception:
+        # Put the file back so a retry finds it where the record says it is
         db.rollback()
-        print(f"Database operation error: {str(e)}")
-        raise e
+        shutil.move(tagged_path, image.untagged_full_path)
+        raise
+
+    return image
 
 '''File path update methods'''
 def update_image_paths(
@@ -223,34 +279,33 @@ def create_image(db: Session, image_data: ImageCreate):
             search_preview_path=image_data.search_preview_path,
             tag_preview_path=image_data.tag_preview_path,
             untagged_full_path=image_data.untagged_full_path,
-            file_size=None,
-            file_type=None,
-            width=None,
-            height=None
+            file_size=image_data.file_size,
+            file_type=image_data.file_type,
+            width=image_data.width,
+            height=image_data.height,
+            content_hash=image_data.content_hash
         )
         
-        file_details = get_image_details(image_data.untagged_full_path)
-        if file_details:
-            image.file_size = file_details.get("file_size")
-            image.file_type = file_details.get("file_type")
-            image.width = file_details.get("width")
-            image.height = file_details.get("height")
+        # Uploads arrive with size and type from ingest and get dimensions from
+        # the preview pass; only open the file for callers that supply neither
+        if image_data.file_size is None or image_data.file_type is None:
+            file_details = get_image_details(image_data.untagged_full_path)
+            if file_details:
+                image.file_size = file_details.get("file_size")
+                image.file_type = file_details.get("file_type")
+                image.width = file_details.get("width")
+                image.height = file_details.get("height")
         
         if image_data.author:
-            # Handle author if provided
-            existing_author = get_author_by_name(db, image_data.author.strip())
-            if existing_author:
-                image.author_id = existing_author.id
-            else:
-                new_author = create_author(db, AuthorCreate(
-                    name=image_data.author.strip(),
-                    email=f"{image_data.author.strip().replace(' ', '_')}@placeholder.com"
-                ))
-                image.author_id = new_author.id
+            # Reuse the existing author under any spelling of the name
+            image.author_id = get_or_create_author(db, image_data.author)[0].id
 
+        before = lock_generation(db)
         db.add(image)
+        generations = (before, lock_generation(db))
         db.commit()
         db.refresh(image)
+        get_tag_index().add_image(image.id, generations)
         return image
         
     except Exception as e:
@@ -274,8 +329,55 @@ def save_image(db: Session, file: UploadFile, author: Optional[str] = None):
 def get_image(db: Session, image_id: int):
     return db.query(Image).filter(Image.id == image_id).first()
 
-def list_images(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Image).offset(skip).limit(limit).all()
+def save_preview_analysis(
+    db: Session,
+    image_id: int,
+    perceptual_hash: Optional[str] = None,
+    palette: Optional[List[Tuple[int, int]]] = None,
+    placeholder: Optional[str] = None,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    orientation: Optional[int] = None,
+    preview_version: Optional[str] = None,
+    commit: bool = True
+) -> None:
+    """
+    Store what preview rendering learned about an image: perceptual hash,
+    colours, placeholder, the dimensions and orientation of the source, and
+    the profiles version its previews were rendered with.
+    """
+    values = {}
+    if perceptual_hash:
+        values[Image.perceptual_hash] = perceptual_hash
+    if placeholder:
+        values[Image.placeholder] = placeholder
+    if width and height:
+        values[Image.width] = width
+        values[Image.height] = height
+    if orientation:
+        values[Image.orientation] = orientation
+    if preview_version:
+        values[Image.preview_version] = preview_version
+    if values:
+        db.query(Image).filter(Image.id == image_id).update(values)
+    if palette is not None:
+        db.query(ImageColor).filter(ImageColor.image_id == image_id).delete()
+        db.add_all(
+            ImageColor(image_id=image_id, color_bin=color_bin, weight=weight)
+            for color_bin, weight in palette
+        )
+    if commit:
+        db.commit()
+
+def get_image_by_content_hash(db: Session, content_hash: str) -> Optional[Image]:
+    return db.query(Image).filter(Image.content_hash == content_hash).first()
+
+def list_images(db: Session, after_id: Optional[int] = None, limit: int = 100):
+    """Images in id order, limit at a time; pass the last id seen as after_id for the next batch."""
+    query = db.query(Image)
+    if after_id is not None:
+        query = query.filter(Image.id > after_id)
+    return query.order_by(Image.id).limit(limit).all()
 
 def get_image_details(file_path: str) -> dict:
     """Get detailed file information for an image."""
@@ -337,6 +439,172 @@ def get_images_by_tags(db: Session, tags: List[str], skip: int = 0, limit: int =
     
     return query.offset(skip).limit(limit).all()
 
+def with_listing_relations(query: Query) -> Query:
+    """
+    Eager-load what image listings read, so a page costs a fixed number of queries.
+    
+    Authors are many-to-one and join into the same row; tags come from one
+    extra SELECT ... WHERE image_id IN (...) for the whole page, which
+    unlike a join does not multiply rows under LIMIT.
+    """
+    return query.options(selectinload(Image.tags), joinedload(Image.author))
+
+def _all_tags_clause(db: Session, names: List[str]):
+    """
+    Images carrying every tag in names.
+    
+    Tag names are resolved to ids first, and the intersection is one
+    `image_tags WHERE tag_id IN (...) GROUP BY image_id HAVING COUNT(*) = n`
+    subquery, whatever the number of tags. A tag that does not exist
+    matches nothing.
+    """
+    tag_ids = [tag_id for (tag_id,) in db.query(Tag.id).filter(Tag.name.in_(names))]
+    if len(tag_ids) < len(names):
+        return false()
+    return Image.id.in_(
+        select(image_tags.c.image_id)
+        .where(image_tags.c.tag_id.in_(tag_ids))
+        .group_by(image_tags.c.image_id)
+        .having(func.count() == len(tag_ids))
+    )
+
+def _tag_clause(db: Session, expr: TagExpr):
+    """SQL condition equivalent to a parsed tag query."""
+    kind, operand = expr
+    if kind == 'tag':
+        return _has_tag_clause(operand)
+    if kind == 'not':
+        return not_(_tag_clause(db, operand))
+    if kind == 'or':
+        return or_(*[_tag_clause(db, child) for child in operand])
+    
+    # AND: plain tags share one grouped subquery, anything else is ANDed on
+    names = [child[1] for child in operand if child[0] == 'tag']
+    clauses = [_tag_clause(db, child) for child in operand if child[0] != 'tag']
+    if len(names) > 1:
+        clauses.append(_all_tags_clause(db, names))
+    elif names:
+        clauses.append(_has_tag_clause(names[0]))
+    return and_(*clauses)
+
+def _has_tag_clause(name: str):
+    """Images carrying a tag, as an uncorrelated IN so it seeks tag -> image_tags -> images."""
+    return Image.id.in_(
+        select(image_tags.c.image_id)
+        .join(Tag, Tag.id == image_tags.c.tag_id)
+        .where(Tag.name == name)
+    )
+
+# Column each range field of the query language compares
+RANGE_COLUMNS = {
+    'width': Image.width,
+    'height': Image.height,
+    'size': Image.file_size,
+    'added': Image.date_added,
+}
+
+def _predicate_clause(predicate: Predicate):
+    """SQL condition for one non-tag query language predicate."""
+    if predicate.field == 'author':
+        column = Image.author_id
+        clause = column.in_(select(Author.id).where(Author.name == predicate.value))
+    elif predicate.field == 'type':
+        column = Image.file_type
+        clause = column == predicate.value
+    else:
+        column = RANGE_COLUMNS[predicate.field]
+        bounds = []
+        if predicate.low is not None:
+            bounds.append(column >= predicate.low)
+        if predicate.high is not None:
+            bounds.append(column < predicate.high)
+        clause = and_(*bounds)
+    if predicate.negated:
+        # NOT of a comparison with NULL is still NULL; images without the
+        # value are not what the term excludes
+        return or_(column.is_(None), not_(clause))
+    return clause
+
+def search_images_query(
+    db: Session,
+    tags: Optional[List[str]] = None,
+    author: Optional[str] = None,
+    color_bins: Optional[List[int]] = None,
+    tag_query: Optional[TagExpr] = None,
+    predicates: Optional[List[Predicate]] = None
+):
+    """
+    Query for images matching every filter given.
+    
+    Tag filters are evaluated against the in-memory tag bitmap index when
+    it is current (it has seen every tag and image write, including other
+    processes'). When that leaves at most TAG_INDEX_MAX_ID_LIST images, the
+    query filters on their ids alone, so the database only fetches those
+    rows. Otherwise the filters compile to the equivalent SQL condition:
+    while the index is behind, and for broad matches, where walking the
+    sort index finds a page sooner than a long id list would.
+    
+    Args:
+        db (Session): Database session
+        tags (List[str], optional): Tag names the image must all have
+        author (str, optional): Author name
+        color_bins (List[int], optional): Palette bins, any of which must be a
+            dominant colour of the image
+        tag_query (TagExpr, optional): Boolean tag expression from
+            search.tag_index.parse_tag_query
+        predicates (List[Predicate], optional): Parsed query language from
+            search.query_language.parse_search_query; tag terms join the tag
+            filters above, words and phrases are looked up in the full-text
+            index, and the rest compile to indexed column conditions
+        
+    Returns:
+        Query: Matching images, unordered, with tags and author eager-loaded;
+            page it with pagination.paginate. With words to find, images_fts
+            is joined, so it can be sorted by relevance
+    """
+    query = with_listing_relations(db.query(Image))
+
+    terms = [expr for expr in (all_tags(tags or []), tag_query) if expr is not None]
+    words, excluded_words = [], []
+    for predicate in predicates or []:
+        if predicate.field == 'tag':
+            term = ('tag', predicate.value)
+            terms.append(('not', term) if predicate.negated else term)
+        elif predicate.field == 'text':
+            (excluded_words if predicate.negated else words).append(predicate)
+        else:
+            query = query.filter(_predicate_clause(predicate))
+    if words:
+        # MATCH on the joined table itself, so relevance can sort by its rank
+        query = query.join(images_fts, images_fts.c.rowid == Image.id).filter(
+            matches(match_expression(words))
+        )
+    for predicate in excluded_words:
+        query = query.filter(Image.id.notin_(matching(match_expression([predicate]))))
+    if terms:
+        expr = terms[0] if len(terms) == 1 else ('and', tuple(terms))
+        index = get_tag_index()
+        index.ensure_fresh(db)
+        tagged = index.evaluate(expr) if index.is_current(db) else None
+        if tagged is not None and tagged.bit_count() <= settings.TAG_INDEX_MAX_ID_LIST:
+            query = query.filter(Image.id.in_(index.ids(tagged)))
+        else:
+            query = query.filter(_tag_clause(db, expr))
+
+    if author:
+        query = query.join(Image.author).filter(Author.name == author.strip().lower())
+
+    if color_bins:
+        # Resolve through the (color_bin, weight) index instead of scanning
+        query = query.filter(Image.id.in_(
+            select(ImageColor.image_id).where(
+                ImageColor.color_bin.in_(color_bins),
+                ImageColor.weight >= settings.COLOR_SEARCH_MIN_WEIGHT
+            )
+        ))
+
+    return query
+
 '''Deletion methods'''
 '''def delete_image(db: Session, image_id: int):
     image = db.query(Image).filter(Image.id == image_id).first()
@@ -364,5 +632,11 @@ def delete_image(db: Session, image_id: int) -> None:
     """Delete an image from the database."""
     image = get_image(db, image_id)
     if image:
+        tag_names = [tag.name for tag in image.tags]
+        before = lock_generation(db)
+        db.query(ImageColor).filter(ImageColor.image_id == image_id).delete()
         db.delete(image)
-        db.commit()
\ No newline at end of file
+        generations = (before, lock_generation(db))
+        db.commit()
+        get_tag_index().remove_image(image_id, tag_names, generations)
+        get_tag_autocomplete().retag(tag_names, [])
\ No newline at end of file
@@ -0,0 +1,156 @@
+from sqlalchemy import update, or_, and_
+from sqlalchemy.orm import Session
+from ..models.job import Job
+from backend.config import settings
+from datetime import datetime, timedelta
+from typing import List, Optional
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+'''Job kinds handled by backend.processor.worker'''
+GENERATE_PREVIEWS = "generate_previews"
+FINALIZE_TAGGING = "finalize_tagging"
+
+'''Create new jobs in the database'''
+def enqueue_job(
+    db: Session,
+    kind: str,
+    payload: dict,
+    max_attempts: Optional[int] = None,
+    commit: bool = True
+) -> Job:
+    """Persist a queued job. It survives restarts until a worker completes it."""
+    job = Job(
+        kind=kind,
+        payload=payload,
+        status="queued",
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        run_after=datetime.utcnow()
+    )
+    db.add(job)
+    if commit:
+        db.commit()
+        db.refresh(job)
+    else:
+        db.flush()
+    return job
+
+'''Get job information from the database'''
+def get_job(db: Session, job_id: int) -> Optional[Job]:
+    return db.query(Job).filter(Job.id == job_id).first()
+
+def _claimable(now: datetime):
+    """Queued jobs that are due, or running jobs whose lease has lapsed."""
+    return or_(
+        and_(Job.status == "queued", Job.run_after <= now),
+        and_(Job.status == "running", Job.lease_expires_at < now)
+    )
+
+'''Worker lease methods'''
+def claim_jobs(
+    db: Session,
+    worker_id: str,
+    kinds: Optional[List[str]] = None,
+    limit: int = 1,
+    lease_seconds: Optional[int] = None
+) -> List[Job]:
+    """
+    Lease up to `limit` due jobs for this worker.
+    
+    Each claim is a conditional UPDATE on a single row, so two workers racing
+    for the same job cannot both win it: the loser sees rowcount == 0.
+    """
+    now = datetime.utcnow()
+    lease_expires_at = now + timedelta(seconds=lease_seconds or settings.JOB_LEASE_SECONDS)
+
+    query = db.query(Job.id).filter(_claimable(now))
+    if kinds:
+        query = query.filter(Job.kind.in_(kinds))
+    # Over-fetch candidates since some may be taken by other workers
+    candidate_ids = [row.id for row in query.order_by(Job.run_after, Job.id).limit(limit * 2)]
+
+    claimed_ids = []
+    for job_id in candidate_ids:
+        if len(claimed_ids) >= limit:
+            break
+        result = db.execute(
+            update(Job)
+            .where(Job.id == job_id, _claimable(now))
+            .values(
+                status="running",
+                locked_by=worker_id,
+                lease_expires_at=lease_expires_at,
+                attempts=Job.attempts + 1,
+                date_updated=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        if result.rowcount == 1:
+            claimed_ids.append(job_id)
+
+    if not claimed_ids:
+        return []
+    return db.query(Job).filter(Job.id.in_(claimed_ids)).order_by(Job.id).all()
+
+def extend_leases(db: Session, jobs: List[Job], lease_seconds: Optional[int] = None) -> int:
+    """
+    Push out the leases of claimed jobs still waiting to run, so a batch
+    that outlasts JOB_LEASE_SECONDS is not reclaimed and run twice.
+    
+    Jobs that have already finished or been given up on are left alone.
+    
+    Returns:
+        int: Number of leases extended
+    """
+    if not jobs:
+        return 0
+    now = datetime.utcnow()
+    result = db.execute(
+        update(Job)
+        .where(Job.id.in_([job.id for job in jobs]), Job.status == "running")
+        .values(
+            lease_expires_at=now + timedelta(seconds=lease_seconds or settings.JOB_LEASE_SECONDS),
+            date_updated=now
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+def complete_job(db: Session, job: Job, result: Optional[dict] = None) -> Job:
+    """Mark a leased job as succeeded."""
+    now = datetime.utcnow()
+    job.status = "succeeded"
+    job.result = result
+    job.last_error = None
+    job.locked_by = None
+    job.lease_expires_at = None
+    job.date_finished = now
+    db.commit()
+    return job
+
+def _retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, capped at JOB_RETRY_MAX_SECONDS."""
+    delay = settings.JOB_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    delay = min(delay, settings.JOB_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+def fail_job(db: Session, job: Job, error: str, retry: bool = True) -> Job:
+    """Record a failure and either reschedule the job or give up on it; retry=False gives up at once."""
+    now = datetime.utcnow()
+    job.last_error = error
+    job.locked_by = None
+    job.lease_expires_at = None
+    if not retry or job.attempts >= job.max_attempts:
+        job.status = "failed"
+        job.date_finished = now
+        logger.error(f"Job {job.id} ({job.kind}) failed permanently after {job.attempts} attempts: {error}")
+    else:
+        job.status = "queued"
+        job.run_after = now + timedelta(seconds=_retry_delay(job.attempts))
+        logger.warning(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed, retrying at {job.run_after}: {error}")
+    db.commit()
+    return job
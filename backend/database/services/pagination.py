@@ -0,0 +1,114 @@
+'''Keyset (cursor) pagination of image listings.'''
+from sqlalchemy import func, literal_column, or_
+from sqlalchemy.orm import Query
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+import base64
+import binascii
+import json
+
+from ..models.image import Image
+from backend.search.fulltext import images_fts
+from backend.utils.error_codes import ErrorCode
+from backend.utils.error_handling import AppError
+
+# Sort name to the expression listings are ordered by. Nullable columns are
+# coalesced so every row has a comparable key; each expression, followed by
+# id, has a matching index (see models.image). The 0 is inlined, not bound,
+# or the planner cannot match the expression to its index. relevance is the
+# bm25 rank of a full-text search, best first in ascending order, and only
+# applies to queries joined to images_fts.
+ZERO = literal_column("0")
+SORT_KEYS = {
+    "date_added": Image.date_added,
+    "file_size": func.coalesce(Image.file_size, ZERO),
+    "dimensions": func.coalesce(Image.width, ZERO) * func.coalesce(Image.height, ZERO),
+    "relevance": images_fts.c.rank,
+}
+SORT_ORDERS = ("asc", "desc")
+
+def _invalid(message: str) -> AppError:
+    return AppError(message=message, error_code=ErrorCode.VALIDATION_ERROR, status_code=400)
+
+def encode_cursor(sort: str, order: str, value: Any, image_id: int) -> str:
+    """Opaque cursor that resumes a listing after the row with this sort key and id."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, order, value, image_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str, order: str) -> Tuple[Any, int]:
+    """
+    (sort key, id) a cursor resumes after.
+
+    Raises AppError (400) for malformed cursors or ones issued for a
+    different sort, which would silently skip or repeat rows.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, cursor_order, value, image_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError, binascii.Error):
+        raise _invalid("Invalid cursor")
+    if (cursor_sort, cursor_order) != (sort, order) or not isinstance(image_id, int):
+        raise _invalid("Cursor does not belong to this sort order")
+    if sort == "date_added":
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise _invalid("Invalid cursor")
+    return value, image_id
+
+def paginate(
+    query: Query,
+    sort: str = "date_added",
+    order: str = "asc",
+    cursor: Optional[str] = None,
+    limit: int = 100
+) -> Tuple[List[Image], Optional[str]]:
+    """
+    One page of an image query, ordered by (sort key, id).
+
+    The cursor is the (sort key, id) of the previous page's last row, and
+    the page seeks past it through the composite index rather than
+    skipping rows with OFFSET, so every page costs the same however deep.
+
+    Args:
+        query (Query): Image query with filters applied and no ordering
+        sort (str): One of SORT_KEYS
+        order (str): "asc" or "desc"
+        cursor (str, optional): next_cursor of the previous page
+        limit (int): Maximum number of images to return
+
+    Returns:
+        Tuple[List[Image], Optional[str]]: The page and the cursor for the
+            next one, None on the last page
+    """
+    if sort not in SORT_KEYS:
+        raise _invalid(f"Unknown sort '{sort}', expected one of {', '.join(SORT_KEYS)}")
+    if order not in SORT_ORDERS:
+        raise _invalid("Order must be 'asc' or 'desc'")
+
+    key = SORT_KEYS[sort]
+    if cursor:
+        value, image_id = decode_cursor(cursor, sort, order)
+        # (key, id) past the cursor, spelled with a plain range on key so
+        # the planner seeks into the index; SQLite only does that for row
+        # values on plain columns
+        if order == "asc":
+            query = query.filter(key >= value, or_(key > value, Image.id > image_id))
+        else:
+            query = query.filter(key <= value, or_(key < value, Image.id < image_id))
+
+    if order == "asc":
+        query = query.order_by(key.asc(), Image.id.asc())
+    else:
+        query = query.order_by(key.desc(), Image.id.desc())
+
+    # The sort key is selected alongside each image for the cursor, as not
+    # every key (relevance) can be recomputed from the image; the extra row
+    # only says whether there is another page
+    rows = query.add_columns(key).limit(limit + 1).all()
+    images = [image for image, _ in rows[:limit]]
+    if len(rows) <= limit:
+        return images, None
+    return images, encode_cursor(sort, order, rows[limit - 1][1], images[-1].id)
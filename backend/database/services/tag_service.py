@@ -1,6 +1,8 @@
 from sqlalchemy.orm import Session
 from ..models.tag import Tag
 from ..schemas.tag import TagCreate
+from backend.search.tag_autocomplete import get_tag_autocomplete
+from backend.search.tag_index import get_tag_index, lock_generation
 
 '''Create new tag in the database'''
 def create_tag(db: Session, tag_data: TagCreate) -> Tag:
@@ -8,6 +10,7 @@ def create_tag(db: Session, tag_data: TagCreate) -> Tag:
     db.add(tag)
     db.commit()
     db.refresh(tag)
+    get_tag_autocomplete().add_tag(tag)
     return tag
 
 '''Get tag information from the database'''
@@ -20,6 +23,9 @@ def get_tag_name(db: Session, tag_id: int):
 def get_tag_list(db: Session, skip: int = 0, limit: int = 3000):
     return db.query(Tag).offset(skip).limit(limit).all()
 
+def get_tag_by_name(db: Session, name: str):
+    return db.query(Tag).filter(Tag.name == name).first()
+
 def get_tag_by_partial_name(db: Session, query: str, limit: int = 10):
     """Search tags by partial name match"""
     return db.query(Tag)\
@@ -31,8 +37,13 @@ def get_tag_by_partial_name(db: Session, query: str, limit: int = 10):
 def delete_tag_id(db: Session, tag_id: int):
     tag = db.query(Tag).filter(Tag.id == tag_id).first()
     if tag:
+        name = tag.name
+        before = lock_generation(db)
         db.delete(tag)
+        generations = (before, lock_generation(db))
         db.commit()
+        get_tag_index().remove_tag(name, generations)
+        get_tag_autocomplete().remove_tag(name)
     return tag
 
 '''Seed constant data into the database'''    
@@ -0,0 +1,70 @@
+'''Dominant colour extraction by histogram binning, and colour bin helpers.'''
+from PIL import Image
+from typing import List, Tuple
+import re
+
+import numpy as np
+
+BITS_PER_CHANNEL = 4                 # 16 levels per channel, 4096 bins
+LEVELS = 1 << BITS_PER_CHANNEL
+SHIFT = 8 - BITS_PER_CHANNEL
+SAMPLE_PIXELS = 16384                # Enough for stable weights on a 400px preview
+
+HEX_COLOR = re.compile(r"^#?([0-9a-fA-F]{6})$")
+
+def extract_palette(img: Image.Image, max_colors: int = 5, min_weight: int = 5) -> List[Tuple[int, int]]:
+    """
+    Dominant colours of an image as (colour bin, weight percent), heaviest first.
+    
+    Pixels are quantised to 4 bits per channel and counted with bincount over
+    an evenly strided subsample; bins under min_weight percent are dropped.
+    """
+    pixels = np.asarray(img.convert('RGB'), dtype=np.uint8).reshape(-1, 3)
+    step = max(1, len(pixels) // SAMPLE_PIXELS)
+    sample = pixels[::step] >> SHIFT
+
+    bins = (
+        (sample[:, 0].astype(np.int32) << (2 * BITS_PER_CHANNEL))
+        | (sample[:, 1].astype(np.int32) << BITS_PER_CHANNEL)
+        | sample[:, 2].astype(np.int32)
+    )
+    counts = np.bincount(bins, minlength=LEVELS ** 3)
+    weights = counts * 100 // max(1, len(bins))
+
+    top = np.argsort(counts)[::-1][:max_colors]
+    return [(int(color_bin), int(weights[color_bin])) for color_bin in top if weights[color_bin] >= min_weight]
+
+def _split(color_bin: int) -> Tuple[int, int, int]:
+    mask = LEVELS - 1
+    return (
+        (color_bin >> (2 * BITS_PER_CHANNEL)) & mask,
+        (color_bin >> BITS_PER_CHANNEL) & mask,
+        color_bin & mask,
+    )
+
+def _join(red: int, green: int, blue: int) -> int:
+    return (red << (2 * BITS_PER_CHANNEL)) | (green << BITS_PER_CHANNEL) | blue
+
+def hex_to_bin(color: str) -> int:
+    """Colour bin of a hex colour such as 'ff8800' or '#ff8800'."""
+    match = HEX_COLOR.match(color.strip())
+    if not match:
+        raise ValueError(f"Invalid hex colour: {color}")
+    value = int(match.group(1), 16)
+    return _join((value >> 16) >> SHIFT, ((value >> 8) & 0xFF) >> SHIFT, (value & 0xFF) >> SHIFT)
+
+def bin_to_hex(color_bin: int) -> str:
+    """Hex colour at the centre of a bin."""
+    half = (1 << SHIFT) // 2
+    red, green, blue = (level << SHIFT | half for level in _split(color_bin))
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+def neighbor_bins(color_bin: int, radius: int = 1) -> List[int]:
+    """Bins within `radius` levels on every channel, so nearby shades match too."""
+    red, green, blue = _split(color_bin)
+    span = range(-radius, radius + 1)
+    return [
+        _join(red + dr, green + dg, blue + db)
+        for dr in span for dg in span for db in span
+        if 0 <= red + dr < LEVELS and 0 <= green + dg < LEVELS and 0 <= blue + db < LEVELS
+    ]
@@ -0,0 +1,12 @@
+'''SHA-256 content hashing for content-addressed image storage.'''
+import hashlib
+
+CHUNK_SIZE = 1024 * 1024
+
+def hash_file(path: str) -> str:
+    """SHA-256 hex digest of a file on disk."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,296 @@
+'''Memory-bounded image decoding: header checks, a per-process decode budget and strip-wise PNG downscaling.'''
+from PIL import Image, UnidentifiedImageError
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+import io
+import logging
+import os
+import struct
+import threading
+import zlib
+
+from backend.config import settings
+from backend.utils.error_codes import ErrorCode
+from backend.utils.error_handling import AppError
+
+logger = logging.getLogger(__name__)
+
+# Pillow raises DecompressionBombError at twice this; our own check rejects at 1x
+Image.MAX_IMAGE_PIXELS = settings.MAX_IMAGE_PIXELS
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_BYTES_PER_PIXEL = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}  # 8-bit samples, by colour type
+PNG_COPIED_CHUNKS = {b"PLTE", b"tRNS"}                # Needed to decode each strip on its own
+STRIP_BYTES = 4 * 1024 * 1024                         # Raw scanline bytes decoded per strip
+WORKING_COPIES = 3                                    # Decoded image, RGB copy and first resize
+
+class ImageRejectedError(AppError):
+    """An image that will not be decoded because of its size or content."""
+    def __init__(
+        self,
+        message: str,
+        error_code: ErrorCode = ErrorCode.IMAGE_TOO_LARGE,
+        status_code: int = 413
+    ):
+        super().__init__(message=message, error_code=error_code, status_code=status_code)
+
+class DecodeBudget:
+    """
+    Counting semaphore over bytes of decoded pixels.
+
+    Each decode reserves its estimated peak memory and waits while the
+    process-wide total would exceed the limit, so concurrent requests or
+    pool threads cannot together decode more than the budget.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def reserve(self, nbytes: int) -> Iterator[None]:
+        # A single decode larger than the budget runs alone rather than never
+        nbytes = min(nbytes, self.limit)
+        with self._condition:
+            while self.in_use + nbytes > self.limit:
+                self._condition.wait()
+            self.in_use += nbytes
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_use -= nbytes
+                self._condition.notify_all()
+
+_budget: Optional[DecodeBudget] = None
+_budget_lock = threading.Lock()
+
+def get_decode_budget() -> DecodeBudget:
+    """The decode budget shared by everything in this process."""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = DecodeBudget(settings.DECODE_MEMORY_BUDGET_BYTES)
+        return _budget
+
+def fit_size(size: Tuple[int, int], box: Tuple[int, int]) -> Tuple[int, int]:
+    """Size that fits inside box while keeping aspect ratio, never upscaling."""
+    width, height = size
+    ratio = min(box[0] / width, box[1] / height)
+    if ratio >= 1:
+        return size
+    return (max(1, int(width * ratio)), max(1, int(height * ratio)))
+
+@contextmanager
+def open_image(path: str) -> Iterator[Image.Image]:
+    """
+    Open an image and check its header against the byte and pixel budgets.
+
+    Only the header has been read when this yields; nothing is decoded.
+    Raises ImageRejectedError for files that are too large or not images.
+    """
+    file_size = os.path.getsize(path)
+    if file_size > settings.MAX_IMAGE_BYTES:
+        raise ImageRejectedError(
+            f"Image file is {file_size} bytes, the limit is {settings.MAX_IMAGE_BYTES}"
+        )
+
+    try:
+        img = Image.open(path)
+    except Image.DecompressionBombError as e:
+        raise ImageRejectedError(str(e))
+    except UnidentifiedImageError:
+        raise ImageRejectedError(
+            "File is not a recognised image",
+            error_code=ErrorCode.INVALID_IMAGE_FORMAT,
+            status_code=415
+        )
+
+    with img:
+        width, height = img.size
+        if width * height > settings.MAX_IMAGE_PIXELS:
+            raise ImageRejectedError(
+                f"Image is {width}x{height} pixels, the limit is {settings.MAX_IMAGE_PIXELS} pixels"
+            )
+        yield img
+
+def _bytes_per_pixel(mode: str) -> int:
+    """Bytes Pillow stores per pixel; multi-band 8-bit images are padded to 4."""
+    return 1 if mode in ('1', 'L', 'P') else 4
+
+def _png_header(path: str) -> Optional[Tuple[int, int, int, int, int]]:
+    """(width, height, bit depth, colour type, interlace) from a PNG's IHDR."""
+    with open(path, 'rb') as fp:
+        head = fp.read(29)
+    if len(head) < 29 or not head.startswith(PNG_SIGNATURE) or head[12:16] != b"IHDR":
+        return None
+    width, height, bit_depth, colour_type, _, _, interlace = struct.unpack(">IIBBBBB", head[16:29])
+    return width, height, bit_depth, colour_type, interlace
+
+def _can_strip_decode(img: Image.Image) -> bool:
+    """Strip decoding handles non-interlaced 8-bit PNGs of any colour type."""
+    if img.format != 'PNG' or not img.filename:
+        return False
+    header = _png_header(img.filename)
+    return (
+        header is not None
+        and header[2] == 8
+        and header[3] in PNG_BYTES_PER_PIXEL
+        and header[4] == 0
+    )
+
+def _jpeg_draft_scale(size: Tuple[int, int], box: Tuple[int, int]) -> int:
+    """The DCT scale (1, 2, 4 or 8) draft() will pick for box."""
+    target = fit_size(size, box)
+    scale = 1
+    while scale < 8 and size[0] // (scale * 2) >= target[0] and size[1] // (scale * 2) >= target[1]:
+        scale *= 2
+    return scale
+
+def _strip_factor(size: Tuple[int, int], box: Tuple[int, int]) -> int:
+    """Integer reduction that keeps the strip-decoded result at least as large as fit_size(box)."""
+    target = fit_size(size, box)
+    return max(1, min(size[0] // target[0], size[1] // target[1]))
+
+def decode_cost(img: Image.Image, box: Tuple[int, int]) -> int:
+    """Estimated peak bytes of decoding img for a preview that fits box."""
+    width, height = img.size
+    if img.format == 'JPEG':
+        scale = _jpeg_draft_scale(img.size, box)
+        pixels = -(-width // scale) * -(-height // scale)
+        return pixels * 4 * WORKING_COPIES
+    if width * height >= settings.STRIP_DECODE_MIN_PIXELS and _can_strip_decode(img):
+        factor = _strip_factor(img.size, box)
+        reduced = -(-width // factor) * -(-height // factor)
+        return (STRIP_BYTES + reduced * 4) * WORKING_COPIES
+    return width * height * _bytes_per_pixel(img.mode) * WORKING_COPIES
+
+def _png_chunks(fp) -> Iterator[Tuple[bytes, bytes]]:
+    """(type, data) for each chunk after the PNG signature."""
+    fp.seek(len(PNG_SIGNATURE))
+    while True:
+        header = fp.read(8)
+        if len(header) < 8:
+            return
+        length, chunk_type = struct.unpack(">I4s", header)
+        data = fp.read(length)
+        fp.read(4)  # CRC; zlib and Pillow catch corrupt data
+        yield chunk_type, data
+        if chunk_type == b"IEND":
+            return
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """Serialise one PNG chunk with its CRC."""
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+def _strip_downscale_png(path: str, box: Tuple[int, int]) -> Image.Image:
+    """
+    Downscale a large PNG without ever holding it fully decoded.
+
+    The IDAT stream is inflated incrementally and cut into strips of whole
+    scanlines. Each strip is wrapped as a small standalone PNG, prefixed
+    with the previous strip's last row (already unfiltered, so filter type
+    None) so Up/Average/Paeth filters resolve, decoded by Pillow, and
+    box-reduced by an integer factor into the output. Strip heights are
+    multiples of that factor so the reduced strips tile without seams.
+    """
+    header = _png_header(path)
+    width, height, bit_depth, colour_type, _ = header
+    row_bytes = width * PNG_BYTES_PER_PIXEL[colour_type] + 1  # Leading filter byte
+    factor = _strip_factor((width, height), box)
+    strip_rows = factor * max(1, STRIP_BYTES // (row_bytes * factor))
+
+    with open(path, 'rb') as fp:
+        copied = []
+        has_transparency = colour_type in (4, 6)
+        output = None
+        inflater = zlib.decompressobj()
+        pending = bytearray()
+        prior_row = None
+        y = 0
+
+        def flush(count: int) -> None:
+            """Decode the first count rows of pending into the output and drop them."""
+            nonlocal output, prior_row, y
+            raw = bytearray(prior_row or b"")
+            with memoryview(pending) as view:
+                raw += view[:count * row_bytes]
+            del pending[:count * row_bytes]
+            ihdr = struct.pack(">IIBBBBB", width, count + (1 if prior_row else 0), bit_depth, colour_type, 0, 0, 0)
+            strip_png = (
+                PNG_SIGNATURE + _png_chunk(b"IHDR", ihdr) + b"".join(copied)
+                + _png_chunk(b"IDAT", zlib.compress(raw, 0)) + _png_chunk(b"IEND", b"")
+            )
+            with Image.open(io.BytesIO(strip_png)) as strip:
+                strip.load()
+                if prior_row:
+                    strip = strip.crop((0, 1, width, strip.height))
+                prior_row = b"\x00" + strip.crop((0, strip.height - 1, width, strip.height)).tobytes()
+
+                mode = 'RGBA' if has_transparency else ('L' if colour_type == 0 else 'RGB')
+                if output is None:
+                    output = Image.new(mode, (-(-width // factor), -(-height // factor)))
+                output.paste(strip.convert(mode).reduce(factor), (0, y // factor))
+            y += count
+
+        for chunk_type, data in _png_chunks(fp):
+            if chunk_type in PNG_COPIED_CHUNKS:
+                copied.append(_png_chunk(chunk_type, data))
+                has_transparency = has_transparency or chunk_type == b"tRNS"
+            elif chunk_type == b"IDAT":
+                # Bound each inflate call so a compression bomb cannot balloon pending
+                data = inflater.decompress(data, STRIP_BYTES)
+                while True:
+                    pending += data
+                    while len(pending) >= strip_rows * row_bytes and y + strip_rows < height:
+                        flush(strip_rows)
+                    if not inflater.unconsumed_tail:
+                        break
+                    data = inflater.decompress(inflater.unconsumed_tail, STRIP_BYTES)
+            elif chunk_type == b"IEND":
+                break
+
+        pending += inflater.flush()
+        remaining = min(len(pending) // row_bytes, height - y)
+        if remaining:
+            flush(remaining)
+        if output is None or y < height:
+            raise ImageRejectedError(
+                f"PNG ended after {y} of {height} rows",
+                error_code=ErrorCode.INVALID_IMAGE_FORMAT,
+                status_code=415
+            )
+        return output
+
+@contextmanager
+def decode_reduced(img: Image.Image, box: Tuple[int, int]) -> Iterator[Image.Image]:
+    """
+    Decode an image opened with open_image at the lowest cost that still fills box.
+
+    JPEGs use reduced-scale DCT decoding, large non-interlaced PNGs are
+    downscaled strip by strip, and everything else decodes in full. The
+    estimated peak memory stays reserved against the process decode budget
+    until the block exits, so do the resizing inside it. Images that would
+    need more than the whole budget are rejected.
+    """
+    cost = decode_cost(img, box)
+    if cost > settings.DECODE_MEMORY_BUDGET_BYTES:
+        width, height = img.size
+        raise ImageRejectedError(
+            f"Decoding {width}x{height} {img.format} needs about {cost} bytes, "
+            f"the budget is {settings.DECODE_MEMORY_BUDGET_BYTES}"
+        )
+
+    with get_decode_budget().reserve(cost):
+        width, height = img.size
+        if img.format == 'JPEG':
+            img.draft('RGB', fit_size(img.size, box))
+            img.load()
+            yield img
+        elif width * height >= settings.STRIP_DECODE_MIN_PIXELS and _can_strip_decode(img):
+            logger.info(f"Strip decoding {width}x{height} PNG {img.filename}")
+            yield _strip_downscale_png(img.filename, box)
+        else:
+            img.load()
+            yield img
@@ -0,0 +1,186 @@
+'''Disk cache of on-demand resized derivatives, bucketed by size with LRU eviction.'''
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+class DerivativeCache:
+    """
+    Cache rendered derivatives on disk keyed by (image id, version, bucket, format).
+
+    - Requested sizes snap to a small set of buckets so arbitrary max_size
+      values cannot create unbounded variants.
+    - Concurrent misses for the same key in this process are coalesced: one
+      thread renders while the others wait and then read its file.
+    - A hit refreshes the file's mtime, so evicting oldest-mtime first under
+      the byte budget is LRU.
+    - Eviction, in this process or another, may delete a file just after it
+      was found; read_or_render hands out its bytes instead of its path.
+    """
+
+    def __init__(self, root: str, max_bytes: int, buckets: List[int]):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.buckets = sorted(buckets)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._approx_bytes: Optional[int] = None
+        os.makedirs(root, exist_ok=True)
+
+    def bucket_for(self, max_size: int) -> int:
+        """Smallest bucket that covers max_size, or the largest bucket."""
+        for bucket in self.buckets:
+            if bucket >= max_size:
+                return bucket
+        return self.buckets[-1]
+
+    def path_for(self, image_id: int, version: str, bucket: int, extension: str) -> str:
+        return os.path.join(self.root, f"{image_id}_{version}_{bucket}{extension}")
+
+    def sprite_path(self, key: str, extension: str) -> str:
+        """Path of a cached sprite sheet or its coordinate map."""
+        return os.path.join(self.root, f"sprite_{key}{extension}")
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def _release_key_lock(self, key: str, lock: threading.Lock) -> None:
+        # Forget idle locks so the table does not grow with every key ever seen
+        with self._locks_guard:
+            if self._locks.get(key) is lock and not lock.locked():
+                del self._locks[key]
+
+    def get_or_render(self, path: str, render: Callable[[], bytes]) -> str:
+        """Return the cached file at path, rendering it once on a miss."""
+        if self._touch(path):
+            return path
+
+        lock = self._key_lock(path)
+        with lock:
+            # Another thread may have rendered it while we waited
+            if not self._touch(path):
+                data = render()
+                self._write_atomic(path, data)
+                self._account(len(data))
+        self._release_key_lock(path, lock)
+        return path
+
+    def read_or_render(self, path: str, render: Callable[[], bytes]) -> Tuple[bytes, float]:
+        """
+        Content and mtime of the cached file at path, rendering it once on a
+        miss. A file evicted before it could be read counts as a miss.
+        """
+        cached = self._read(path)
+        if cached is not None:
+            return cached
+
+        lock = self._key_lock(path)
+        with lock:
+            # Another thread may have rendered it while we waited
+            cached = self._read(path)
+            if cached is None:
+                data = render()
+                self._write_atomic(path, data)
+                self._account(len(data))
+                cached = (data, time.time())
+        self._release_key_lock(path, lock)
+        return cached
+
+    def _read(self, path: str) -> Optional[Tuple[bytes, float]]:
+        """Touch and read a cached file; once open, eviction cannot cut it short. None if absent."""
+        try:
+            os.utime(path)
+            with open(path, "rb") as cached_file:
+                return cached_file.read(), os.fstat(cached_file.fileno()).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _touch(self, path: str) -> bool:
+        """Mark a cached file as recently used. False if it does not exist."""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        """Write via a temp file and rename so readers never see partial files."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _account(self, added_bytes: int) -> None:
+        """Track approximate usage and evict once the budget is exceeded."""
+        with self._evict_lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = self._scan_total()
+            self._approx_bytes += added_bytes
+            if self._approx_bytes > self.max_bytes:
+                self._approx_bytes = self._evict()
+
+    def _entries(self):
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    yield entry
+
+    def _scan_total(self) -> int:
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _evict(self) -> int:
+        """Delete least recently used files until usage is below 90% of the budget."""
+        files = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                evicted += 1
+            except FileNotFoundError:
+                total -= size
+        if evicted:
+            logger.info(f"Evicted {evicted} derivatives, cache now {total} bytes")
+        return total
+
+_cache: Optional[DerivativeCache] = None
+_cache_lock = threading.Lock()
+
+def get_derivative_cache() -> DerivativeCache:
+    """Return the process-wide derivative cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DerivativeCache(
+                root=settings.DERIVATIVE_CACHE_DIR,
+                max_bytes=settings.DERIVATIVE_CACHE_MAX_BYTES,
+                buckets=settings.DERIVATIVE_SIZE_BUCKETS
+            )
+        return _cache
@@ -0,0 +1,52 @@
+'''Single-pass ingest: everything the upload path learns while storing a file.'''
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+import hashlib
+
+from backend.processor.content_hash import CHUNK_SIZE
+
+# Leading bytes that identify each accepted format, checked in order
+MAGIC_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+]
+ISO_BRANDS = {b"avif": "image/avif", b"avis": "image/avif", b"heic": "image/heic", b"heix": "image/heic"}
+
+@dataclass
+class IngestedFile:
+    """What was learned about an upload while streaming it to disk."""
+    content_hash: str               # SHA-256 as hex
+    file_size: int                  # Bytes
+    mime_type: Optional[str]        # Sniffed from magic bytes, None if unrecognised
+
+def sniff_mime_type(head: bytes) -> Optional[str]:
+    """MIME type of an image from its first bytes, independent of the filename."""
+    for signature, mime_type in MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        return ISO_BRANDS.get(head[8:12])
+    return None
+
+def store_upload(source: BinaryIO, destination: BinaryIO) -> IngestedFile:
+    """Stream source into destination, hashing, measuring and sniffing it on the way through."""
+    digest = hashlib.sha256()
+    size = 0
+    mime_type = None
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        if size == 0:
+            mime_type = sniff_mime_type(chunk)
+        digest.update(chunk)
+        destination.write(chunk)
+        size += len(chunk)
+    return IngestedFile(content_hash=digest.hexdigest(), file_size=size, mime_type=mime_type)
@@ -0,0 +1,30 @@
+'''Perceptual hashing for near-duplicate detection.'''
+from PIL import Image
+import numpy as np
+
+HASH_BITS = 64
+
+def dhash(img: Image.Image) -> int:
+    """
+    64-bit difference hash of an image.
+    
+    The image is shrunk to 9x8 grayscale and each bit records whether a pixel
+    is brighter than its right neighbour, which survives re-encoding,
+    resizing and small colour shifts. Pass an already-downscaled preview;
+    hashing the original would mean another full decode.
+    """
+    pixels = np.asarray(
+        img.convert('L').resize((9, 8), Image.Resampling.BOX),
+        dtype=np.int16
+    )
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hash_to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+def hex_to_hash(value: str) -> int:
+    return int(value, 16)
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
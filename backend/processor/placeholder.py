@@ -0,0 +1,26 @@
+'''Tiny inline placeholders shown while the real preview loads.'''
+from PIL import Image
+import base64
+import io
+
+from backend.processor.preview_profiles import FORMAT_MEDIA_TYPES, can_encode
+
+PLACEHOLDER_SIZE = 16                # Longest side in pixels; the browser blurs it when scaled up
+PLACEHOLDER_QUALITY = 40
+
+def render_placeholder(img: Image.Image) -> str:
+    """
+    Encode a ~16px copy of an image as a data URI.
+    
+    WebP keeps this to a couple of hundred bytes so it can ride along in
+    search responses; JPEG is used when Pillow has no WebP encoder. Pass an
+    already-downscaled preview.
+    """
+    small = img.convert('RGB')
+    small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BOX)
+
+    fmt = 'WEBP' if can_encode('WEBP') else 'JPEG'
+    buffer = io.BytesIO()
+    small.save(buffer, format=fmt, quality=PLACEHOLDER_QUALITY)
+    encoded = base64.b64encode(buffer.getvalue()).decode('ascii')
+    return f"data:{FORMAT_MEDIA_TYPES[fmt]};base64,{encoded}"
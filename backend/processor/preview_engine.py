@@ -0,0 +1,175 @@
+'''Process pool engine that renders preview images off the request thread.'''
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import asyncio
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+from backend.config import settings
+from backend.processor.decode_guard import ImageRejectedError
+from backend.processor.preview_profiles import PREVIEW_PROFILES, profiles_version
+from backend.processor.thumbnail_generator import render_preview_pyramid, preview_base_filename
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class PreviewJob:
+    """A single file to render previews for."""
+    source_path: str
+    base_filename: Optional[str] = None
+
+@dataclass
+class PreviewResult:
+    """Outcome of rendering one PreviewJob."""
+    source_path: str
+    base_filename: Optional[str]
+    success: bool
+    elapsed: float              # Seconds spent rendering inside the worker
+    error: Optional[str] = None
+    retryable: bool = True      # False when the input itself was rejected
+    perceptual_hash: Optional[str] = None
+    palette: Optional[List[Tuple[int, int]]] = None
+    placeholder: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    orientation: Optional[int] = None
+    preview_version: Optional[str] = None   # profiles_version() the previews were rendered with
+
+def _render_job(job: PreviewJob) -> PreviewResult:
+    """Render previews for one job. Runs inside a pool worker process."""
+    start = time.perf_counter()
+    try:
+        pyramid = render_preview_pyramid(
+            job.source_path,
+            preview_base_filename(job.source_path, job.base_filename),
+            list(PREVIEW_PROFILES.values())
+        )
+    except Exception as e:
+        logger.error(f"Error generating previews for {job.source_path}: {str(e)}")
+        return PreviewResult(
+            source_path=job.source_path,
+            base_filename=job.base_filename,
+            success=False,
+            elapsed=time.perf_counter() - start,
+            error=str(e),
+            retryable=not isinstance(e, ImageRejectedError)
+        )
+
+    return PreviewResult(
+        source_path=job.source_path,
+        base_filename=job.base_filename,
+        success=True,
+        elapsed=time.perf_counter() - start,
+        perceptual_hash=pyramid.perceptual_hash,
+        palette=pyramid.palette,
+        placeholder=pyramid.placeholder,
+        width=pyramid.width,
+        height=pyramid.height,
+        orientation=pyramid.orientation,
+        preview_version=profiles_version()
+    )
+
+class PreviewEngine:
+    """Fan preview jobs out across a pool of worker processes."""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or settings.PREVIEW_WORKERS or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the pool lazily so importing this module never forks."""
+        with self._lock:
+            if self._executor is None:
+                # Spawn rather than fork: the API process is multi-threaded
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _reset_executor(self) -> None:
+        """Drop a broken pool so the next submission starts a fresh one."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def submit(self, job: PreviewJob) -> Future:
+        """Queue one job and return a future resolving to a PreviewResult."""
+        try:
+            return self._get_executor().submit(_render_job, job)
+        except BrokenProcessPool:
+            logger.warning("Preview pool was broken, restarting it")
+            self._reset_executor()
+            return self._get_executor().submit(_render_job, job)
+
+    def _collect(self, job: PreviewJob, future: Future) -> PreviewResult:
+        """Turn a finished future into a result, even if the worker died."""
+        try:
+            return future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._reset_executor()
+            logger.error(f"Preview worker failed for {job.source_path}: {str(e)}")
+            return PreviewResult(
+                source_path=job.source_path,
+                base_filename=job.base_filename,
+                success=False,
+                elapsed=0.0,
+                error=str(e)
+            )
+
+    def render_batch(self, jobs: List[PreviewJob]) -> List[PreviewResult]:
+        """Render a batch of jobs in parallel and return results in job order."""
+        start = time.perf_counter()
+        futures = [self.submit(job) for job in jobs]
+        results = [self._collect(job, future) for job, future in zip(jobs, futures)]
+        self._log_batch(results, time.perf_counter() - start)
+        return results
+
+    async def render_batch_async(self, jobs: List[PreviewJob]) -> List[PreviewResult]:
+        """Awaitable variant of render_batch for async endpoints."""
+        start = time.perf_counter()
+        futures = [self.submit(job) for job in jobs]
+        await asyncio.gather(
+            *(asyncio.wrap_future(future) for future in futures),
+            return_exceptions=True
+        )
+        results = [self._collect(job, future) for job, future in zip(jobs, futures)]
+        self._log_batch(results, time.perf_counter() - start)
+        return results
+
+    def _log_batch(self, results: List[PreviewResult], wall_time: float) -> None:
+        if not results:
+            return
+        failed = sum(1 for result in results if not result.success)
+        cpu_time = sum(result.elapsed for result in results)
+        logger.info(
+            f"Rendered {len(results)} previews ({failed} failed) in {wall_time:.2f}s "
+            f"wall / {cpu_time:.2f}s worker time across {self.max_workers} processes"
+        )
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+_engine: Optional[PreviewEngine] = None
+_engine_lock = threading.Lock()
+
+def get_preview_engine() -> PreviewEngine:
+    """Return the process-wide preview engine, creating it on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = PreviewEngine()
+            atexit.register(_engine.shutdown, False)
+        return _engine
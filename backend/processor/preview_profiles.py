@@ -0,0 +1,150 @@
+'''Registry of preview profiles loaded from Settings.PREVIEW_PROFILES.'''
+from PIL import Image
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import functools
+import hashlib
+import json
+import logging
+import os
+
+from backend.config import settings, FILE_SHARE_DIR
+
+logger = logging.getLogger(__name__)
+
+FORMAT_EXTENSIONS = {
+    "JPEG": ".jpg",
+    "WEBP": ".webp",
+    "AVIF": ".avif",
+    "PNG": ".png",
+}
+
+FORMAT_MEDIA_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "AVIF": "image/avif",
+    "PNG": "image/png",
+}
+
+@dataclass(frozen=True)
+class PreviewProfile:
+    """One preview rendition: where it lives, how big it is and how it is encoded."""
+    name: str
+    dir: str
+    size: Tuple[int, int]                       # Bounding box (width, height)
+    format: str = "JPEG"                        # Fallback format, always written
+    quality: int = 85
+    progressive: bool = False
+    variants: Tuple[str, ...] = ("AVIF", "WEBP")  # Extra formats, best first
+
+def _load_profile(config: dict) -> PreviewProfile:
+    name = config["name"]
+    return PreviewProfile(
+        name=name,
+        dir=config.get("dir") or os.path.join(FILE_SHARE_DIR, f"{name}_preview"),
+        size=tuple(config["size"]),
+        format=config.get("format", "JPEG").upper(),
+        quality=config.get("quality", 85),
+        progressive=config.get("progressive", False),
+        variants=tuple(fmt.upper() for fmt in config.get("variants", ("AVIF", "WEBP")))
+    )
+
+PREVIEW_PROFILES: Dict[str, PreviewProfile] = {
+    config["name"]: _load_profile(config) for config in settings.PREVIEW_PROFILES
+}
+
+def get_profile(name: str) -> Optional[PreviewProfile]:
+    return PREVIEW_PROFILES.get(name)
+
+@functools.lru_cache(maxsize=None)
+def _pillow_can_save(fmt: str) -> bool:
+    Image.init()
+    return fmt in Image.SAVE
+
+def output_formats(profile: PreviewProfile) -> List[str]:
+    """Formats rendered for a profile: supported variants, then the fallback."""
+    formats = [fmt for fmt in profile.variants if fmt != profile.format and _pillow_can_save(fmt)]
+    return formats + [profile.format]
+
+# Bump when rendering changes in a way that should redo existing previews
+PREVIEW_PIPELINE_VERSION = 2
+
+@functools.lru_cache(maxsize=None)
+def profiles_version() -> str:
+    """Short hash of the pipeline and profile settings, stamped on images as their previews are rendered."""
+    spec = [PREVIEW_PIPELINE_VERSION] + [
+        [profile.name, profile.dir, list(profile.size), profile.format,
+         profile.quality, profile.progressive, output_formats(profile)]
+        for profile in sorted(PREVIEW_PROFILES.values(), key=lambda profile: profile.name)
+    ]
+    return hashlib.sha256(json.dumps(spec).encode()).hexdigest()[:16]
+
+def preview_path(profile: PreviewProfile, base_filename: str, fmt: Optional[str] = None) -> str:
+    """Path of a profile's rendition in the given format (fallback format by default)."""
+    extension = FORMAT_EXTENSIONS[fmt or profile.format]
+    return os.path.join(profile.dir, f"{base_filename}{extension}")
+
+def _save_params(profile: PreviewProfile, fmt: str) -> dict:
+    if fmt == "JPEG":
+        return {"quality": profile.quality, "optimize": True, "progressive": profile.progressive}
+    if fmt == "WEBP":
+        return {"quality": profile.quality, "method": 4}
+    if fmt == "PNG":
+        return {"optimize": True}
+    return {"quality": profile.quality}
+
+def save_profile_outputs(img: Image.Image, profile: PreviewProfile, base_filename: str) -> Dict[str, str]:
+    """Write every format of a profile for an already-resized image."""
+    os.makedirs(profile.dir, exist_ok=True)
+    written = {}
+    for fmt in output_formats(profile):
+        path = preview_path(profile, base_filename, fmt)
+        try:
+            img.save(path, fmt, **_save_params(profile, fmt))
+            written[fmt] = path
+        except Exception as e:
+            # A modern variant failing must not lose the fallback
+            if fmt == profile.format:
+                raise
+            logger.warning(f"Could not write {fmt} {profile.name} preview for {base_filename}: {str(e)}")
+    return written
+
+def _parse_accept(accept_header: Optional[str]) -> Dict[str, float]:
+    """Map media ranges in an Accept header to their q-values."""
+    accepted = {}
+    for part in (accept_header or "").split(","):
+        pieces = [piece.strip() for piece in part.split(";")]
+        media_range = pieces[0].lower()
+        if not media_range:
+            continue
+        quality = 1.0
+        for param in pieces[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[media_range] = quality
+    return accepted
+
+def accepts_media_type(accept_header: Optional[str], media_type: str) -> bool:
+    """True when the Accept header names media_type explicitly with q > 0."""
+    return _parse_accept(accept_header).get(media_type, 0) > 0
+
+def can_encode(fmt: str) -> bool:
+    """True when the installed Pillow can write fmt."""
+    return _pillow_can_save(fmt)
+
+def negotiate_format(profile: PreviewProfile, accept_header: Optional[str], available: List[str]) -> str:
+    """
+    Pick the format to serve from the formats available on disk.
+    
+    Variants are only served when the client names them explicitly, since
+    browsers that cannot decode AVIF or WebP still send */*. The fallback
+    format is served otherwise.
+    """
+    accepted = _parse_accept(accept_header)
+    for fmt in profile.variants:
+        if fmt in available and accepted.get(FORMAT_MEDIA_TYPES[fmt], 0) > 0:
+            return fmt
+    return profile.format
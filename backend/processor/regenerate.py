@@ -0,0 +1,200 @@
+'''Regenerate stale or missing previews for existing images.
+
+Run with: python -m backend.processor.regenerate
+
+Images are stamped with the preview profiles version when their previews
+are rendered, so only images rendered under different settings, or whose
+preview files are missing, are reprocessed. Work is spread over the
+preview process pool, committed per batch, and checkpointed so an
+interrupted run resumes where it stopped.
+'''
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+import argparse
+import json
+import os
+import time
+
+from backend.config import FILE_SHARE_DIR
+from backend.database.database import SessionLocal
+from backend.database.models.image import Image
+from backend.database.services.image_service import save_preview_analysis
+from backend.processor.preview_engine import PreviewEngine, PreviewJob
+from backend.processor.preview_profiles import (
+    PREVIEW_PROFILES, get_profile, output_formats, preview_path, profiles_version
+)
+from backend.processor.thumbnail_generator import preview_base_filename
+from backend.utils.logging_config import setup_logging
+
+logger = setup_logging("regenerate")
+
+DEFAULT_CHECKPOINT = os.path.join(FILE_SHARE_DIR, "regenerate_checkpoint.json")
+SCAN_CHUNK = 1000   # Rows fetched per keyset page while looking for work
+
+def _load_checkpoint(path: str, version: str) -> int:
+    """Last image id finished by an interrupted run for this version, or 0."""
+    try:
+        with open(path) as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+    except (FileNotFoundError, ValueError):
+        return 0
+    if checkpoint.get("version") != version:
+        # Settings changed since that run; everything must be checked again
+        return 0
+    return checkpoint.get("last_id", 0)
+
+def _save_checkpoint(path: str, version: str, last_id: int) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as checkpoint_file:
+        json.dump({"version": version, "last_id": last_id}, checkpoint_file)
+    os.replace(tmp_path, path)
+
+def _source_path(image: Image) -> Optional[str]:
+    return image.tagged_full_path or image.untagged_full_path
+
+def _base_filename(image: Image) -> str:
+    """Keep the preview names an image already has; derive them from the source otherwise."""
+    stored_path = image.search_preview_path or image.tag_preview_path
+    if stored_path:
+        return os.path.splitext(os.path.basename(stored_path))[0]
+    return preview_base_filename(_source_path(image))
+
+def _previews_missing(base_filename: str) -> bool:
+    return any(
+        not os.path.exists(preview_path(profile, base_filename, fmt))
+        for profile in PREVIEW_PROFILES.values()
+        for fmt in output_formats(profile)
+    )
+
+def _find_work(db: Session, version: str, after_id: int, limit: int, check_files: bool) -> Tuple[List[Tuple[Image, str]], int]:
+    """
+    Next images after after_id that need previews, as (image, base filename).
+
+    Returns the work and the last id scanned, so the caller can move past
+    pages where every image was already current.
+    """
+    query = db.query(Image).filter(
+        Image.id > after_id,
+        or_(Image.tagged_full_path.isnot(None), Image.untagged_full_path.isnot(None))
+    )
+    if not check_files:
+        query = query.filter(or_(Image.preview_version.is_(None), Image.preview_version != version))
+
+    work = []
+    last_scanned = after_id
+    for image in query.order_by(Image.id).limit(SCAN_CHUNK):
+        last_scanned = image.id
+        base_filename = _base_filename(image)
+        if image.preview_version != version or _previews_missing(base_filename):
+            if os.path.exists(_source_path(image)):
+                work.append((image, base_filename))
+            else:
+                logger.warning(f"Image {image.id} source is missing: {_source_path(image)}")
+        if len(work) >= limit:
+            break
+    return work, last_scanned
+
+def regenerate_previews(
+    db: Session,
+    workers: Optional[int] = None,
+    batch_size: int = 200,
+    checkpoint_path: str = DEFAULT_CHECKPOINT,
+    restart: bool = False,
+    check_files: bool = True
+) -> None:
+    """Render previews for every stale image, batch by batch, reporting throughput."""
+    version = profiles_version()
+    last_id = 0 if restart else _load_checkpoint(checkpoint_path, version)
+    if last_id:
+        print(f"Resuming after image {last_id}")
+
+    stale = db.query(Image).filter(
+        Image.id > last_id,
+        or_(Image.preview_version.is_(None), Image.preview_version != version)
+    ).count()
+    print(f"Preview version {version}: {stale} images rendered with other settings"
+          + (", checking the rest for missing files" if check_files else ""))
+
+    engine = PreviewEngine(max_workers=workers)
+    search_profile = get_profile("search")
+    tag_profile = get_profile("preview")
+    rendered = failed = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            work, scanned_to = _find_work(db, version, last_id, batch_size, check_files)
+            if not work:
+                if scanned_to == last_id:
+                    break
+                last_id = scanned_to
+                _save_checkpoint(checkpoint_path, version, last_id)
+                continue
+
+            results = engine.render_batch([
+                PreviewJob(_source_path(image), base_filename) for image, base_filename in work
+            ])
+            for (image, base_filename), result in zip(work, results):
+                if not result.success:
+                    failed += 1
+                    logger.error(f"Could not regenerate previews for image {image.id}: {result.error}")
+                    continue
+                if search_profile:
+                    image.search_preview_path = preview_path(search_profile, base_filename)
+                if tag_profile:
+                    image.tag_preview_path = preview_path(tag_profile, base_filename)
+                save_preview_analysis(
+                    db, image.id,
+                    perceptual_hash=result.perceptual_hash,
+                    palette=result.palette,
+                    placeholder=result.placeholder,
+                    width=result.width,
+                    height=result.height,
+                    orientation=result.orientation,
+                    preview_version=result.preview_version,
+                    commit=False
+                )
+                rendered += 1
+            db.commit()
+
+            # Failed images stay unstamped for the next run but are not retried in this one
+            last_id = scanned_to
+            _save_checkpoint(checkpoint_path, version, last_id)
+            elapsed = time.perf_counter() - start
+            print(f"Up to image {last_id}: {rendered} rendered, {failed} failed, "
+                  f"{rendered / elapsed:.1f} images/s")
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        elapsed = time.perf_counter() - start
+        print(f"Done: {rendered} images rendered, {failed} failed in {elapsed:.1f}s")
+    except KeyboardInterrupt:
+        db.rollback()
+        print(f"Interrupted; rerun to resume after image {last_id}")
+    finally:
+        engine.shutdown()
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate stale or missing previews for existing images.")
+    parser.add_argument("--workers", type=int, default=None, help="Render processes (defaults to PREVIEW_WORKERS or the CPU count)")
+    parser.add_argument("--batch-size", type=int, default=200, help="Images rendered per commit and checkpoint")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Checkpoint file used to resume")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the first image")
+    parser.add_argument(
+        "--skip-file-check", action="store_true",
+        help="Only look at preview versions, without checking that preview files exist"
+    )
+    args = parser.parse_args()
+
+    regenerate_previews(
+        SessionLocal(),
+        workers=args.workers,
+        batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint,
+        restart=args.restart,
+        check_files=not args.skip_file_check
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+'''Preview cache in shared memory, attached by every API worker process.'''
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from backend.config import settings, DERIVATIVE_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TGPC"
+LAYOUT_VERSION = 1
+FILE_HEADER = struct.Struct("<4sIIII")        # magic, layout version, sets, ways, slot bytes
+SLOT_HEADER = struct.Struct("<IB3x16sId")     # seqlock counter, reference bit, key digest, length, mtime
+SLOT_HEADER_BYTES = 64
+PAGE = 4096
+
+def _default_path() -> str:
+    # /dev/shm is RAM-backed on Linux; elsewhere the mapped file lives in the page cache
+    if os.path.isdir("/dev/shm"):
+        return "/dev/shm/image_tagger_previews"
+    return os.path.join(DERIVATIVE_CACHE_DIR, "shared_previews.bin")
+
+class SharedPreviewCache:
+    """
+    Fixed-size, set-associative cache of small files in an mmap'd arena.
+
+    Every process that attaches maps the same file, so each preview is held
+    once however many gunicorn workers there are. A key hashes to a set of
+    `ways` slots; a miss evicts within its set by CLOCK (a reference bit
+    that hits set and the sweeping hand clears).
+
+    Reads take no locks: each slot carries a seqlock counter that writers
+    make odd while they are copying, and a reader that sees it change
+    retries as a miss. Writers serialise per set with a byte-range file
+    lock (plus a thread lock, since file locks are per process).
+    Items larger than a slot are simply not cached.
+    """
+
+    def __init__(self, path: str, max_bytes: int, slot_bytes: int, ways: int = 8):
+        self.slot_bytes = slot_bytes
+        self.ways = ways
+        self.sets = max(1, max_bytes // (slot_bytes * ways))
+        self.max_item_bytes = slot_bytes - SLOT_HEADER_BYTES
+        self._hands_offset = FILE_HEADER.size
+        self._slots_offset = -(-(self._hands_offset + self.sets) // PAGE) * PAGE
+        self._size = self._slots_offset + self.sets * ways * slot_bytes
+        self._thread_lock = threading.Lock()
+        # Each geometry gets its own file: processes started with other settings
+        # never resize or wipe an arena mapped by ones still running
+        self.path = f"{path}-v{LAYOUT_VERSION}-{self.sets}x{ways}x{slot_bytes}"
+        self._header = FILE_HEADER.pack(MAGIC, LAYOUT_VERSION, self.sets, self.ways, self.slot_bytes)
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._open()
+        self._map = mmap.mmap(self._fd, self._size)
+        self._remove_other_geometries(path)
+
+    def _open(self) -> None:
+        """
+        Point self._fd at an initialised arena at self.path.
+
+        A file is only ever sized while empty, before anyone maps it. One of
+        the wrong size or without the header (left by a crash, or not ours)
+        is swapped for a new file rather than truncated: processes that
+        already mapped it keep their pages, just no longer shared.
+        """
+        while True:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            with self._file_lock(0):
+                # Another process may have swapped the file while we waited
+                if self._is_current_file():
+                    if self._has_arena():
+                        return
+                    if os.fstat(self._fd).st_size == 0:
+                        logger.info(f"Initialising shared preview cache at {self.path} ({self._size} bytes)")
+                        self._stamp(self._fd)
+                        return
+                    logger.warning(f"Replacing unusable shared preview cache at {self.path}")
+                    self._replace()
+            os.close(self._fd)
+
+    def _is_current_file(self) -> bool:
+        """Whether self._fd is still the file at self.path."""
+        try:
+            return os.stat(self.path).st_ino == os.fstat(self._fd).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _has_arena(self) -> bool:
+        if os.fstat(self._fd).st_size != self._size:
+            return False
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        return os.read(self._fd, FILE_HEADER.size) == self._header
+
+    def _stamp(self, fd: int) -> None:
+        """Size an empty, unmapped file to the arena and write its header."""
+        os.ftruncate(fd, self._size)
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, self._header)
+
+    def _replace(self) -> None:
+        """Put a fresh arena at self.path, leaving the old file to whoever has it mapped."""
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            self._stamp(fd)
+        finally:
+            os.close(fd)
+        os.replace(temp_path, self.path)
+
+    def _remove_other_geometries(self, path: str) -> None:
+        """
+        Unlink arenas made for other settings or layouts, and the unsuffixed
+        file of earlier releases. Processes still mapping one keep it until
+        they exit; the memory is freed after.
+        """
+        directory, prefix = os.path.split(path)
+        for name in os.listdir(directory):
+            other = os.path.join(directory, name)
+            ours = name == prefix or (name.startswith(f"{prefix}-v") and not name.endswith(".tmp"))
+            if ours and other != self.path:
+                try:
+                    os.remove(other)
+                except OSError:
+                    pass
+
+    @contextmanager
+    def _file_lock(self, offset: int) -> Iterator[None]:
+        """Exclusive advisory lock on one byte, used as a mutex between processes."""
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, offset)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, offset)
+        else:
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                os.lseek(self._fd, offset, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+
+    @staticmethod
+    def _digest(key: str) -> bytes:
+        return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+    def _set_for(self, digest: bytes) -> int:
+        return int.from_bytes(digest[:8], "little") % self.sets
+
+    def _slot_offset(self, set_index: int, way: int) -> int:
+        return self._slots_offset + (set_index * self.ways + way) * self.slot_bytes
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """(data, source mtime) for key, or None on a miss."""
+        digest = self._digest(key)
+        set_index = self._set_for(digest)
+        for way in range(self.ways):
+            offset = self._slot_offset(set_index, way)
+            seq, _, slot_digest, length, mtime = SLOT_HEADER.unpack_from(self._map, offset)
+            if seq % 2 or slot_digest != digest or not length:
+                continue
+            data_offset = offset + SLOT_HEADER_BYTES
+            data = self._map[data_offset:data_offset + length]
+            if struct.unpack_from("<I", self._map, offset)[0] != seq:
+                # Overwritten while we copied it
+                return None
+            self._map[offset + 4] = 1
+            return data, mtime
+        return None
+
+    def put(self, key: str, data: bytes, mtime: float) -> bool:
+        """Store data under key, evicting within its set. False if it is too large to cache."""
+        if not data or len(data) > self.max_item_bytes:
+            return False
+        digest = self._digest(key)
+        set_index = self._set_for(digest)
+        with self._thread_lock, self._file_lock(1 + set_index):
+            way = self._choose_way(set_index, digest)
+            offset = self._slot_offset(set_index, way)
+            seq = struct.unpack_from("<I", self._map, offset)[0]
+            # Odd while writing so lock-free readers discard what they copy
+            struct.pack_into("<I", self._map, offset, seq + 1)
+            data_offset = offset + SLOT_HEADER_BYTES
+            self._map[data_offset:data_offset + len(data)] = data
+            SLOT_HEADER.pack_into(self._map, offset, seq + 2, 1, digest, len(data), mtime)
+        return True
+
+    def _choose_way(self, set_index: int, digest: bytes) -> int:
+        """Slot for digest in its set: its current slot, a free one, or the CLOCK victim."""
+        for way in range(self.ways):
+            _, _, slot_digest, length, _ = SLOT_HEADER.unpack_from(self._map, self._slot_offset(set_index, way))
+            if slot_digest == digest or not length:
+                return way
+
+        hand_offset = self._hands_offset + set_index
+        hand = self._map[hand_offset] % self.ways
+        while True:
+            reference_offset = self._slot_offset(set_index, hand) + 4
+            if self._map[reference_offset]:
+                # Recently used: clear the bit and give it another lap
+                self._map[reference_offset] = 0
+                hand = (hand + 1) % self.ways
+                continue
+            self._map[hand_offset] = (hand + 1) % self.ways
+            return hand
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+_cache: Optional[SharedPreviewCache] = None
+_cache_pid: Optional[int] = None
+_cache_lock = threading.Lock()
+
+def get_shared_preview_cache() -> Optional[SharedPreviewCache]:
+    """
+    This process's attachment to the shared preview cache, or None when it
+    is disabled (SHARED_PREVIEW_CACHE_BYTES = 0) or cannot be created.
+
+    Attaches lazily and again after a fork, so file locks belong to the
+    process using them.
+    """
+    global _cache, _cache_pid
+    if settings.SHARED_PREVIEW_CACHE_BYTES <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache_pid != os.getpid():
+            try:
+                _cache = SharedPreviewCache(
+                    path=settings.SHARED_PREVIEW_CACHE_PATH or _default_path(),
+                    max_bytes=settings.SHARED_PREVIEW_CACHE_BYTES,
+                    slot_bytes=settings.SHARED_PREVIEW_CACHE_SLOT_BYTES
+                )
+                _cache_pid = os.getpid()
+            except OSError as e:
+                logger.error(f"Shared preview cache unavailable: {str(e)}")
+                settings.SHARED_PREVIEW_CACHE_BYTES = 0
+                return None
+        return _cache
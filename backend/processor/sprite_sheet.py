@@ -0,0 +1,71 @@
+'''Pack search previews into one sprite sheet so a results page loads in a single request.'''
+from PIL import Image
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+import hashlib
+import io
+import math
+import os
+
+from backend.processor.decode_guard import fit_size, get_decode_budget
+
+SPRITE_QUALITY = 85
+
+@dataclass
+class SpriteSheet:
+    """An encoded sprite sheet and where each image sits in it."""
+    data: bytes
+    width: int
+    height: int
+    cells: Dict[int, Tuple[int, int, int, int]] = field(default_factory=dict)  # Image id to (x, y, width, height)
+
+def sprite_key(entries: List[Tuple[int, str]], cell_size: int, fmt: str) -> str:
+    """
+    Cache key for a sheet of (image id, preview path) entries.
+
+    Includes each preview's mtime and size, so regenerated previews produce
+    a new key instead of serving a stale sheet.
+    """
+    digest = hashlib.sha256(f"{cell_size}:{fmt}".encode())
+    for image_id, path in entries:
+        stat = os.stat(path)
+        digest.update(f"|{image_id}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+    return digest.hexdigest()[:32]
+
+def build_sprite_sheet(entries: List[Tuple[int, str]], cell_size: int, fmt: str) -> SpriteSheet:
+    """
+    Shelf-pack previews into a roughly square sheet, in entry order.
+
+    Each preview is fitted into a cell_size square and placed left to right;
+    a row is as tall as its tallest preview. JPEG previews are decoded at a
+    reduced DCT scale when the cell is smaller than the stored preview.
+    """
+    columns = max(1, math.ceil(math.sqrt(len(entries))))
+    thumbnails = []
+    for image_id, path in entries:
+        with Image.open(path) as img:
+            img.draft('RGB', fit_size(img.size, (cell_size, cell_size)))
+            thumbnail = img.convert('RGB')
+        thumbnail.thumbnail((cell_size, cell_size), Image.Resampling.LANCZOS)
+        thumbnails.append((image_id, thumbnail))
+
+    cells = {}
+    x = y = row_height = 0
+    for index, (image_id, thumbnail) in enumerate(thumbnails):
+        if index and index % columns == 0:
+            x, y, row_height = 0, y + row_height, 0
+        cells[image_id] = (x, y, thumbnail.width, thumbnail.height)
+        x += thumbnail.width
+        row_height = max(row_height, thumbnail.height)
+
+    width = max((cx + cw for cx, _, cw, _ in cells.values()), default=1)
+    height = max((cy + ch for _, cy, _, ch in cells.values()), default=1)
+
+    with get_decode_budget().reserve(width * height * 4):
+        sheet = Image.new('RGB', (width, height), 'white')
+        for image_id, thumbnail in thumbnails:
+            sheet.paste(thumbnail, cells[image_id][:2])
+        buffer = io.BytesIO()
+        sheet.save(buffer, format=fmt, quality=SPRITE_QUALITY)
+
+    return SpriteSheet(data=buffer.getvalue(), width=width, height=height, cells=cells)
@@ -1,81 +1,158 @@
 '''Methods to generate preview images for different use cases.'''
 from PIL import Image
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 import os
 import logging
 
-from backend.config import TAG_PREVIEW_DIR, SEARCH_PREVIEW_DIR
+from backend.processor.decode_guard import decode_reduced, fit_size, open_image
+from backend.processor.preview_profiles import PreviewProfile, PREVIEW_PROFILES, save_profile_outputs
+from backend.processor.perceptual_hash import dhash, hash_to_hex
+from backend.processor.color_palette import extract_palette
+from backend.processor.placeholder import render_placeholder
 
 logger = logging.getLogger(__name__)
 
-def generate_previews(source_path: str, new_filename: str = None) -> bool:
-    """Generate preview images at different sizes for different use cases."""
-    try:
-        # Ensure destination directories exist
-        os.makedirs(TAG_PREVIEW_DIR, exist_ok=True)
-        os.makedirs(SEARCH_PREVIEW_DIR, exist_ok=True)
-        
-        # Map preview types to their directories and dimensions
-        preview_configs = {
-            'preview': {
-                'dir': TAG_PREVIEW_DIR,
-                'size': (800, 800)      # Full preview for tagging page
-            },
-            'search': {
-                'dir': SEARCH_PREVIEW_DIR,
-                'size': (400, 400)      # Smaller preview for search grid
-            }
-        }
-        
-        # Determine filename to use
-        if new_filename:
-            # Use new filename without extension
-            base_filename = os.path.splitext(new_filename)[0]
+# Let resize() use reduce() for the bulk of large downscales before LANCZOS
+REDUCING_GAP = 3.0
+
+EXIF_ORIENTATION_TAG = 0x0112
+# EXIF orientation to the transpose that displays the image upright
+ORIENTATION_TRANSPOSES = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    """Convert RGBA/P images to RGB with white background."""
+    if img.mode in ('RGBA', 'P'):
+        background = Image.new('RGB', img.size, 'white')
+        if img.mode == 'RGBA':
+            background.paste(img, mask=img.split()[3])
         else:
-            # Use original filename without extension
-            filename = os.path.basename(source_path)
-            base_filename = os.path.splitext(filename)[0]
-        
-        with Image.open(source_path) as img:
-            # Convert RGBA/P images to RGB with white background
-            if img.mode in ('RGBA', 'P'):
-                background = Image.new('RGB', img.size, 'white')
-                if img.mode == 'RGBA':
-                    background.paste(img, mask=img.split()[3])
-                else:
-                    background.paste(img)
-                img = background
-            
-            # Generate both preview sizes
-            for preview_type, config in preview_configs.items():
-                preview_path = os.path.join(
-                    config['dir'],
-                    f"{base_filename}.jpg"  # Simplified filename without type suffix
-                )
-                
-                # Create a copy to avoid modifying original
-                img_copy = img.copy()
-                
-                # Calculate new size maintaining aspect ratio
-                width, height = img_copy.size
-                dimensions = config['size']
-                ratio = min(dimensions[0]/width, dimensions[1]/height)
-                
+            background.paste(img)
+        return background
+    if img.mode not in ('RGB', 'L'):
+        return img.convert('RGB')
+    return img
+
+def _exif_orientation(img: Image.Image) -> int:
+    """EXIF orientation of an open image, 1 (upright) when absent or invalid."""
+    if img.format == 'PNG' and 'exif' not in img.info:
+        # PNG getexif() decodes the whole image looking for a trailing eXIf chunk
+        return 1
+    try:
+        orientation = img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+    except Exception:
+        return 1
+    return orientation if orientation in ORIENTATION_TRANSPOSES else 1
+
+def _apply_orientation(img: Image.Image, orientation: int) -> Image.Image:
+    """Rotate/flip a decoded image so it displays upright."""
+    transpose = ORIENTATION_TRANSPOSES.get(orientation)
+    return img.transpose(transpose) if transpose is not None else img
+
+@dataclass
+class PyramidResult:
+    """Files written by render_preview_pyramid and what was learned from the pixels."""
+    outputs: Dict[str, Dict[str, str]] = field(default_factory=dict)  # Profile name to {format: path}
+    perceptual_hash: Optional[str] = None                              # 64-bit dHash as hex
+    palette: List[Tuple[int, int]] = field(default_factory=list)       # (colour bin, weight percent)
+    placeholder: Optional[str] = None                                  # Inline ~16px data URI
+    width: Optional[int] = None                                        # Source dimensions in pixels
+    height: Optional[int] = None
+    orientation: int = 1                                               # Source EXIF orientation
+
+def render_preview_pyramid(
+    source_path: str,
+    base_filename: str,
+    profiles: List[PreviewProfile]
+) -> PyramidResult:
+    """
+    Decode the source once and write every preview profile from it.
+
+    Decoding goes through the decode guard: oversized files are rejected
+    from their header, JPEGs are decoded at a reduced DCT scale that still
+    covers the largest preview, huge PNGs are downscaled strip by strip,
+    and the decode is held against the process memory budget. Each smaller
+    preview is resized from the previous level
+    (original -> 800 -> 400) rather than from the full image. The smallest
+    level is also hashed for near-duplicate detection, binned into a
+    dominant-colour palette and shrunk to an inline placeholder.
+    
+    This is the only time ingest decodes the file, so the source dimensions
+    and EXIF orientation are read from the same open; previews are written
+    upright.
+    """
+    # Largest preview first so each level can feed the next
+    levels = sorted(profiles, key=lambda profile: profile.size[0] * profile.size[1], reverse=True)
+    result = PyramidResult()
+
+    with open_image(source_path) as img:
+        # Header fields, read before decoding shrinks img.size
+        result.width, result.height = img.size
+        result.orientation = _exif_orientation(img)
+
+        # Only decode as many pixels as the largest preview needs
+        box = levels[0].size if levels else img.size
+        with decode_reduced(img, box) as decoded:
+            current = _apply_orientation(_to_rgb(decoded), result.orientation)
+
+            for profile in levels:
                 # Only resize if image is larger than target size
-                if ratio < 1:
-                    new_size = (int(width * ratio), int(height * ratio))
-                    img_copy = img_copy.resize(new_size, Image.Resampling.LANCZOS)
-                
-                # Save preview with optimization
-                img_copy.save(
-                    preview_path,
-                    "JPEG",
-                    quality=85,
-                    optimize=True
-                )
-                logger.info(f"Generated {preview_type} preview at {preview_path}")
-                
+                new_size = fit_size(current.size, profile.size)
+                if new_size != current.size:
+                    current = current.resize(
+                        new_size,
+                        Image.Resampling.LANCZOS,
+                        reducing_gap=REDUCING_GAP
+                    )
+
+                result.outputs[profile.name] = save_profile_outputs(current, profile, base_filename)
+                logger.info(f"Generated {profile.name} previews {sorted(result.outputs[profile.name])} for {base_filename}")
+
+            # Analyse the smallest level, which is already decoded and downscaled
+            result.perceptual_hash = hash_to_hex(dhash(current))
+            result.palette = extract_palette(current)
+            result.placeholder = render_placeholder(current)
+
+    return result
+
+def load_fitted_image(source_path: str, box: Tuple[int, int]) -> Image.Image:
+    """Decode the source at the lowest cost that still fills box, flattened to RGB, upright and fitted."""
+    with open_image(source_path) as img:
+        orientation = _exif_orientation(img)
+        with decode_reduced(img, box) as decoded:
+            fitted = _apply_orientation(_to_rgb(decoded), orientation)
+            new_size = fit_size(fitted.size, box)
+            if new_size != fitted.size:
+                fitted = fitted.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+            elif fitted is img:
+                # Detach from the source file before it is closed
+                fitted = fitted.copy()
+            return fitted
+
+def preview_base_filename(source_path: str, new_filename: Optional[str] = None) -> str:
+    """Base filename (no extension) previews of source_path are written under."""
+    if new_filename:
+        # Use new filename without extension
+        return os.path.splitext(new_filename)[0]
+    # Use original filename without extension
+    filename = os.path.basename(source_path)
+    return os.path.splitext(filename)[0]
+
+def generate_previews(source_path: str, new_filename: Optional[str] = None) -> bool:
+    """Generate preview images at different sizes for different use cases."""
+    try:
+        base_filename = preview_base_filename(source_path, new_filename)
+        render_preview_pyramid(source_path, base_filename, list(PREVIEW_PROFILES.values()))
         return True
-        
+
     except Exception as e:
         logger.error(f"Error generating previews for {source_path}: {str(e)}")
-        return False
\ No newline at end of file
+        return False
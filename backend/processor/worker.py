@@ -0,0 +1,241 @@
+'''Background worker that drains the persistent job queue.
+
+Run with: python -m backend.processor.worker
+'''
+from sqlalchemy.orm import Session
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import os
+import socket
+import time
+
+from backend.config import settings
+from backend.database.database import SessionLocal
+from backend.database.models.image import Image
+from backend.database.models.job import Job
+from backend.database.services.job_service import (
+    claim_jobs, complete_job, extend_leases, fail_job,
+    GENERATE_PREVIEWS, FINALIZE_TAGGING
+)
+from backend.database.services.image_service import finalize_tagged_image, previews_ready, save_preview_analysis
+from backend.processor.preview_engine import get_preview_engine, PreviewJob, PreviewResult
+from backend.processor.preview_profiles import profiles_version
+from backend.processor.perceptual_hash import hex_to_hash
+from backend.search.near_duplicates import get_near_duplicate_index
+from backend.utils.logging_config import setup_logging
+
+logger = setup_logging("worker")
+
+def handle_generate_previews(db: Session, jobs: List[Job]) -> None:
+    """
+    Render previews for a batch of jobs through the pool.
+    
+    The batch goes through a wave (one job per pool process) at a time,
+    and the leases of the jobs still waiting are renewed before each, so a
+    batch slower than JOB_LEASE_SECONDS is not reclaimed by another worker
+    and rendered twice.
+    """
+    engine = get_preview_engine()
+    index = None
+    if settings.NEAR_DUPLICATE_WARN_ON_UPLOAD:
+        index = get_near_duplicate_index()
+        index.ensure_fresh(db)
+
+    wave = max(engine.max_workers, 1)
+    for start in range(0, len(jobs), wave):
+        if start:
+            extend_leases(db, jobs[start:])
+        wave_jobs = []
+        for job in jobs[start:start + wave]:
+            source_path, skipped = _preview_source(db, job)
+            if skipped:
+                complete_job(db, job, {"skipped": skipped})
+            else:
+                wave_jobs.append((job, source_path))
+        if not wave_jobs:
+            continue
+        results = engine.render_batch([
+            PreviewJob(source_path, job.payload.get("base_filename"))
+            for job, source_path in wave_jobs
+        ])
+        for (job, _), result in zip(wave_jobs, results):
+            _record_preview_result(db, job, result, index)
+
+def _preview_source(db: Session, job: Job) -> Tuple[Optional[str], Optional[str]]:
+    """
+    The file a preview job should render now, or why it need not.
+
+    The payload holds where the upload was stored. Tagging the image
+    before the job runs moves the file into TAGGED_DIR, rendering the
+    previews on the way if they are missing, so the image's current path
+    is read back instead. A job losing that race mid-render fails as
+    retryable and finds the file, or the finished previews, on its retry.
+    """
+    image_id = job.payload.get("image_id")
+    if not image_id:
+        return job.payload["source_path"], None
+    image = db.get(Image, image_id, populate_existing=True)
+    if image is None:
+        return None, "Image not found"
+    if image.preview_version == profiles_version() and previews_ready(image):
+        return None, "Previews already current"
+    source_path = image.untagged_full_path or image.tagged_full_path
+    if not source_path:
+        return None, "Image has no file"
+    return source_path, None
+
+def _record_preview_result(db: Session, job: Job, result: PreviewResult, index) -> None:
+    """Save what rendering found about an image and complete or fail its job."""
+    if not result.success:
+        fail_job(db, job, result.error or "Preview generation failed", retry=result.retryable)
+        return
+
+    job_result = {"elapsed": round(result.elapsed, 4)}
+    image_id = job.payload.get("image_id")
+    if image_id:
+        save_preview_analysis(
+            db, image_id,
+            perceptual_hash=result.perceptual_hash,
+            palette=result.palette,
+            placeholder=result.placeholder,
+            width=result.width,
+            height=result.height,
+            orientation=result.orientation,
+            preview_version=result.preview_version
+        )
+    if image_id and result.perceptual_hash and index is not None:
+        # Surface likely re-saves of existing artwork in the job result
+        value = hex_to_hash(result.perceptual_hash)
+        matches = index.query(
+            value,
+            settings.NEAR_DUPLICATE_UPLOAD_DISTANCE,
+            exclude_id=image_id,
+            limit=10
+        )
+        index.add(image_id, value)
+        if matches:
+            job_result["near_duplicates"] = [
+                {"image_id": match_id, "distance": distance} for match_id, distance in matches
+            ]
+    complete_job(db, job, job_result)
+
+def handle_finalize_tagging(db: Session, job: Job) -> None:
+    """Generate previews for a tagged image and move it into TAGGED_DIR."""
+    image = finalize_tagged_image(db, job.payload["image_id"])
+    if image is None:
+        # The image was deleted while the job was queued; nothing left to do
+        complete_job(db, job, {"skipped": "Image not found"})
+    else:
+        complete_job(db, job, {"image_id": image.id, "tagged_full_path": image.tagged_full_path})
+
+# Handlers that accept a whole batch of claimed jobs at once
+BATCH_HANDLERS: Dict[str, Callable[[Session, List[Job]], None]] = {
+    GENERATE_PREVIEWS: handle_generate_previews,
+}
+
+# Handlers that process one job at a time
+JOB_HANDLERS: Dict[str, Callable[[Session, Job], None]] = {
+    FINALIZE_TAGGING: handle_finalize_tagging,
+}
+
+def process_jobs(db: Session, jobs: List[Job]) -> None:
+    """
+    Dispatch claimed jobs to their handlers and record the outcome.
+    
+    Kinds, and single jobs within a kind, run one after another, so the
+    leases of the jobs not started yet are renewed before each.
+    """
+    by_kind: Dict[str, List[Job]] = {}
+    for job in jobs:
+        by_kind.setdefault(job.kind, []).append(job)
+    waiting = [job for kind_jobs in by_kind.values() for job in kind_jobs]
+    started = 0
+
+    def renew_waiting():
+        # Claiming set the leases; they only need renewing once work has run
+        if started:
+            extend_leases(db, waiting[started:])
+
+    for kind, kind_jobs in by_kind.items():
+        if kind in BATCH_HANDLERS:
+            renew_waiting()
+            try:
+                BATCH_HANDLERS[kind](db, kind_jobs)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Batch handler for {kind} crashed: {str(e)}")
+                for job in kind_jobs:
+                    if job.status == "running":
+                        fail_job(db, job, str(e))
+            started += len(kind_jobs)
+            continue
+
+        handler = JOB_HANDLERS.get(kind)
+        for job in kind_jobs:
+            renew_waiting()
+            started += 1
+            if handler is None:
+                fail_job(db, job, f"No handler registered for job kind '{kind}'")
+                continue
+            try:
+                handler(db, job)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Job {job.id} ({kind}) failed: {str(e)}")
+                fail_job(db, job, str(e))
+
+def run_worker(batch_size: int, poll_interval: float, once: bool = False) -> None:
+    """Claim and process jobs until interrupted (or until the queue is empty with once=True)."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info(f"Worker {worker_id} started (batch size {batch_size})")
+
+    while True:
+        jobs = []
+        db = SessionLocal()
+        try:
+            jobs = claim_jobs(
+                db,
+                worker_id,
+                kinds=list(BATCH_HANDLERS) + list(JOB_HANDLERS),
+                limit=batch_size
+            )
+            if jobs:
+                process_jobs(db, jobs)
+        except Exception as e:
+            # A locked or unreachable database; try again after the poll interval
+            db.rollback()
+            logger.error(f"Worker {worker_id} failed to claim jobs: {str(e)}")
+        finally:
+            db.close()
+
+        if not jobs:
+            if once:
+                break
+            time.sleep(poll_interval)
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued preview and finalize jobs.")
+    parser.add_argument(
+        "--batch-size", type=int, default=None,
+        help="Jobs to claim per poll (defaults to twice the preview pool size)"
+    )
+    parser.add_argument(
+        "--poll-interval", type=float, default=settings.JOB_POLL_INTERVAL_SECONDS,
+        help="Seconds to sleep when the queue is empty"
+    )
+    parser.add_argument(
+        "--once", action="store_true",
+        help="Exit once the queue is drained instead of polling forever"
+    )
+    args = parser.parse_args()
+
+    batch_size = args.batch_size or get_preview_engine().max_workers * 2
+    try:
+        run_worker(batch_size, args.poll_interval, once=args.once)
+    except KeyboardInterrupt:
+        logger.info("Worker stopped")
+    finally:
+        get_preview_engine().shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+'''SQLite FTS5 full-text index of image filenames, tag names and authors.
+
+The images_fts table and the triggers that keep it in step with images,
+image_tags, tags and authors are created by migration 0011; every writer,
+including the worker and seed scripts, is covered without the service
+layer having to remember it. Its rowid is the image id.
+'''
+from sqlalchemy import Column, Float, Integer, MetaData, Table, Text, literal_column, select, text
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional
+import html
+import logging
+import time
+
+from backend.search.query_language import Predicate
+
+logger = logging.getLogger(__name__)
+
+# Kept out of Base.metadata: create_all must not make a plain table of it
+images_fts = Table(
+    "images_fts",
+    MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("filename", Text),
+    Column("tags", Text),
+    Column("author", Text),
+    Column("rank", Float),  # Hidden column: bm25 score of the current MATCH, lower is better
+)
+FIELDS = ("filename", "tags", "author")
+
+# Index rows of the images selected by {ids}, derived from the tables. The
+# triggers of migration 0011 hold their own frozen copy; a change here that
+# should reach them needs a migration replacing the triggers
+INSERT_ROWS = """
+    INSERT INTO images_fts (rowid, filename, tags, author)
+    SELECT images.id, images.filename,
+           (SELECT group_concat(tags.name, ', ') FROM image_tags
+            JOIN tags ON tags.id = image_tags.tag_id
+            WHERE image_tags.image_id = images.id),
+           authors.name
+    FROM images LEFT JOIN authors ON authors.id = images.author_id
+    WHERE images.id IN ({ids})
+"""
+
+# highlight() markers, swapped for <mark> once the text around them is escaped
+MARK_START, MARK_END = "\x02", "\x03"
+
+def _phrase(words: str, prefix: bool) -> str:
+    """One FTS5 phrase, quoted so operators and punctuation in the words are literal."""
+    quoted = '"' + words.replace('"', '""') + '"'
+    return quoted + "*" if prefix else quoted
+
+def match_expression(terms: Iterable[Predicate]) -> Optional[str]:
+    """
+    FTS5 MATCH expression requiring every term, None when there are none.
+
+    Args:
+        terms (Iterable[Predicate]): Text predicates from
+            search.query_language.parse_search_query; a word or quoted
+            phrase each, matched as a prefix when prefix is set
+
+    Returns:
+        Optional[str]: The terms ANDed together
+    """
+    phrases = [_phrase(term.value, term.prefix) for term in terms]
+    return " AND ".join(phrases) or None
+
+def matches(expression: str):
+    """images_fts MATCH expression; fills in images_fts.c.rank when the table is in the query."""
+    return literal_column("images_fts").match(expression)
+
+def matching(expression: str):
+    """Ids of the images matching a MATCH expression, as a subquery."""
+    return select(images_fts.c.rowid).where(matches(expression))
+
+def highlights(db: Session, expression: str, image_ids: List[int]) -> Dict[int, Dict[str, str]]:
+    """
+    Matched fields of the given images with the matching words in <mark>.
+
+    The rest of each field is HTML-escaped, so the result can be inserted
+    as markup. Fields without a match are left out.
+
+    Args:
+        db (Session): Database session
+        expression (str): The MATCH expression the images were found with
+        image_ids (List[int]): Images to highlight, typically one page
+
+    Returns:
+        Dict[int, Dict[str, str]]: Image id to field name to highlighted text
+    """
+    if not image_ids:
+        return {}
+    columns = [
+        literal_column(f"highlight(images_fts, {column}, '{MARK_START}', '{MARK_END}')").label(field)
+        for column, field in enumerate(FIELDS)
+    ]
+    rows = db.execute(
+        select(images_fts.c.rowid, *columns)
+        .where(matches(expression))
+        .where(images_fts.c.rowid.in_(image_ids))
+    )
+    result = {}
+    for row in rows:
+        fields = {}
+        for field in FIELDS:
+            value = getattr(row, field)
+            if value and MARK_START in value:
+                fields[field] = (
+                    html.escape(value).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+                )
+        result[row.rowid] = fields
+    return result
+
+def rebuild(db: Session) -> int:
+    """
+    Re-derive every row of the index from the tables and merge its segments.
+
+    The triggers keep the index current, so this is only needed after
+    changes made with the triggers absent, such as a restore from an
+    older backup, or to compact it.
+
+    Returns:
+        int: Number of images indexed
+    """
+    start = time.perf_counter()
+    db.execute(text("DELETE FROM images_fts"))
+    db.execute(text(INSERT_ROWS.format(ids="SELECT id FROM images")))
+    db.execute(text("INSERT INTO images_fts (images_fts) VALUES ('optimize')"))
+    db.commit()
+    count = db.execute(text("SELECT count(*) FROM images_fts")).scalar()
+    logger.info(f"Rebuilt full-text index of {count} images in {time.perf_counter() - start:.2f}s")
+    return count
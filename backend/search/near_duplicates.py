@@ -0,0 +1,139 @@
+'''In-memory multi-index hash table for near-duplicate lookups by Hamming distance.'''
+from sqlalchemy.orm import Session
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import time
+
+import numpy as np
+
+from backend.database.models.image import Image
+from backend.processor.perceptual_hash import hex_to_hash
+from backend.search.refreshable_index import RefreshableIndex
+
+logger = logging.getLogger(__name__)
+
+CHUNKS = 4
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+def _chunk_variants(value: int, radius: int) -> List[int]:
+    """All chunk values within `radius` bit flips of value."""
+    variants = [value]
+    for flips in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), flips):
+            flipped = value
+            for bit in bits:
+                flipped ^= 1 << bit
+            variants.append(flipped)
+    return variants
+
+class NearDuplicateIndex(RefreshableIndex):
+    """
+    Multi-index hashing over 64-bit perceptual hashes.
+
+    Each hash is split into four 16-bit chunks, and each chunk gets a sorted
+    NumPy array. By the pigeonhole principle, two hashes within distance d
+    agree to within d // 4 bits on at least one chunk. A query therefore
+    probes only those chunk values and verifies the few candidates with a
+    vectorised popcount. Distances up to 7 need 17 probes per chunk, which
+    stays well under a millisecond at a million images.
+
+    Hashes added after the last build are kept in a small dict and merged on
+    the next rebuild.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._ids = np.empty(0, dtype=np.int64)
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._chunk_values: List[np.ndarray] = [np.empty(0, dtype=np.uint16)] * CHUNKS
+        self._chunk_rows: List[np.ndarray] = [np.empty(0, dtype=np.int64)] * CHUNKS
+        self._pending: Dict[int, int] = {}
+        self._removed: Set[int] = set()
+
+    def build(self, entries: Iterable[Tuple[int, int]]) -> None:
+        """Replace the index contents with (image id, hash) pairs."""
+        pairs = list(entries)
+        ids = np.fromiter((image_id for image_id, _ in pairs), dtype=np.int64, count=len(pairs))
+        hashes = np.fromiter((value for _, value in pairs), dtype=np.uint64, count=len(pairs))
+
+        chunk_values, chunk_rows = [], []
+        for chunk in range(CHUNKS):
+            values = ((hashes >> np.uint64(chunk * CHUNK_BITS)) & np.uint64(CHUNK_MASK)).astype(np.uint16)
+            order = np.argsort(values, kind='stable')
+            chunk_values.append(values[order])
+            chunk_rows.append(order)
+
+        with self._lock:
+            self._ids, self._hashes = ids, hashes
+            self._chunk_values, self._chunk_rows = chunk_values, chunk_rows
+            self._pending = {}
+            self._removed = set()
+            self.built_at = time.monotonic()
+
+    def add(self, image_id: int, value: int) -> None:
+        """Index or re-index one image without a rebuild."""
+        with self._lock:
+            self._removed.add(image_id)
+            self._pending[image_id] = value
+
+    def remove(self, image_id: int) -> None:
+        with self._lock:
+            self._removed.add(image_id)
+            self._pending.pop(image_id, None)
+
+    def query(
+        self,
+        value: int,
+        max_distance: int,
+        exclude_id: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> List[Tuple[int, int]]:
+        """(image id, distance) pairs within max_distance of value, closest first."""
+        radius = max_distance // CHUNKS
+        with self._lock:
+            ids, hashes = self._ids, self._hashes
+            chunk_values, chunk_rows = self._chunk_values, self._chunk_rows
+            pending = dict(self._pending)
+            removed = set(self._removed)
+
+        candidate_rows = []
+        for chunk in range(CHUNKS):
+            target = (value >> (chunk * CHUNK_BITS)) & CHUNK_MASK
+            needles = np.array(_chunk_variants(target, radius), dtype=np.uint16)
+            starts = np.searchsorted(chunk_values[chunk], needles, side='left')
+            ends = np.searchsorted(chunk_values[chunk], needles, side='right')
+            for start, end in zip(starts, ends):
+                if end > start:
+                    candidate_rows.append(chunk_rows[chunk][start:end])
+
+        matches: Dict[int, int] = {}
+        if candidate_rows:
+            rows = np.unique(np.concatenate(candidate_rows))
+            distances = np.bitwise_count(hashes[rows] ^ np.uint64(value))
+            close = distances <= max_distance
+            for image_id, distance in zip(ids[rows[close]].tolist(), distances[close].tolist()):
+                if image_id not in removed:
+                    matches[image_id] = distance
+
+        for image_id, pending_value in pending.items():
+            distance = (pending_value ^ value).bit_count()
+            if distance <= max_distance:
+                matches[image_id] = distance
+
+        matches.pop(exclude_id, None)
+        ranked = sorted(matches.items(), key=lambda item: (item[1], item[0]))
+        return ranked[:limit] if limit else ranked
+
+    def rebuild_from_db(self, db: Session) -> None:
+        start = time.perf_counter()
+        rows = db.query(Image.id, Image.perceptual_hash).filter(Image.perceptual_hash.isnot(None))
+        self.build((row.id, hex_to_hash(row.perceptual_hash)) for row in rows)
+        logger.info(f"Built near-duplicate index of {len(self._ids)} images in {time.perf_counter() - start:.2f}s")
+
+
+_index = NearDuplicateIndex()
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    return _index
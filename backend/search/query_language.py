@@ -0,0 +1,152 @@
+'''Parser for the /images/search query language.'''
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+import mimetypes
+import re
+
+from backend.search.tag_index import normalize_tag
+
+# field, comparison and value of one term, e.g. -tag:abstract, width>2000, author:"x y"
+TERM = re.compile(
+    r'\s*(?P<negated>-)?(?P<field>[a-z]+)(?P<op>>=|<=|:|>|<|=)'
+    r'(?:"(?P<quoted>[^"]*)"|(?P<bare>[^\s"]+))'
+)
+# A word or "quoted phrase" for full-text search; a trailing * makes it a prefix
+WORDS = re.compile(r'\s*(?P<negated>-)?(?:"(?P<quoted>[^"]*)"|(?P<bare>[^\s"*]+))(?P<prefix>\*)?(?=\s|$)')
+TEXT_FIELDS = ('tag', 'author', 'type')
+RANGE_FIELDS = ('width', 'height', 'size', 'added')
+SIZE_UNITS = {'': 1, 'b': 1, 'kb': 1024, 'mb': 1024 ** 2, 'gb': 1024 ** 3}
+
+@dataclass(frozen=True)
+class Predicate:
+    """
+    One term of a search query.
+
+    Text fields (tag, author, type) carry value; range fields (width,
+    height, size, added) carry a half-open [low, high) interval, where
+    either end may be None. Every comparison is normalised to that form,
+    so width>2000 is [2001, None) and added:2025-01 is [2025-01-01,
+    2025-02-01). Full-text terms have field "text", the word or phrase as
+    value, and prefix set when it ended in "*".
+    """
+    field: str
+    value: Optional[str] = None
+    low: Any = None
+    high: Any = None
+    negated: bool = False
+    prefix: bool = False
+
+def _period(text: str) -> Tuple[datetime, datetime]:
+    """[start, end) of a YYYY, YYYY-MM or YYYY-MM-DD date."""
+    parts = text.split('-')
+    try:
+        if len(parts) == 1:
+            year = int(parts[0])
+            return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+        if len(parts) == 2:
+            year, month = int(parts[0]), int(parts[1])
+            start = datetime(year, month, 1)
+            return start, datetime(year + month // 12, month % 12 + 1, 1)
+        if len(parts) == 3:
+            start = datetime(int(parts[0]), int(parts[1]), int(parts[2]))
+            return start, datetime.fromordinal(start.toordinal() + 1)
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid date '{text}', expected YYYY, YYYY-MM or YYYY-MM-DD")
+
+def _number(field: str, text: str) -> Tuple[int, int]:
+    """[n, n + 1) of an integer, with a size unit (kb, mb, gb) for size."""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([a-z]*)', text.lower())
+    if not match or (match.group(2) and field != 'size') or match.group(2) not in SIZE_UNITS:
+        raise ValueError(f"Invalid {field} '{text}'")
+    value = int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+    return value, value + 1
+
+def _bounds(field: str, text: str) -> Tuple[Any, Any]:
+    return _period(text) if field == 'added' else _number(field, text)
+
+def _range(field: str, op: str, text: str) -> Tuple[Any, Any]:
+    """Half-open interval selected by a range term."""
+    if op in (':', '='):
+        if '..' in text:
+            first, last = text.split('..', 1)
+            low = _bounds(field, first)[0] if first else None
+            high = _bounds(field, last)[1] if last else None
+            return low, high
+        return _bounds(field, text)
+    start, end = _bounds(field, text)
+    return {
+        '>': (end, None),
+        '>=': (start, None),
+        '<': (None, start),
+        '<=': (None, end),
+    }[op]
+
+def _media_type(text: str) -> str:
+    """MIME type for type:png, type:jpg or a full type such as type:image/webp."""
+    if '/' in text:
+        return text.lower()
+    media_type = mimetypes.types_map.get(f".{text.lower()}")
+    if not media_type:
+        raise ValueError(f"Unknown file type '{text}'")
+    return media_type
+
+def parse_search_query(text: str) -> List[Predicate]:
+    """
+    Parse a search query into predicates, all of which must hold.
+
+    Terms are field:value pairs separated by spaces, e.g.
+    `tag:pokemon -tag:abstract author:"x" width>2000 added:2025-01..2025-06 type:png`.
+    A leading "-" negates a term. width, height, size and added also take
+    >, >=, <, <= and a..b ranges (either end may be left open); size
+    takes kb/mb/gb suffixes. Anything else is a word or "quoted phrase"
+    to find in filenames, tags and authors, a prefix if it ends in "*".
+
+    Raises:
+        ValueError: For unknown fields, bad values or unbalanced quotes
+    """
+    predicates = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = TERM.match(text, position)
+        if not match:
+            match = WORDS.match(text, position)
+            if not match:
+                raise ValueError(f"Unbalanced quotes or stray '*' at '{text[position:].strip()}'")
+            position = match.end()
+            words = match.group('quoted') if match.group('quoted') is not None else match.group('bare')
+            if not re.search(r'\w', words):
+                raise ValueError(f"Nothing to search for in '{match.group(0).strip()}'")
+            predicates.append(Predicate(
+                field='text',
+                value=words.strip(),
+                negated=bool(match.group('negated')),
+                prefix=bool(match.group('prefix'))
+            ))
+            continue
+        position = match.end()
+        field, op = match.group('field'), match.group('op')
+        value = match.group('quoted') if match.group('quoted') is not None else match.group('bare')
+        negated = bool(match.group('negated'))
+
+        if field in TEXT_FIELDS:
+            if op not in (':', '='):
+                raise ValueError(f"{field} only supports ':'")
+            if field == 'tag':
+                value = normalize_tag(value)
+            elif field == 'author':
+                # Authors are stored stripped and lower-case, like tags
+                value = value.strip().lower()
+            else:
+                value = _media_type(value)
+            if not value:
+                raise ValueError(f"Empty {field}")
+            predicates.append(Predicate(field=field, value=value, negated=negated))
+        elif field in RANGE_FIELDS:
+            low, high = _range(field, op, value)
+            predicates.append(Predicate(field=field, low=low, high=high, negated=negated))
+        else:
+            raise ValueError(f"Unknown field '{field}'; fields are {', '.join(TEXT_FIELDS + RANGE_FIELDS)}")
+    return predicates
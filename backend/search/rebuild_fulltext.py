@@ -0,0 +1,29 @@
+'''Rebuild the full-text search index from the image, tag and author tables.
+
+Run with: python -m backend.search.rebuild_fulltext
+
+Migration 0011 builds the index for an existing catalogue and its triggers
+keep it current after that. Run this after restoring a backup taken
+before the migration, after writing to the database with the triggers
+dropped, or to compact an index that has seen many updates.
+'''
+import argparse
+
+from backend.database.database import SessionLocal
+from backend.search.fulltext import rebuild
+from backend.utils.logging_config import setup_logging
+
+logger = setup_logging("rebuild_fulltext")
+
+def main():
+    argparse.ArgumentParser(description="Rebuild the full-text search index.").parse_args()
+
+    db = SessionLocal()
+    try:
+        count = rebuild(db)
+        logger.info(f"Indexed {count} images")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
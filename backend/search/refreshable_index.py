@@ -0,0 +1,47 @@
+'''Loading and periodic rebuilding shared by the in-memory search indexes.'''
+from sqlalchemy.orm import Session
+from typing import Optional
+import threading
+import time
+
+from backend.config import settings
+
+class RefreshableIndex:
+    """
+    An index held in each process's memory and loaded from the database.
+
+    The service layer applies its own writes to it as they commit; writes
+    made by other processes are picked up by rebuilding it from the
+    database once it is SEARCH_INDEX_REFRESH_SECONDS old.
+
+    Subclasses guard their contents with _lock, implement rebuild_from_db,
+    and set built_at when a build completes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self.built_at: Optional[float] = None
+
+    def rebuild_from_db(self, db: Session) -> None:
+        raise NotImplementedError
+
+    def is_stale(self) -> bool:
+        return (
+            self.built_at is None
+            or time.monotonic() - self.built_at > settings.SEARCH_INDEX_REFRESH_SECONDS
+        )
+
+    def ensure_fresh(self, db: Session) -> None:
+        """
+        Rebuild if stale. One thread rebuilds while the others keep using
+        the current contents; before the first build, they wait for it.
+        """
+        if not self.is_stale():
+            return
+        if self._rebuild_lock.acquire(blocking=self.built_at is None):
+            try:
+                if self.is_stale():
+                    self.rebuild_from_db(db)
+            finally:
+                self._rebuild_lock.release()
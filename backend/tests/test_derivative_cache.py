@@ -0,0 +1,30 @@
+'''Derivative cache: reads survive eviction by other threads and processes.'''
+import os
+
+from backend.processor.derivative_cache import DerivativeCache
+
+def test_read_or_render_renders_again_after_eviction(tmp_path):
+    cache = DerivativeCache(str(tmp_path), max_bytes=1 << 20, buckets=[100])
+    path = cache.path_for(1, "v1", 100, ".jpg")
+    renders = []
+
+    def render():
+        renders.append(path)
+        return b"rendered"
+
+    assert cache.read_or_render(path, render)[0] == b"rendered"
+    assert cache.read_or_render(path, render)[0] == b"rendered"
+    assert len(renders) == 1
+
+    # Evicted by another process between requests
+    os.remove(path)
+    content, mtime = cache.read_or_render(path, render)
+    assert content == b"rendered" and mtime > 0
+    assert len(renders) == 2 and os.path.exists(path)
+
+def test_read_or_render_serves_what_it_rendered_when_evicted_at_once(tmp_path):
+    # A budget smaller than the file: writing it evicts it straight away
+    cache = DerivativeCache(str(tmp_path), max_bytes=4, buckets=[100])
+    path = cache.path_for(1, "v1", 100, ".jpg")
+    assert cache.read_or_render(path, lambda: b"too large to keep")[0] == b"too large to keep"
+    assert not os.path.exists(path)
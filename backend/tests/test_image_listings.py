@@ -0,0 +1,102 @@
+'''Image listing endpoints: the shared summary builder and queries per page.'''
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+import pytest
+
+from backend.api.main import app
+from backend.api.utils.image_response import image_summary, preview_token
+from backend.database.database import get_db
+from backend.database.models import Author, Image, Tag
+from backend.database.services.image_service import with_listing_relations
+
+PAGE_SIZES = [1, 10, 40]
+
+@contextmanager
+def count_statements(db):
+    """Collects every SQL statement db sends while the block runs."""
+    statements: List[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.bind, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.bind, "before_cursor_execute", record)
+
+@pytest.fixture
+def catalogue(db):
+    tags = [Tag(name="cat"), Tag(name="dog"), Tag(name="bird")]
+    authors = [Author(name=f"author {i}", email=f"author_{i}@placeholder.com") for i in range(5)]
+    db.add_all([
+        Image(filename=f"{i}.png", date_added=datetime(2025, 1, 1 + i % 28),
+              author=authors[i % 5], tags=[tags[0], tags[1 + i % 2]])
+        for i in range(max(PAGE_SIZES))
+    ])
+    db.commit()
+    return db
+
+@pytest.fixture
+def client(catalogue):
+    app.dependency_overrides[get_db] = lambda: catalogue
+    try:
+        # Not entered as a context manager: the startup index build would
+        # read the configured database rather than this one
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+def test_image_summary(db):
+    image = Image(filename="a.png", date_added=datetime(2025, 1, 2), preview_version="v1",
+                  author=Author(name="x", email="x@placeholder.com"), tags=[Tag(name="cat")],
+                  width=10, height=20, file_size=300, file_type="image/png")
+    db.add(image)
+    db.commit()
+
+    summary = image_summary(image)
+    assert summary["id"] == str(image.id)
+    assert summary["tags"] == ["cat"]
+    assert summary["author"] == "x"
+    assert summary["date_added"] == "2025-01-02T00:00:00"
+    assert summary["preview_token"] == preview_token(image) is not None
+    assert (summary["width"], summary["height"], summary["file_size"]) == (10, 20, 300)
+
+def test_image_summary_without_author_or_previews(db):
+    image = Image(filename="b.png")
+    db.add(image)
+    db.commit()
+
+    summary = image_summary(image)
+    assert (summary["author"], summary["tags"], summary["preview_token"]) == (None, [], None)
+
+def test_summaries_of_listed_images_need_no_queries(catalogue):
+    images = with_listing_relations(catalogue.query(Image)).all()
+    with count_statements(catalogue) as statements:
+        [image_summary(image) for image in images]
+    assert statements == []
+
+@pytest.mark.parametrize("path", [
+    "/images/search/all",
+    "/images/search/tags/cat",
+    "/images/search?tags=cat,dog",
+    "/images/search?q=tag:cat%20-tag:bird",
+    "/images/search?tag_query=cat%20AND%20NOT%20bird",
+])
+def test_listing_queries_do_not_grow_with_page_size(client, catalogue, path):
+    separator = "&" if "?" in path else "?"
+    # Warm up, so index builds on first use are not counted
+    client.get(f"{path}{separator}limit=1")
+
+    counts = {}
+    for limit in PAGE_SIZES:
+        with count_statements(catalogue) as statements:
+            response = client.get(f"{path}{separator}limit={limit}")
+        assert response.status_code == 200, response.text
+        assert response.json() and all(image["tags"] and image["author"] for image in response.json())
+        counts[limit] = len(statements)
+    assert len(set(counts.values())) == 1, counts
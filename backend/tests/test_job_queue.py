@@ -0,0 +1,96 @@
+'''Job leases: claiming, and renewing them while a batch runs; preview jobs racing tagging.'''
+from datetime import datetime, timedelta
+
+from backend.config import settings
+from backend.database.models.image import Image
+from backend.database.models.job import Job
+from backend.database.services.job_service import (
+    claim_jobs, complete_job, enqueue_job, extend_leases, FINALIZE_TAGGING
+)
+from backend.processor import worker
+from backend.processor.preview_engine import PreviewResult
+from backend.processor.preview_profiles import profiles_version
+
+def test_extend_leases_skips_finished_jobs(db):
+    first, second = (enqueue_job(db, FINALIZE_TAGGING, {"image_id": i}) for i in (1, 2))
+    claim_jobs(db, "test", limit=2, lease_seconds=1)
+    complete_job(db, first)
+
+    assert extend_leases(db, [first, second]) == 1
+    assert second.lease_expires_at > datetime.utcnow() + timedelta(seconds=settings.JOB_LEASE_SECONDS - 5)
+    assert first.lease_expires_at is None
+
+def test_process_jobs_renews_waiting_leases(db, monkeypatch):
+    for i in range(3):
+        enqueue_job(db, FINALIZE_TAGGING, {"image_id": i})
+    jobs = claim_jobs(db, "test", limit=3, lease_seconds=1)
+    leases = []
+
+    def handler(db, job):
+        # A lease still due to lapse a second after claiming was not renewed
+        leases.append([other.lease_expires_at for other in jobs if other.status == "running"])
+        complete_job(db, job)
+
+    monkeypatch.setitem(worker.JOB_HANDLERS, FINALIZE_TAGGING, handler)
+    worker.process_jobs(db, jobs)
+
+    soon = datetime.utcnow() + timedelta(seconds=5)
+    assert all(lease < soon for lease in leases[0])
+    assert all(lease > soon for later in leases[1:] for lease in later)
+    assert db.query(Job).filter(Job.status == "succeeded").count() == 3
+
+def test_preview_batches_renew_leases_between_waves(db, monkeypatch):
+    for i in range(5):
+        enqueue_job(db, worker.GENERATE_PREVIEWS, {"source_path": f"{i}.png"})
+    jobs = claim_jobs(db, "test", limit=5, lease_seconds=1)
+    waves = []
+
+    class Engine:
+        max_workers = 2
+
+        def render_batch(self, preview_jobs):
+            waves.append(min(job.lease_expires_at for job in jobs if job.status == "running"))
+            return [
+                PreviewResult(job.source_path, None, False, 0.0, error="unreadable", retryable=False)
+                for job in preview_jobs
+            ]
+
+    monkeypatch.setattr(worker, "get_preview_engine", lambda: Engine())
+    monkeypatch.setattr(settings, "NEAR_DUPLICATE_WARN_ON_UPLOAD", False)
+    worker.handle_generate_previews(db, jobs)
+
+    soon = datetime.utcnow() + timedelta(seconds=5)
+    assert len(waves) == 3
+    assert waves[0] < soon and waves[1] > soon and waves[2] > soon
+    assert db.query(Job).filter(Job.status == "failed").count() == 5
+
+def test_preview_jobs_follow_images_tagged_meanwhile(db, monkeypatch, tmp_path):
+    previews = [tmp_path / "search.jpg", tmp_path / "tag.jpg"]
+    for path in previews:
+        path.write_bytes(b"")
+    # Both were finalized (moved to tagged storage) before their preview jobs ran
+    done = Image(filename="done.png", tagged_full_path=str(tmp_path / "done.png"), perceptual_hash="0" * 16,
+                 search_preview_path=str(previews[0]), tag_preview_path=str(previews[1]),
+                 preview_version=profiles_version())
+    stale = Image(filename="stale.png", tagged_full_path=str(tmp_path / "stale.png"))
+    db.add_all([done, stale])
+    db.commit()
+    for image in (done, stale):
+        enqueue_job(db, worker.GENERATE_PREVIEWS, {"image_id": image.id, "source_path": "untagged/gone.png"})
+    jobs = claim_jobs(db, "test", limit=2)
+    rendered = []
+
+    class Engine:
+        max_workers = 2
+
+        def render_batch(self, preview_jobs):
+            rendered.extend(job.source_path for job in preview_jobs)
+            return [PreviewResult(job.source_path, None, True, 0.0) for job in preview_jobs]
+
+    monkeypatch.setattr(worker, "get_preview_engine", lambda: Engine())
+    monkeypatch.setattr(settings, "NEAR_DUPLICATE_WARN_ON_UPLOAD", False)
+    worker.handle_generate_previews(db, jobs)
+
+    assert rendered == [stale.tagged_full_path]
+    assert [job.status for job in jobs] == ["succeeded", "succeeded"]
+    assert jobs[0].result == {"skipped": "Previews already current"}
@@ -0,0 +1,77 @@
+'''The search query language: parsing, and the SQL it compiles to.'''
+from datetime import datetime
+
+import pytest
+
+from backend.database.models import Author, Image, Tag
+from backend.database.services.image_service import search_images_query
+from backend.search.query_language import Predicate, parse_search_query
+
+def query_plan(db, query) -> str:
+    """SQLite's EXPLAIN QUERY PLAN for query, one step per line."""
+    compiled = query.statement.compile(dialect=db.bind.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + compiled.string, params)
+    return "\n".join(row[-1] for row in rows)
+
+@pytest.fixture
+def catalogue(db):
+    author = Author(name="john smith", email="john_smith@placeholder.com")
+    pokemon, abstract = Tag(name="pokemon"), Tag(name="abstract")
+    db.add_all([
+        Image(filename="a.png", author=author, tags=[pokemon], width=3000, height=2000,
+              file_size=2 * 1024 ** 2, file_type="image/png", date_added=datetime(2025, 3, 1)),
+        Image(filename="b.jpg", tags=[pokemon, abstract], width=800, height=600,
+              file_size=300 * 1024, file_type="image/jpeg", date_added=datetime(2024, 7, 1)),
+    ])
+    db.commit()
+    return db
+
+def search(db, text):
+    return sorted(image.filename for image in search_images_query(db, predicates=parse_search_query(text)))
+
+def test_parse_normalises_fields():
+    assert parse_search_query('tag:"Pokemon " author:"John Smith" type:png width>2000') == [
+        Predicate(field='tag', value='pokemon'),
+        Predicate(field='author', value='john smith'),
+        Predicate(field='type', value='image/png'),
+        Predicate(field='width', low=2001),
+    ]
+
+def test_parse_ranges():
+    (added,) = parse_search_query('added:2025-01..2025-06')
+    assert (added.low, added.high) == (datetime(2025, 1, 1), datetime(2025, 7, 1))
+    (size,) = parse_search_query('-size<=1mb')
+    assert (size.low, size.high, size.negated) == (None, 1024 ** 2 + 1, True)
+
+@pytest.mark.parametrize('text', ['colour:red', 'width>wide', 'added:2025-13', 'tag:""', '"unbalanced'])
+def test_parse_rejects(text):
+    with pytest.raises(ValueError):
+        parse_search_query(text)
+
+def test_author_matches_any_case(catalogue):
+    assert search(catalogue, 'author:"John Smith"') == ['a.png']
+    assert search(catalogue, '-author:"JOHN SMITH"') == ['b.jpg']
+
+def test_predicates_filter(catalogue):
+    assert search(catalogue, 'tag:pokemon -tag:abstract') == ['a.png']
+    assert search(catalogue, 'width>2000 type:png') == ['a.png']
+    assert search(catalogue, 'added:2024 size<1mb') == ['b.jpg']
+    assert search(catalogue, 'added:2025-01..2025-06 tag:abstract') == []
+
+@pytest.mark.parametrize('text', [
+    'tag:pokemon',
+    'author:"john smith"',
+    'type:png',
+    'width>2000',
+    'height<=600',
+    'size>1mb',
+    'added:2025-01..2025-06',
+    'width>10 -width>2000 -type:png',
+    'tag:pokemon -tag:abstract author:"x" width>2000 added:2025-01..2025-06 type:png',
+])
+def test_predicates_seek_an_index(catalogue, text):
+    # Negated terms alone have to visit every image; any other term must seek
+    plan = query_plan(catalogue, search_images_query(catalogue, predicates=parse_search_query(text)))
+    assert "SCAN images" not in plan, plan
+    assert "SEARCH images USING" in plan, plan
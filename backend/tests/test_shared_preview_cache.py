@@ -0,0 +1,36 @@
+'''Shared preview cache: arenas of other geometries are never resized under their readers.'''
+import os
+
+from backend.processor.shared_preview_cache import SharedPreviewCache
+
+def test_new_geometry_leaves_mapped_arena_intact(tmp_path):
+    path = str(tmp_path / "previews")
+    old = SharedPreviewCache(path, max_bytes=64 * 1024, slot_bytes=4096)
+    assert old.put("a", b"old bytes", 1.0)
+
+    new = SharedPreviewCache(path, max_bytes=256 * 1024, slot_bytes=8192)
+    assert new.path != old.path
+    assert os.listdir(tmp_path) == [os.path.basename(new.path)]
+    # Unlinked, but its mapping still reads as before
+    assert old.get("a") == (b"old bytes", 1.0)
+    assert new.get("a") is None
+
+def test_processes_with_one_geometry_share_an_arena(tmp_path):
+    path = str(tmp_path / "previews")
+    first = SharedPreviewCache(path, max_bytes=64 * 1024, slot_bytes=4096)
+    second = SharedPreviewCache(path, max_bytes=64 * 1024, slot_bytes=4096)
+    assert first.put("a", b"shared", 2.0)
+    assert second.get("a") == (b"shared", 2.0)
+
+def test_unusable_file_is_replaced_not_truncated(tmp_path):
+    path = str(tmp_path / "previews")
+    cache = SharedPreviewCache(path, max_bytes=64 * 1024, slot_bytes=4096)
+    with open(cache.path, "r+b") as f:
+        f.write(b"junk")
+    inode = os.stat(cache.path).st_ino
+    before = os.path.getsize(cache.path)
+
+    replacement = SharedPreviewCache(path, max_bytes=64 * 1024, slot_bytes=4096)
+    assert os.stat(cache.path).st_ino != inode
+    assert os.fstat(cache._fd).st_size == before
+    assert replacement.put("a", b"fresh", 3.0) and replacement.get("a") == (b"fresh", 3.0)
@@ -0,0 +1,53 @@
+'''Tag autocomplete: the indexed lookups rank like a scan of every tag.'''
+from types import SimpleNamespace
+import random
+
+import pytest
+
+from backend.database.schemas.tag import TagSuggestion
+from backend.search import tag_autocomplete
+from backend.search.tag_autocomplete import TagAutocompleteIndex, TagEntry
+
+def expected(entries, text, limit):
+    """Prefix matches, then other matches, each most used first: the plain definition."""
+    ranked = sorted(entries.values(), key=lambda entry: (-entry.count, entry.name))
+    prefix = [entry.name for entry in ranked if entry.name.startswith(text)]
+    infix = [entry.name for entry in ranked if text in entry.name and not entry.name.startswith(text)]
+    return (prefix + infix)[:limit]
+
+@pytest.fixture
+def tags():
+    rng = random.Random(3)
+    words = ["".join(rng.choices("abcdé", k=rng.randint(2, 5))) for _ in range(300)]
+    names = {" ".join(rng.choices(words, k=rng.randint(1, 3))) for _ in range(3000)}
+    return rng, {name: TagEntry(i, name, None, rng.randint(0, 30)) for i, name in enumerate(sorted(names))}
+
+@pytest.mark.parametrize("direct_candidates", [0, 50, 100_000])
+def test_search_matches_a_full_scan(tags, monkeypatch, direct_candidates):
+    # 0 always takes the ranked-string scans, 100_000 always the bisect and postings
+    monkeypatch.setattr(tag_autocomplete, "DIRECT_CANDIDATES", direct_candidates)
+    rng, entries = tags
+    index = TagAutocompleteIndex()
+    index.build(entries.values())
+
+    for name in rng.sample(sorted(entries), 100):
+        index.remove_tag(name)
+        del entries[name]
+    for tag_id, name in enumerate(["new tag", "éé", name]):
+        index.add_tag(SimpleNamespace(id=-1 - tag_id, name=name, date_added=None))
+        entries.setdefault(name, TagEntry(-1 - tag_id, name, None, 0))
+    index._sort()
+
+    names = sorted(entries)
+    for _ in range(300):
+        name = rng.choice(names)
+        start = rng.randint(0, len(name) - 1)
+        text = name[start:start + rng.randint(1, 5)].strip() or "zz"
+        limit = rng.choice([1, 10, 40])
+        assert [entry.name for entry in index.search(text, limit)] == expected(entries, text, limit), text
+
+def test_suggestions_allow_tags_without_a_date():
+    index = TagAutocompleteIndex()
+    index.build([TagEntry(1, "cat", None, 3)])
+    suggestion = TagSuggestion.model_validate(index.search("ca")[0])
+    assert (suggestion.name, suggestion.count, suggestion.date_added) == ("cat", 3, None)
@@ -0,0 +1,80 @@
+'''Tag bitmap index: staying current through this process's writes, and only then replacing the SQL.'''
+from datetime import datetime
+import importlib.util
+import os
+
+from sqlalchemy import text
+import pytest
+
+from backend.database.models import Image
+from backend.database.schemas.image import ImageCreate
+from backend.database.services import image_service, tag_service
+from backend.database.services.image_service import (
+    create_image, delete_image, search_images_query, update_image_metadata
+)
+from backend.search.tag_index import TagBitmapIndex
+
+MIGRATION = os.path.join(
+    os.path.dirname(__file__), "..", "database", "alembic", "versions",
+    "0012_create_index_generations_table.py"
+)
+
+@pytest.fixture
+def index(db, monkeypatch):
+    """A fresh index over a database with migration 0012's counter and triggers."""
+    spec = importlib.util.spec_from_file_location("generations_migration", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    db.execute(text("INSERT INTO index_generations (name, generation) VALUES ('tags', 0)"))
+    for name, trigger_event in migration.TAG_TRIGGERS:
+        db.execute(text(f"CREATE TRIGGER {name} {trigger_event} BEGIN {migration.BUMP_TAGS} END"))
+    db.commit()
+
+    index = TagBitmapIndex()
+    monkeypatch.setattr(image_service, "get_tag_index", lambda: index)
+    monkeypatch.setattr(tag_service, "get_tag_index", lambda: index)
+    index.rebuild_from_db(db)
+    return index
+
+def add_image(db, name: str, tags):
+    image = create_image(db, ImageCreate(filename=f"{name}.png", file_size=1, file_type="image/png"))
+    return update_image_metadata(db, image.id, tags)
+
+def found(db, **filters):
+    return sorted(image.filename for image in search_images_query(db, **filters))
+
+def test_own_writes_keep_the_index_current(db, index):
+    cat = add_image(db, "cat", ["cat"])
+    add_image(db, "both", ["cat", "dog"])
+    assert index.is_current(db)
+    assert found(db, tags=["cat"]) == ["both.png", "cat.png"]
+
+    update_image_metadata(db, cat.id, ["dog"])
+    tag_service.delete_tag_id(db, tag_service.get_tag_by_name(db, "cat").id)
+    delete_image(db, cat.id)
+    assert index.is_current(db)
+    assert found(db, tags=["dog"]) == ["both.png"]
+    assert found(db, tags=["cat"]) == []
+
+def test_other_writers_fall_back_to_sql(db, index):
+    image = add_image(db, "cat", ["cat"])
+    # Another process tags the image behind this one's back
+    db.execute(text("INSERT INTO tags (name, date_added) VALUES ('dog', :now)"), {"now": datetime.utcnow()})
+    db.execute(text(
+        "INSERT INTO image_tags (image_id, tag_id) SELECT :image_id, id FROM tags WHERE name = 'dog'"
+    ), {"image_id": image.id})
+    db.commit()
+
+    assert not index.is_current(db)
+    assert found(db, tags=["dog"]) == ["cat.png"]
+
+def test_current_index_replaces_the_tag_sql(db, index):
+    add_image(db, "cat", ["cat"])
+    query = search_images_query(db, tag_query=('or', (('tag', 'cat'), ('tag', 'dog'))))
+    sql = str(query.statement.compile(compile_kwargs={"literal_binds": True}))
+    assert "image_tags" not in sql and "images.id IN (" in sql
+
+    db.execute(text("DELETE FROM image_tags"))
+    db.commit()
+    sql = str(search_images_query(db, tags=["cat"]).statement)
+    assert "image_tags" in sql
@@ -22,6 +22,10 @@ class ErrorCode(Enum):
     IMAGE_UPLOAD_FAILED = "IMG_001"
     INVALID_IMAGE_FORMAT = "IMG_002"
     IMAGE_NOT_FOUND = "IMG_003"
+    IMAGE_TOO_LARGE = "IMG_004"
+    
+    # Background Job Errors
+    JOB_NOT_FOUND = "JOB_001"
     
     # Database Errors
     DB_CONNECTION_ERROR = "DB_001"